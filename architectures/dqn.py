@@ -5,11 +5,18 @@ Created on October 1, 2018
 @author: mae-ma
 @attention: architectures for the safety DRL package
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 2.0.0
+@version: 2.5.2
 
 #############################################################################################
 
 History:
+- v2.5.2: warmstart only loads a replay buffer dump of the configured type
+- v2.5.1: keep the training log of the fused training step open
+- v2.5.0: fused training step as one keras function instead of predict + predict + fit
+- v2.4.0: batched Bellman targets with n-step returns and double DQN
+- v2.3.0: warmstart reopens the memory-mapped replay buffer
+- v2.2.0: prioritized experience replay
+- v2.1.0: select replay buffer storage from config
 - v2.0.0: working DQN, cleanup
 - v1.5.2: act returns also predicted q_value
 - v1.5.1: use only mean-squared-error as loss
@@ -42,7 +49,10 @@ import tensorflow as tf
 from tensorflow import keras
 import tqdm
 
-from architectures.replay_buffer import ReplayBuffer
+K = keras.backend
+
+from architectures.replay_buffer import ReplayBuffer, ArrayReplayBuffer, FrameReplayBuffer, \
+    PrioritizedReplayBuffer
 import architectures.misc as misc
 from architectures.misc import printy
 from architectures.misc import Font
@@ -97,7 +107,20 @@ class DeepQNetwork:
         self.gamma = self.params['gamma']
         self.epsilon = self.params['epsilon']
         self.epsilon_min = self.params['epsilon_min']
-        self.replay_buffer = ReplayBuffer(float(self.params['replay_memory_size']))
+        self.replay_buffer = self._build_replay_buffer()
+        # the array based buffers are dumped into a directory, the list buffer is pickled
+        if isinstance(self.replay_buffer, ArrayReplayBuffer):
+            self.replay_buffer_file = 'replay_buffer'
+        else:
+            self.replay_buffer_file = 'replay_buffer.pkl'
+        # number of rewards in the bootstrapped target
+        self.n_step = self.params.get('n_step', 1)
+        # argmax of the next state from the online network, value from the target network
+        self.double_dqn = self.params.get('double_dqn', False)
+        if self.n_step > 1 and not isinstance(self.replay_buffer, ArrayReplayBuffer):
+            raise ValueError('n-step returns need an array based replay buffer.')
+        # targets and update in one keras function instead of predict + predict + fit
+        self.fused_training = self.params.get('fused_training', False)
 
         # delete training log file in the beginning
         if os.path.exists(os.path.join(safety_path, 'training_log_DQN.csv')):
@@ -107,7 +130,10 @@ class DeepQNetwork:
             os.remove(os.path.join(
                 safety_path, 'training_log_DQN.csv'))
 
-        self.csv_logger = keras.callbacks.CSVLogger('training_log_DQN.csv', append=True)
+        self.training_log = 'training_log_DQN.csv'
+        self.csv_logger = keras.callbacks.CSVLogger(self.training_log, append=True)
+        # file handle of the training log written by the fused training step
+        self._training_log_file = None
         # max number of epochs
         self.num_epochs = self.params['num_epochs']
         # number of episodes in one epoch
@@ -132,6 +158,8 @@ class DeepQNetwork:
         self.target_model = self._build_network()
 
         self.loss = [0.0 for _ in self.model.metrics_names]
+        if self.fused_training:
+            self._compile_training()
 
         print(Font.yellow + '–' * 100 + Font.end)
         print('Save model as "model.yml"')
@@ -143,6 +171,27 @@ class DeepQNetwork:
         if self.warmstart_flag:
             self.warmstart(warmstart_path)
 
+    def _build_replay_buffer(self) -> ReplayBuffer:
+        """
+        build the replay buffer selected with 'replay_buffer' in the config
+        Output:
+            replay_buffer (ReplayBuffer): 'list' stores tuples, 'array' uses preallocated numpy arrays,
+                'frame' stores every observation only once, 'prioritized' samples proportional to the TD-error
+        """
+        max_size = float(self.params['replay_memory_size'])
+        buffer_type = self.params.get('replay_buffer', 'list')
+        if buffer_type == 'list':
+            return ReplayBuffer(max_size)
+        elif buffer_type == 'array':
+            return ArrayReplayBuffer(max_size)
+        elif buffer_type == 'frame':
+            return FrameReplayBuffer(max_size)
+        elif buffer_type == 'prioritized':
+            return PrioritizedReplayBuffer(max_size, alpha=self.params['prioritized_replay_alpha'],
+                                           eps=float(self.params['prioritized_replay_eps']), rng=self.rng)
+        else:
+            raise ValueError('Replay buffer type is not known: ' + str(buffer_type))
+
     def _build_network(self) -> (keras.models.Sequential, keras.models.Sequential):
         """
         build network with DQN parameters
@@ -204,6 +253,56 @@ class DeepQNetwork:
         # target_model = keras.models.clone_model(model)
         return model
 
+    def _compile_training(self) -> None:
+        """
+        compile the whole training step into one keras function (as 'dqn/ai.py' does for HRA):
+        Q-values of both networks, targets and the RMSprop update run in one session call
+        """
+        state_shape = (100,) if self.simple_dqn else self.input_dim
+        s = K.placeholder(shape=(None,) + state_shape)
+        a = K.placeholder(ndim=1, dtype='int32')
+        r = K.placeholder(ndim=1, dtype='float32')
+        s2 = K.placeholder(shape=(None,) + state_shape)
+        t = K.placeholder(ndim=1, dtype='float32')
+        discount = K.placeholder(ndim=1, dtype='float32')
+        w = K.placeholder(ndim=1, dtype='float32')
+
+        q = self.model(s)
+        q2 = self.target_model(s2)
+        if self.double_dqn:
+            next_action = K.argmax(self.model(s2), axis=1)
+            next_val = K.sum(q2 * K.one_hot(next_action, self.output_dim), axis=1)
+        else:
+            next_val = K.max(q2, axis=1)
+        targets = K.stop_gradient(r + discount * (1 - t) * next_val)
+        preds = K.sum(q * K.one_hot(a, self.output_dim), axis=1)
+        td_errors = targets - preds
+        # same scale as 'mean_squared_error' in 'fit' which also averages over the untouched outputs
+        cost = K.mean(w * K.square(td_errors)) / self.output_dim
+        updates = self.model.optimizer.get_updates(loss=cost, params=self.model.trainable_weights)
+        self._train_step = K.function(inputs=[s, a, r, s2, t, discount, w], outputs=[cost, td_errors],
+                                      updates=updates)
+
+    def _log_loss(self, loss: float) -> None:
+        """
+        append the loss to the training log in the format of the keras CSVLogger (epoch, acc, loss)
+        Input:
+            loss (float): loss of the training step
+        """
+        if self._training_log_file is None:
+            new_file = not os.path.exists(self.training_log)
+            self._training_log_file = open(self.training_log, 'a')
+            if new_file:
+                self._training_log_file.write('epoch,acc,loss\n')
+        self._training_log_file.write('0,nan,{}\n'.format(loss))
+
+    def flush_log(self) -> None:
+        """
+        write the buffered rows of the training log to disk
+        """
+        if self._training_log_file is not None:
+            self._training_log_file.flush()
+
     def warmstart(self, path: str) -> None:
         """
         reading weights from disk
@@ -217,6 +316,13 @@ class DeepQNetwork:
         self.epsilon = self.epsilon_min
         self.model.load_weights(os.path.join(path, 'weights.h5'))
         self.target_model.load_weights(os.path.join(path, 'target_weights.h5'))
+        buffer_path = os.path.join(path, self.replay_buffer_file)
+        if self.replay_buffer.can_load(buffer_path):
+            print(Font.yellow + 'Load replay buffer from: ' + buffer_path + Font.end)
+            self.replay_buffer.load(file_path=buffer_path)
+        elif any(os.path.exists(os.path.join(path, file)) for file in ['replay_buffer', 'replay_buffer.pkl']):
+            print(Font.red + 'Warning: the replay buffer in ' + path + ' does not match the configured "' +
+                  str(self.params.get('replay_buffer', 'list')) + '" buffer, start with an empty buffer' + Font.end)
 
 
     def do_training(self, is_testing=False):
@@ -318,11 +424,12 @@ class DeepQNetwork:
         """
         save the replay buffer
         Input:
-            path (str): where to save the buffer
+            path (str): where to save the buffer, a directory for the array based buffers
         """
         self.replay_buffer.dump(file_path=path)
 
     def save_weights(self, path: str) -> None:
+        self.flush_log()
         self.model.save_weights(filepath=path)
         self.target_model.save_weights(filepath='target_' + path)
 
@@ -333,28 +440,38 @@ class DeepQNetwork:
             batch_size (int): size of batch to sample from replay buffer
         """
         batch_size = min(batch_size, self.replay_buffer.__len__())
-        # get 5 arrays in minibatch for state, action, reward, next_state, done
-        minibatch = self.replay_buffer.sample(batch_size=batch_size)
-        # all of type np.array -> suffix "_a"
-        state_a, action_a, reward_a, next_state_a, done_a = minibatch
+        weights = None
+        if isinstance(self.replay_buffer, PrioritizedReplayBuffer):
+            # anneal beta linearly to 1
+            beta_0 = self.params['prioritized_replay_beta']
+            beta = min(1.0, beta_0 + (1.0 - beta_0) * self.total_training_steps /
+                       self.params['prioritized_replay_beta_frames'])
+            # get 6 arrays in minibatch for state, action, reward, next_state, done, discount
+            # + importance sampling weights and buffer indices for the priority update
+            minibatch = self.replay_buffer.sample_n_step(batch_size=batch_size, n_step=self.n_step,
+                                                         gamma=self.gamma, beta=beta)
+            state_a, action_a, reward_a, next_state_a, done_a, discount_a, weights, idxes = minibatch
+        elif isinstance(self.replay_buffer, ArrayReplayBuffer):
+            # get 6 arrays in minibatch for state, action, reward, next_state, done, discount
+            minibatch = self.replay_buffer.sample_n_step(batch_size=batch_size, n_step=self.n_step,
+                                                         gamma=self.gamma)
+            state_a, action_a, reward_a, next_state_a, done_a, discount_a = minibatch
+        else:
+            # get 5 arrays in minibatch for state, action, reward, next_state, done
+            minibatch = self.replay_buffer.sample(batch_size=batch_size)
+            # all of type np.array -> suffix "_a"
+            state_a, action_a, reward_a, next_state_a, done_a = minibatch
+            discount_a = self.gamma
+        self.total_training_steps += 1
 
         if self.simple_dqn:
-            state_input = np.zeros((batch_size, 100))
-            next_state_input = np.zeros((batch_size, 100))
-            action, reward, done = [], [], []
-            # state_input = state_a[:, 0, :]
-            # next_state_input = next_state_a[:, 0, :]
             state_input = state_a
             next_state_input = next_state_a
         else:
-            dim = (batch_size, ) + self.input_dim
-            state_input = np.zeros(dim)
-            next_state_input = np.zeros(dim)
             # state_a.shape = (batch_size, 1, height, width, n_channels)
             state_input = state_a[:, 0, ...]
             # next_state_a.shape = (batch_size, 1, height, width, n_channels)
             next_state_input = next_state_a[:, 0, ...]
-            action, reward, done = [], [], []
 
         if self.debug:
             print(Font.yellow + '–' * 100 + Font.end)
@@ -363,34 +480,31 @@ class DeepQNetwork:
             print('input state shape: ', state_input.shape)
             print(Font.yellow + '–' * 100 + Font.end)
 
-        for i in range(batch_size):
-            action.append(action_a[i])
-            reward.append(reward_a[i])
-            done.append(done_a[i])
-
-        # y = self.model.predict(state_input)
-        # y_target = self.target_model.predict(next_state_input)
-        y = self.model.predict_on_batch(state_input)
-        y_target = self.target_model.predict_on_batch(next_state_input)
-
-        # "fit"-method feeds input and output pairs to the model
-        # then the model will train on those data to approximate the output
-        # based on the input
-        # [src](https://keon.io/deep-q-learning/)
-        for i in range(batch_size):
-            if self.debug:
-                print('y[i][action[i]]:', y[i][action[i]])
-                print('action[i]:', action[i])
-                print('reward[i]:', reward[i])
-                print('y_target[i]:', y_target[i])
-            if done[i]:
-                y[i][action[i]] = reward[i]
-            else:
-                y[i][action[i]] = reward[i] + self.gamma * np.amax(y_target[i])
-
-        # self.loss = self.model.train_on_batch(state_input, y)
-        self.model.fit(state_input, y, batch_size=batch_size,
-                       epochs=1, verbose=0, callbacks=[self.csv_logger])
+        if self.fused_training:
+            discount_a = np.broadcast_to(np.asarray(discount_a, dtype=np.float32), (batch_size,))
+            sample_weights = weights if weights is not None else np.ones(batch_size, dtype=np.float32)
+            loss, td_errors = self._train_step([state_input, action_a.astype(np.int32), reward_a.astype(np.float32),
+                                                next_state_input, done_a.astype(np.float32), discount_a,
+                                                sample_weights])
+            self.loss[0] = loss
+            self._log_loss(loss)
+        else:
+            y = self.model.predict_on_batch(state_input)
+            y_target = self.target_model.predict_on_batch(next_state_input)
+            y_next = self.model.predict_on_batch(next_state_input) if self.double_dqn else None
+
+            # "fit"-method feeds input and output pairs to the model
+            # then the model will train on those data to approximate the output
+            # based on the input
+            # [src](https://keon.io/deep-q-learning/)
+            y, td_errors = misc.bellman_targets(q_vals=y, q_next_target=y_target, actions=action_a,
+                                                rewards=reward_a, dones=done_a, discounts=discount_a,
+                                                q_next_online=y_next)
+            # self.loss = self.model.train_on_batch(state_input, y)
+            self.model.fit(state_input, y, batch_size=batch_size, sample_weight=weights,
+                           epochs=1, verbose=0, callbacks=[self.csv_logger])
+        if weights is not None:
+            self.replay_buffer.update_priorities(idxes, td_errors)
 
 
     def main(self):
@@ -4,11 +4,13 @@ Created on October 19, 2018
 @author: mae-ma
 @attention: evaluation of the architectures
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 1.3.1
+@version: 1.3.3
 
 #############################################################################################
 
 History:
+- v1.3.3: backup whichever replay buffer dump exists
+- v1.3.2: backup the replay buffer directory
 - v1.3.1: cleanup
 - v1.3.0: plot for q-vals
 - v1.2.1: change filenames
@@ -155,15 +157,21 @@ class Evaluation:
     def save_all(self):
         print('–'*50)
         filelist = ['weights.h5', 'target_weights.h5',
-                    'reward.yml', 'replay_buffer.pkl', 'training_log_DQN.csv',
+                    'reward.yml', 'training_log_DQN.csv',
                     self.plot_filename, 'architectures/config_dqn.yml', 'model.yml']
+        # the list buffer is pickled, the array based buffers are dumped into a directory
+        filelist += [file for file in ['replay_buffer.pkl', 'replay_buffer']
+                     if os.path.exists(os.path.join(self.src_filepath, file))]
         folder = datetime.datetime.today().strftime('%Y_%m_%d-%H_%M') + '___' + self.plot_filename
         folderpath = os.path.join(self.tgt_filepath, folder)
         print('Save all files to: ' + folderpath)
         if not os.path.exists(folderpath):
             os.makedirs(folderpath)
         for file in filelist:
-            shutil.copy2(os.path.join(self.src_filepath, file), folderpath)
+            if os.path.isdir(os.path.join(self.src_filepath, file)):
+                shutil.copytree(os.path.join(self.src_filepath, file), os.path.join(folderpath, file))
+            else:
+                shutil.copy2(os.path.join(self.src_filepath, file), folderpath)
         print('–'*50)
 
 
@@ -5,24 +5,139 @@ Created on October 1, 2018
 @author: mae-ma
 @attention: architectures for the safety DRL package
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 1.0.0
+@version: 1.2.1
 
 #############################################################################################
 
 History:
+- v1.2.1: read the target arrays of the fruit collection environment
+- v1.2.0: tabular MDP of the complete fruit collection game (player, fruit bitmask, ghosts)
+- v1.1.0: compiled CSR form and constructors from gym environments and fruit collection layouts
 - v1.0.0: first init
 """
 
 import numpy as np
 
 
+class CompiledMDP(object):
+    """
+    CSR form of mdp.P: the transitions (prob, next_state, reward) of the pair (s, a) are the
+    entries indptr[s * nA + a]:indptr[s * nA + a + 1] of the flat arrays
+    """
+    def __init__(self, indptr, prob, next_state, reward, nS, nA):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.prob = np.asarray(prob, dtype=np.float64)
+        self.next_state = np.asarray(next_state, dtype=np.int64)
+        self.reward = np.asarray(reward, dtype=np.float64)
+        self.nS = nS
+        self.nA = nA
+        # (s * nA + a) of every entry and the expected reward R[s, a]
+        self.sa = np.repeat(np.arange(nS * nA, dtype=np.int64), np.diff(self.indptr))
+        self.R = np.bincount(self.sa, weights=self.prob * self.reward, minlength=nS * nA).reshape(nS, nA)
+
+    @classmethod
+    def from_P(cls, P, nS, nA):
+        indptr = [0]
+        prob, next_state, reward = [], [], []
+        for state in range(nS):
+            for action in range(nA):
+                for transition in P[state].get(action, []):
+                    prob.append(transition[0])
+                    next_state.append(transition[1])
+                    reward.append(transition[2])
+                indptr.append(len(prob))
+        return cls(indptr, prob, next_state, reward, nS, nA)
+
+    def transitions(self, state, action):
+        """
+        (prob, next_state, reward) arrays of the pair (state, action)
+        """
+        start, end = self.indptr[state * self.nA + action], self.indptr[state * self.nA + action + 1]
+        return self.prob[start:end], self.next_state[start:end], self.reward[start:end]
+
+    def to_P(self):
+        prob, next_state, reward = self.prob.tolist(), self.next_state.tolist(), self.reward.tolist()
+        indptr = self.indptr.tolist()
+        P = {}
+        for state in range(self.nS):
+            P[state] = {}
+            for action in range(self.nA):
+                sa = state * self.nA + action
+                P[state][action] = list(zip(prob[indptr[sa]:indptr[sa + 1]], next_state[indptr[sa]:indptr[sa + 1]],
+                                            reward[indptr[sa]:indptr[sa + 1]]))
+        return P
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.indptr, self.prob, self.next_state, self.reward, self.sa, self.R])
+
+
 class MDP(object):
-    def __init__(self, P, nS, nA, desc=None):
+    def __init__(self, P, nS, nA, desc=None, compiled=None):
         # mdp.P[state][action] is a list of tuples (probability, nextstate, reward)
-        self.P = P  # state transition and reward probabilities
+        self._P = P  # state transition and reward probabilities
         self.nS = nS  # number of states
         self.nA = nA  # number of actions
         self.desc = desc  # 2D array specifying what each grid cell means (used for plotting)
+        self._compiled = compiled
+
+    @property
+    def P(self):
+        if self._P is None:
+            self._P = self._compiled.to_P()
+        return self._P
+
+    @property
+    def compiled(self):
+        """
+        CSR form of P, built once and cached (P must not be changed afterwards)
+        """
+        if self._compiled is None:
+            self._compiled = CompiledMDP.from_P(self._P, self.nS, self.nA)
+        return self._compiled
+
+    @classmethod
+    def from_compiled(cls, compiled, desc=None):
+        """
+        MDP without the dict form, mdp.P is only built if it is accessed
+        """
+        return cls(P=None, nS=compiled.nS, nA=compiled.nA, desc=desc, compiled=compiled)
+
+    @classmethod
+    def from_discrete_env(cls, env):
+        """
+        MDP of a gym 'DiscreteEnv' (e.g. 'ci/frozen_lake.py'), P[s][a] == [(probability, nextstate, reward, done)]
+        """
+        P = {s: {a: [tup[:3] for tup in tups] for (a, tups) in a2d.items()} for (s, a2d) in env.P.items()}
+        return cls(P=P, nS=env.nS, nA=env.nA, desc=getattr(env, 'desc', None))
+
+    @classmethod
+    def from_fruit_collection(cls, env):
+        """
+        deterministic MDP of the player moves in the maze of a fruit collection environment
+        states: non-wall cells (see 'env._get_idx'), actions: env.legal_actions
+        rewards: fruit reward for entering a cell with an active fruit and wall reward for hitting a wall,
+        the fruits are part of the layout and are not eaten
+        """
+        fruit_cells = set()
+        for target in env.targets:
+            if target['reward'] > 0 and target['active'] is True:
+                fruit_cells.add(tuple(target['location']))
+        nS, nA = env.nb_non_wall, env.nb_actions
+        next_state = np.zeros((nS, nA), dtype=np.int64)
+        reward = np.zeros((nS, nA), dtype=np.float64)
+        for x in range(env.scr_w):
+            for y in range(env.scr_h):
+                if env.wall_grid[x, y]:
+                    continue
+                state = env._get_idx(x, y)
+                for action in env.legal_actions:
+                    nx, ny, hit_wall = env._player_moves[x][y][action]
+                    next_state[state, action] = env._get_idx(nx, ny)
+                    reward[state, action] = env.reward_scheme['wall'] * hit_wall + \
+                        env.reward_scheme['fruit'] * ((nx, ny) in fruit_cells)
+        compiled = CompiledMDP(np.arange(nS * nA + 1), np.ones(nS * nA), next_state.ravel(), reward.ravel(), nS, nA)
+        return cls.from_compiled(compiled)
 
     def explanation(self):
         print("mdp.P is a two-level dict where the first key is the state and the second key is the action.")
@@ -34,5 +149,179 @@ class MDP(object):
         print("As another example, state 5 corresponds to a hole in the ice, in which all actions lead to the same state with probability 1 and reward 0.")
 
 
+class FruitCollectionMDP(MDP):
+    """
+    MDP of the reachable states of a fruit collection game, enumerated with a breadth-first search
+
+    state code: (mask * nb_cells + player) * nb_ghost_codes + ghost_code
+        player: non-wall cell index of the player (see 'env._get_idx')
+        mask: bitmask of the active fruits, bit i belongs to fruit_cells[i]
+        ghost_code: sum_i cell(ghost_i) * nb_cells ** i (only with ghosts)
+    Eating the last fruit or a ghost hit (lives=1) leads to the absorbing terminal state nS - 1.
+    Ghosts walk uniformly over their legal moves; the game length limit is not modelled.
+    """
+    def __init__(self, env, fruit_cells=None, start_cells=None, start_masks=None, with_ghosts=False,
+                 max_codes=int(1e8)):
+        nb_cells = env.nb_non_wall
+        cells = np.argwhere(~env.wall_grid)  # (x, y) of the cell indices, x-major like 'env._get_idx'
+        if fruit_cells is None:
+            if env.possible_fruits:
+                # possible fruits are stored as [y, x]
+                fruit_cells = [(x, y) for y, x in env.possible_fruits]
+            else:
+                fruit_cells = [tuple(t['location']) for t in env.targets if t['reward'] > 0 and t['active']]
+        self.fruit_cells = [tuple(cell) for cell in fruit_cells]
+        ghosts = [tuple(t['location']) for t in env.targets if t['reward'] < 0] if with_ghosts else []
+        self.nb_cells = nb_cells
+        self.nb_ghosts = len(ghosts)
+        self.nb_ghost_codes = nb_cells ** len(ghosts)
+        nb_codes = 2 ** len(self.fruit_cells) * nb_cells * self.nb_ghost_codes
+        if nb_codes > max_codes:
+            raise ValueError('State space with {} codes is too large.'.format(nb_codes))
+        # lookup tables of the cells
+        self._fruit_bit = np.full(nb_cells, -1, dtype=np.int64)
+        for bit, (x, y) in enumerate(self.fruit_cells):
+            self._fruit_bit[env._get_idx(x, y)] = bit
+        moves = np.array([[env._player_moves[x][y][a] for a in env.legal_actions] for x, y in cells], dtype=np.int64)
+        self._next_cell = env._idx_map[moves[..., 0], moves[..., 1]]
+        self._hit_wall = moves[..., 2].astype(bool)
+        self.nA = env.nb_actions
+        self.reward_scheme = env.reward_scheme
+        if self.nb_ghosts > 0:
+            self._init_ghost_moves(env, cells)
+        # start states
+        if start_cells is None:
+            start_cells = [(env.player_pos_x, env.player_pos_y)]
+        if start_masks is None:
+            active = set(tuple(t['location']) for t in env.targets if t['reward'] > 0 and t['active'])
+            start_masks = [sum(1 << bit for bit, cell in enumerate(self.fruit_cells) if cell in active)]
+        ghost_code = sum(env._get_idx(*ghost) * nb_cells ** i for i, ghost in enumerate(ghosts))
+        start_players = np.array([env._get_idx(x, y) for x, y in start_cells], dtype=np.int64)
+        start_masks = np.asarray(start_masks, dtype=np.int64)
+        starts = ((start_masks[:, None] * nb_cells + start_players[None, :]) * self.nb_ghost_codes + ghost_code).ravel()
+        self.start_codes = np.unique(starts)
+        codes, compiled = self._enumerate(nb_codes)
+        self.codes = codes  # state index -> state code (without the terminal state)
+        self.nbytes = compiled.nbytes + codes.nbytes
+        super(FruitCollectionMDP, self).__init__(P=None, nS=compiled.nS, nA=compiled.nA, compiled=compiled)
+        self.terminal_state = self.nS - 1
+
+    def _init_ghost_moves(self, env, cells):
+        """
+        joint ghost moves: ghost code -> 4 ** nb_ghosts (next ghost code, probability)
+        """
+        directions = np.array([[move is not None for move in env._ghost_moves[x][y]] for x, y in cells])
+        targets = np.array([[env._get_idx(*move) if move is not None else env._get_idx(x, y)
+                             for move in env._ghost_moves[x][y]] for x, y in cells], dtype=np.int64)
+        counts = directions.sum(axis=1)
+        nb_combos = 4 ** self.nb_ghosts
+        ghost_codes = np.arange(self.nb_ghost_codes)
+        combos = np.arange(nb_combos)
+        next_codes = np.zeros((self.nb_ghost_codes, nb_combos), dtype=np.int64)
+        probs = np.ones((self.nb_ghost_codes, nb_combos))
+        for i in range(self.nb_ghosts):
+            cell = (ghost_codes // self.nb_cells ** i) % self.nb_cells
+            direction = (combos // 4 ** i) % 4
+            legal = directions[cell[:, None], direction[None, :]]
+            probs *= np.where(legal, 1. / np.maximum(counts[cell][:, None], 1), 0.)
+            next_codes += targets[cell[:, None], direction[None, :]] * self.nb_cells ** i
+        keep = probs > 0
+        self._ghost_next = next_codes
+        self._ghost_prob = probs
+        self._ghost_keep = keep
+
+    def _ghost_cells(self, ghost_codes):
+        return np.stack([(ghost_codes // self.nb_cells ** i) % self.nb_cells for i in range(self.nb_ghosts)], axis=-1)
+
+    def _successors(self, codes):
+        """
+        all transitions of the states 'codes': (source code, action, next code, probability, reward, terminal)
+        """
+        ghost_code = codes % self.nb_ghost_codes
+        rest = codes // self.nb_ghost_codes
+        player = rest % self.nb_cells
+        mask = rest // self.nb_cells
+        src = np.repeat(codes, self.nA)
+        action = np.tile(np.arange(self.nA), len(codes))
+        player, mask, ghost_code = np.repeat(player, self.nA), np.repeat(mask, self.nA), np.repeat(ghost_code, self.nA)
+        next_player = self._next_cell[player, action]
+        reward = self.reward_scheme['wall'] * self._hit_wall[player, action]
+        bit = self._fruit_bit[next_player]
+        eaten = (bit >= 0) & ((mask >> np.maximum(bit, 0)) & 1).astype(bool)
+        next_mask = np.where(eaten, mask & ~(1 << np.maximum(bit, 0)), mask)
+        reward = reward + self.reward_scheme['fruit'] * eaten
+        terminal = next_mask == 0
+        prob = np.ones(len(src))
+        next_ghost = ghost_code
+        if self.nb_ghosts > 0:
+            # one entry per joint ghost move
+            rows, combos = np.nonzero(self._ghost_keep[ghost_code])
+            src, action, player, next_player = src[rows], action[rows], player[rows], next_player[rows]
+            next_mask, reward, terminal = next_mask[rows], reward[rows], terminal[rows]
+            next_ghost = self._ghost_next[ghost_code[rows], combos]
+            prob = self._ghost_prob[ghost_code[rows], combos]
+            before = self._ghost_cells(ghost_code[rows])
+            after = self._ghost_cells(next_ghost)
+            # hit before the ghost move costs the life, the reward is given for a hit after the move or a swap
+            hit_before = np.any(before == next_player[:, None], axis=1)
+            hit_after = np.any(after == next_player[:, None], axis=1)
+            swap = np.any((before == next_player[:, None]) & (after == player[:, None]), axis=1)
+            reward = reward + self.reward_scheme['ghost'] * (hit_after | swap)
+            terminal = terminal | hit_before | hit_after
+        next_code = (next_mask * self.nb_cells + next_player) * self.nb_ghost_codes + next_ghost
+        return src, action, next_code, prob, reward, terminal
+
+    def _enumerate(self, nb_codes):
+        visited = np.zeros(nb_codes, dtype=bool)
+        visited[self.start_codes] = True
+        frontier = self.start_codes
+        transitions = []
+        while len(frontier) > 0:
+            src, action, next_code, prob, reward, terminal = self._successors(frontier)
+            transitions.append((src, action, np.where(terminal, -1, next_code), prob, reward))
+            new = np.unique(next_code[~terminal])
+            frontier = new[~visited[new]]
+            visited[frontier] = True
+        codes = np.flatnonzero(visited)
+        # dense state indices, the terminal state is the last one
+        index = np.full(nb_codes, -1, dtype=np.int64)
+        index[codes] = np.arange(len(codes))
+        nS = len(codes) + 1
+        src, action, next_code, prob, reward = [np.concatenate(arrays) for arrays in zip(*transitions)]
+        state = index[src]
+        next_state = np.where(next_code < 0, nS - 1, index[np.maximum(next_code, 0)])
+        # absorbing terminal state
+        state = np.concatenate([state, np.full(self.nA, nS - 1)])
+        action = np.concatenate([action, np.arange(self.nA)])
+        next_state = np.concatenate([next_state, np.full(self.nA, nS - 1)])
+        prob = np.concatenate([prob, np.ones(self.nA)])
+        reward = np.concatenate([reward, np.zeros(self.nA)])
+        sa = state * self.nA + action
+        order = np.argsort(sa, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(sa, minlength=nS * self.nA))])
+        compiled = CompiledMDP(indptr, prob[order], next_state[order], reward[order], nS, self.nA)
+        return codes, compiled
+
+    def state_index(self, env):
+        """
+        state index of the current state of the environment
+        """
+        mask = 0
+        for cell in env.target_loc[(env.target_reward > 0) & env.target_active].tolist():
+            mask |= 1 << self.fruit_cells.index(tuple(cell))
+        if mask == 0:
+            return self.terminal_state
+        ghost_code = 0
+        if self.nb_ghosts > 0:
+            ghosts = [tuple(cell) for cell in env.target_loc[env.target_reward < 0].tolist()]
+            ghost_code = sum(env._get_idx(*ghost) * self.nb_cells ** i for i, ghost in enumerate(ghosts))
+        code = (mask * self.nb_cells + env._get_idx(env.player_pos_x, env.player_pos_y)) * self.nb_ghost_codes + \
+            ghost_code
+        idx = int(np.searchsorted(self.codes, code))
+        if idx == len(self.codes) or self.codes[idx] != code:
+            raise ValueError('State is not reachable from the start states.')
+        return idx
+
+
 if __name__ == '__main__':
     pass
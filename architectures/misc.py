@@ -5,11 +5,18 @@ Created on October 1, 2018
 @author: mae-ma
 @attention: miscellaneous functions for the safety DRL package
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 1.1.1
+@version: 1.7.1
 
 #############################################################################################
 
 History:
+- v1.7.1: scipy imports at module level
+- v1.7.0: batched tabular Q-learning on dense q tables ('batch_q_learning_update', 'eps_greedy_batch')
+- v1.6.0: planning functions use the compiled form of the MDP
+- v1.5.0: sparse policy evaluation and modified policy iteration
+- v1.4.0: vectorized 'value_iteration' with convergence check
+- v1.3.0: vectorized 'overblow' and 'make_frame' with output buffer and uint8 frames
+- v1.2.0: add 'bellman_targets' for batched DQN targets
 - v1.1.1: print yellow text function
 - v1.1.0: update:
         - 'eps_greedy' function for output of neural net
@@ -26,6 +33,9 @@ History:
 """
 
 import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg
+from architectures.mdp import CompiledMDP
 
 class Font:
     purple = '\033[95m'
@@ -91,98 +101,96 @@ def plot_map(Vs_VI, pis_VI, env, pdf_name):
     plt.savefig(pdf_name)
 
 
-def value_iteration(mdp, gamma, nIt) -> (list, list):
+def compiled_mdp(mdp) -> CompiledMDP:
+    """
+    compiled (CSR) form of the mdp, cached for 'MDP' instances and built for any other object with P, nS and nA
+    """
+    if isinstance(mdp, CompiledMDP):
+        return mdp
+    if hasattr(mdp, 'compiled'):
+        return mdp.compiled
+    return CompiledMDP.from_P(mdp.P, mdp.nS, mdp.nA)
+
+
+def bellman_backup(compiled, V, gamma) -> np.array:
+    """
+    Q[s, a] = sum_{s'} P(s, a, s') [R(s, a, s') + gamma * V(s')] for all (s, a) at once
+    """
+    expected_V = np.bincount(compiled.sa, weights=compiled.prob * V[compiled.next_state],
+                             minlength=compiled.nS * compiled.nA)
+    return compiled.R + gamma * expected_V.reshape(compiled.nS, compiled.nA)
+
+
+def value_iteration(mdp, gamma, nIt, tol=None) -> (list, list):
     """
     Inputs:
         mdp: MDP
         gamma: discount factor
         nIt: number of iterations, corresponding to n above
+        tol: stop early if max_s |V^{(it+1)}(s) - V^{(it)}(s)| < tol
     Outputs:
         (value_functions, policies)
 
-    len(value_functions) == nIt+1 and len(policies) == nIt
+    len(value_functions) == nIt+1 and len(policies) == nIt (without early stopping)
     """
+    compiled = compiled_mdp(mdp)
     Vs = [np.zeros(mdp.nS)]  # list of value functions contains the initial value function V^{(0)}, which is zero
     pis = []
     for it in range(nIt):
-        oldpi = pis[-1] if len(pis) > 0 else None  # \pi^{(it)} = Greedy[V^{(it-1)}]. Just used for printout
-        Vprev = Vs[-1]  # V^{(it)}
-
-        # pi: greedy policy for Vprev (not V),
-        #     corresponding to the math above: \pi^{(it)} = Greedy[V^{(it)}]
-        #     ** it needs to be numpy array of ints **
-        # V: bellman backup on Vprev
-        #     corresponding to the math above: V^{(it+1)} = T[V^{(it)}]
-        #     ** numpy array of floats **
-
-        # set V to zero at the beginning
-        V = np.zeros(mdp.nS)
-        # sum over s
-        for state in range(mdp.nS):
-            # matrix for all actions possible in the current state
-            V_action = np.zeros(mdp.nA)
-            # for the current P[state] = dict{0: [(tuple with possible s' for action 0),
-            # 1: [(tuple with possible s' for action 1)],
-            # 2: [(tuple with possible s' for action 2)],...}
-            for action in mdp.P[state]:
-                # action $\in$ [0:mdp.nA]
-                # action = [(prob, s', reward), (...), (...)]
-                for prob, next_state, reward in mdp.P[state][action]:  # unzip mdp.P[state][action] = [(p, s', r)]
-                    V_action[action] += prob * (reward + gamma * Vprev[next_state])
-            V[state] = np.max(V_action)
-
-        # set pi to zero at the beginning
-        pi = np.zeros(mdp.nS)
-        # sum over s
-        for state in range(mdp.nS):
-            # matrix for all actions possible in the current state
-            V_action = np.zeros(mdp.nA)
-            for action in mdp.P[state]:
-                for prob, next_state, reward in mdp.P[state][action]:
-                    V_action[action] += prob * (reward + gamma * Vprev[next_state])
-            pi[state] = np.argmax(V_action)
-
-        Vs.append(V)
-        pis.append(pi)
+        # Q for Vprev: V^{(it+1)} = T[V^{(it)}] and \pi^{(it)} = Greedy[V^{(it)}]
+        Q = bellman_backup(compiled, Vs[-1], gamma)
+        Vs.append(Q.max(axis=1))
+        pis.append(Q.argmax(axis=1))
+        if tol is not None and np.max(np.abs(Vs[-1] - Vs[-2])) < tol:
+            break
     return Vs, pis
 
 
-def compute_vpi(pi, mdp, gamma):
+def policy_arrays(pi, compiled):
+    """
+    sparse transition matrix P_pi (nS x nS) and expected reward vector r_pi of the policy pi
+    """
+    pi = np.asarray(pi, dtype=np.int64)
+    states = compiled.sa // compiled.nA
+    chosen = compiled.sa % compiled.nA == pi[states]
+    # duplicate (s, s') entries are summed up
+    P_pi = sparse.csr_matrix((compiled.prob[chosen], (states[chosen], compiled.next_state[chosen])),
+                             shape=(compiled.nS, compiled.nS))
+    r_pi = compiled.R[np.arange(compiled.nS), pi]
+    return P_pi, r_pi
+
+
+def compute_vpi(pi, mdp, gamma, V0=None, method='direct', tol=1e-10):
     r"""
     Inputs:
         pi: Policy pi
         mdp: MDP
         gamma: discount factor
+        V0: initial guess for the iterative solver (e.g. V of the previous policy)
+        method: 'direct' (sparse LU) or 'iterative' (BiCGSTAB)
+        tol: relative residual tolerance of the iterative solver
     Outputs:
         value_functions
     computes the state-value function $V^{\pi}$ for an arbitrary policy $\pi$.
     Recall that $V^{\pi}$ satisfies the following linear equation:
     $$V^{\pi}(s) = \sum_{s'} P(s,\pi(s),s')[ R(s,\pi(s),s') + \gamma V^{\pi}(s')]$$
+    i.e. $(I - \gamma P_{\pi}) V^{\pi} = r_{\pi}$ with the expected reward $r_{\pi}$
     """
-    # use pi[state] to access the action that's prescribed by this policy
-    # http://aima.cs.berkeley.edu/python/mdp.html
-    # https://web.engr.oregonstate.edu/~afern/classes/cs533/notes/infinite-horizon-MDP.pdf
-    ###########
-    # vectors
-    ###########
-    V = np.zeros((mdp.nS, 1))  # (s, 1)
-    ###########
-    # matrizes
-    # Ps => mdp.P[state][action] = [(p, s1, r), (...), (...)]
-    # Rs => mdp.P[state][action] = [(p, s1, r), (...), (...)]
-    ###########
-    Ps = np.zeros((mdp.nS, mdp.nS))  # (s, s)
-    Rs = np.zeros((mdp.nS, mdp.nS))  # (s, s)
-    for state in range(mdp.nS):
-        action = pi[state]
-        for prob, s1, reward in mdp.P[state][action]:
-            Ps[state, s1] = prob
-            Rs[state, s1] = reward
-    alpha = np.eye(Ps.shape[0]) - Ps * gamma
-    beta = Ps * Rs
-    print(np.linalg.solve(alpha, beta))
-    V = np.linalg.solve(alpha, beta)[:, -1]
-    return V
+    P_pi, r_pi = policy_arrays(pi, compiled_mdp(mdp))
+    A = sparse.identity(mdp.nS, format='csc') - gamma * P_pi.tocsc()
+    if method == 'direct':
+        return linalg.spsolve(A, r_pi)
+    elif method == 'iterative':
+        try:
+            V, info = linalg.bicgstab(A, r_pi, x0=V0, rtol=tol, atol=0.)
+        except TypeError:
+            # scipy < 1.12 calls the relative tolerance 'tol'
+            V, info = linalg.bicgstab(A, r_pi, x0=V0, tol=tol, atol=0.)
+        if info != 0:
+            raise RuntimeError('Policy evaluation did not converge.')
+        return V
+    else:
+        raise ValueError('Method is not known.')
 
 
 def compute_qpi(vpi, mdp, gamma):
@@ -194,32 +202,36 @@ def compute_qpi(vpi, mdp, gamma):
     Outputs:
         state-action-value Q for current "pi"
     """
-    Qpi = np.zeros([mdp.nS, mdp.nA])
-    for s in range(mdp.nS):
-        for a in range(mdp.nA):
-            for p, s1, r in mdp.P[s][a]:
-                Qpi[s, a] += p * (r + gamma * vpi[s1])
-    return Qpi
+    return bellman_backup(compiled_mdp(mdp), np.asarray(vpi, dtype=np.float64), gamma)
 
 
-def policy_iteration(mdp, gamma, nIt):
+def policy_iteration(mdp, gamma, nIt, k=None, method='direct'):
     """
     Inputs:
         mdp: MDP
         gamma: discount factor
         nIt: number of iterations, corresponding to n above
+        k: modified policy iteration, evaluates each policy with k Bellman sweeps instead of solving for V^pi
+        method: solver of 'compute_vpi', the iterative solver is warm-started with the previous V
     Outputs:
         (value_functions, policies)
     """
+    compiled = compiled_mdp(mdp)
     Vs = []
     pis = []
     pi_prev = np.zeros(mdp.nS, dtype='int')
     pis.append(pi_prev)
+    vpi = np.zeros(mdp.nS)
     for it in range(nIt):
         # need to compute V^pi for current pi
-        vpi = compute_vpi(pis[-1], mdp, gamma)
+        if k is None:
+            vpi = compute_vpi(pis[-1], compiled, gamma, V0=vpi, method=method)
+        else:
+            P_pi, r_pi = policy_arrays(pis[-1], compiled)
+            for _ in range(k):
+                vpi = r_pi + gamma * P_pi.dot(vpi)
         # need to compute Q^pi which is the state-action values for current pi
-        qpi = compute_qpi(vpi, mdp, gamma)
+        qpi = compute_qpi(vpi, compiled, gamma)
         pi = qpi.argmax(axis=1)
         Vs.append(vpi)
         pis.append(pi)
@@ -243,6 +255,72 @@ def tabular_q_learning_update(gamma, alpha, q_vals, cur_state, action, next_stat
     q_vals[cur_state][action] = (1 - alpha) * q_vals[cur_state][action] + alpha * target
 
 
+def batch_q_learning_update(gamma, alpha, q_table, states, actions, next_states, rewards, dones=None) -> np.array:
+    """
+    Q-learning update of a dense q table for a whole batch of transitions
+    Inputs:
+        gamma (float or np.array): discount factor, one per agent for K agents
+        alpha (float or np.array): learning rate, one per agent for K agents
+        q_table (np.array): q values with shape (nS, nA) or (K, nS, nA) for K independent agents
+        states (np.array): integer encoded states with shape (batch_size,) or (K, batch_size)
+        actions (np.array): actions taken in states
+        next_states (np.array): integer encoded next states
+        rewards (np.array): rewards received from the transitions
+        dones (np.array): terminal signals, the next state is not bootstrapped if True
+    Output:
+        td_errors (np.array): targets - Q(s, a) before the update, same shape as states
+    Performs an in-place update of q_table.
+
+    All targets use the q table from before the batch. Transitions with the same (s, a) are
+    applied in batch order, i.e. for m repeated transitions with targets t_0, ..., t_{m-1}:
+    Q(s, a) <- (1 - alpha)^m Q(s, a) + sum_j alpha (1 - alpha)^(m-1-j) t_j
+    which equals m calls of 'tabular_q_learning_update' as long as no next state of the batch
+    is updated within the same batch.
+    """
+    q = q_table[None] if q_table.ndim == 2 else q_table
+    nb_agents, nS, nA = q.shape
+    batch_shape = np.shape(states)
+    shape = (nb_agents, -1)
+    states = np.asarray(states, dtype=np.int64).reshape(shape)
+    actions = np.asarray(actions, dtype=np.int64).reshape(shape)
+    next_states = np.asarray(next_states, dtype=np.int64).reshape(shape)
+    rewards = np.asarray(rewards, dtype=np.float64).reshape(shape)
+    # hyperparameters per agent
+    gamma = np.broadcast_to(np.asarray(gamma, dtype=np.float64).reshape(-1, 1), states.shape)
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=np.float64).reshape(-1, 1), states.shape)
+    agents = np.arange(nb_agents)[:, None]
+    next_vals = q[agents, next_states].max(axis=-1)
+    if dones is not None:
+        next_vals = next_vals * np.logical_not(np.asarray(dones).reshape(shape))
+    targets = rewards + gamma * next_vals
+    td_errors = targets - q[agents, states, actions]
+    # flat (agent, s, a) index of every transition, sorted stably to keep the batch order
+    flat = ((agents * nS + states) * nA + actions).ravel()
+    order = np.argsort(flat, kind='stable')
+    sa, first, counts = np.unique(flat[order], return_index=True, return_counts=True)
+    # position of every transition counted from the end of its (agent, s, a) group
+    rank_from_end = np.repeat(first + counts, counts) - 1 - np.arange(len(order))
+    decay = 1. - alpha.ravel()[order]
+    weights = alpha.ravel()[order] * decay ** rank_from_end
+    group = np.repeat(np.arange(len(sa)), counts)
+    q.flat[sa] = decay[first] ** counts * q.flat[sa] + np.bincount(group, weights=weights * targets.ravel()[order])
+    return td_errors.reshape(batch_shape)
+
+
+def eps_greedy_batch(q_vals, eps, rng: np.random.seed()) -> np.array:
+    """
+    Inputs:
+        q_vals (np.array): q values of the current states with shape (..., n_actions)
+        eps (float or np.array): epsilon, broadcastable to q_vals.shape[:-1]
+        rng (np.random.seed): random number generator
+    Outputs:
+        actions (np.array): random actions with probability of eps; argmax Q(s, .) with probability of (1-eps)
+    """
+    q_vals = np.asarray(q_vals)
+    explore = rng.rand(*q_vals.shape[:-1]) <= eps
+    return np.where(explore, rng.randint(0, q_vals.shape[-1], q_vals.shape[:-1]), np.argmax(q_vals, axis=-1))
+
+
 def eps_greedy(q_vals, eps, rng: np.random.seed()) -> int:
     """
     Inputs:
@@ -266,33 +344,53 @@ def eps_greedy(q_vals, eps, rng: np.random.seed()) -> int:
     return action
 
 
+def bellman_targets(q_vals, q_next_target, actions, rewards, dones, discounts, q_next_online=None) -> (np.array, np.array):
+    """
+    computes the DQN regression targets for a minibatch
+    y[i, a_i] = r_i + discount_i * (1 - done_i) * Q_target(s'_i, argmax_a Q(s'_i, a))
+    Input:
+        q_vals (np.array): Q(s, .) of the online network with shape (batch_size, n_actions)
+        q_next_target (np.array): Q(s', .) of the target network with shape (batch_size, n_actions)
+        actions (np.array): taken actions with shape (batch_size,)
+        rewards (np.array): (n-step) rewards with shape (batch_size,)
+        dones (np.array): terminal signals with shape (batch_size,)
+        discounts (float or np.array): gamma ** n for the bootstrapped value
+        q_next_online (np.array): Q(s', .) of the online network, uses the double DQN target if given
+    Output:
+        targets (np.array): copy of q_vals with the value of the taken actions replaced
+        td_errors (np.array): targets - Q(s, a) of the taken actions
+    """
+    batch = np.arange(len(actions))
+    if q_next_online is None:
+        next_vals = np.max(q_next_target, axis=1)
+    else:
+        next_vals = q_next_target[batch, np.argmax(q_next_online, axis=1)]
+    target_vals = rewards + discounts * np.logical_not(dones) * next_vals
+    targets = np.array(q_vals, copy=True)
+    targets[batch, actions] = target_vals
+    return targets, target_vals - q_vals[batch, actions]
+
+
 def to_one_hot(x, len):
     one_hot = np.zeros(len)
     one_hot[x] = 1
     return one_hot
 
-def overblow(input_array, factor: int) -> np.array:
+def overblow(input_array, factor: int, out=None) -> np.array:
     """
     increase the size of the input array by a factor
     Input:
         input_array (np.array): array to increase
         factor (int): factor with which the input array is increased
+        out (np.array): optional output buffer of shape input_array.shape * factor
     Output:
         out (np.array): increased array with out.shape = input_dim.shape * factor
     """
-    output_r = input_array.shape[0] * factor
-    output_c = input_array.shape[1] * factor
-    filter = np.ones((factor, factor))
-    out = np.array([_ for _ in range(output_r * output_c)]).reshape(output_r, output_c)
-    row_i = 0
-    for rows in range(input_array.shape[0]):
-        row_j = 0
-        for columns in range(input_array.shape[1]):
-            v = np.multiply(input_array[rows, columns], filter)
-            # print(v)
-            out[row_i: row_i + factor, row_j: row_j + factor] = v
-            row_j += factor
-        row_i += factor
+    rows, columns = input_array.shape
+    if out is None:
+        out = np.empty((rows * factor, columns * factor), dtype=input_array.dtype)
+    # every input pixel becomes a (factor x factor) block
+    out.reshape(rows, factor, columns, factor)[...] = input_array[:, np.newaxis, :, np.newaxis]
     return out
 
 
@@ -307,32 +405,31 @@ def rgb2grayscale(color, normalization=False):
         return 0.2126 * color[0] + 0.7152 * color[1] + 0.0722 * color[2]
 
 
+# grayscale value per frame code: 0 = empty, 1 = wall, 2 = fruit, 3 = pacman, 4 = ghost
+FRAME_COLORS = [(0, 0, 0), (80, 80, 80), (0, 100, 255), (255, 255, 255), (255, 0, 0)]
+GRAYSCALE = np.array([rgb2grayscale(color) for color in FRAME_COLORS], dtype=np.float32)
+FRAME_CODES = np.arange(1, len(FRAME_COLORS), dtype=np.int8)[:, np.newaxis, np.newaxis]
+
 
-def make_frame(observation, do_overblow=True, overblow_factor=8):
+def make_frame(observation, do_overblow=True, overblow_factor=8, out=None, dtype=np.float32):
     """
     make grayscale frame out of the observation channels
     Input:
         observation (np.array): observation frame of size (4,...)
         overblow (bool): should the output frame be overblown or not
         overblow_factor (int): factor for change of dimensions
+        out (np.array): optional output buffer which is filled and returned
+        dtype: dtype of the frame, np.uint8 truncates the grayscale values
     Output:
         frame (np.array): grayscale frame array with dim (observation.shape)
     """
-    WHITE = (255, 255, 255)
-    BLACK = (0, 0, 0)
-    RED = (255, 0, 0)
-    BLUE = (0, 100, 255)
-    WALL = (80, 80, 80)
-    frame = np.zeros(shape=observation[0, ...].shape, dtype=np.float32)
-    # wall
-    frame[observation[0, ...] != 0] = rgb2grayscale(WALL, normalization=False)
-    # fruit
-    frame[observation[1, ...] != 0] = rgb2grayscale(BLUE, normalization=False)
-    # pacman
-    frame[observation[2, ...] != 0] = rgb2grayscale(WHITE, normalization=False)
-    # ghosts
-    frame[observation[3, ...] != 0] = rgb2grayscale(RED, normalization=False)
+    # later channels are drawn on top: wall, fruit, pacman, ghosts
+    code = np.max((observation != 0) * FRAME_CODES, axis=0)
+    frame = GRAYSCALE.astype(dtype, copy=False)[code]
     if do_overblow:
-        frame = overblow(input_array=frame, factor=overblow_factor)
+        frame = overblow(input_array=frame, factor=overblow_factor, out=out)
+    elif out is not None:
+        out[...] = frame
+        frame = out
     # frame dim = (obs.shape)
     return frame
@@ -4,18 +4,28 @@ Created on October 5, 2018
 @author: mae-ma
 @attention: replay buffer for DQN
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 1.0.0
+@version: 1.5.3
 
 #############################################################################################
 
 History:
+- v1.5.3: load copy-on-write, the loaded dump is not changed until the next dump
+- v1.5.2: 'PrioritizedReplayBuffer' draws every slot from its own random state
+- v1.5.1: 'FrameReplayBuffer' compares frame contents, no endless sampling without transitions
+- v1.5.0: n-step returns for the array based replay buffers
+- v1.4.0: memory-mapped '.npy' persistence of the array based replay buffers
+- v1.3.0: add 'SumTree' and 'PrioritizedReplayBuffer'
+- v1.2.0: add 'FrameReplayBuffer' which stores every observation only once
+- v1.1.0: add 'ArrayReplayBuffer' with preallocated numpy storage
 - v1.0.0: first init
 """
 
 
+import os
 import numpy as np
 import random
 import pickle
+import yaml
 
 
 class ReplayBuffer(object):
@@ -60,13 +70,19 @@ class ReplayBuffer(object):
         for i in idxes:
             data = self._buffer[i]
             obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
+            obses_t.append(np.asarray(obs_t))
+            actions.append(np.asarray(action))
             rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
+            obses_tp1.append(np.asarray(obs_tp1))
             dones.append(done)
         return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
 
+    def _sample_idxes(self, batch_size):
+        """
+        Draw uniformly distributed indices of stored transitions.
+        """
+        return [random.randint(0, len(self) - 1) for _ in range(batch_size)]
+
     def sample(self, batch_size):
         """
         Sample a batch of transition tuples.
@@ -74,8 +90,7 @@ class ReplayBuffer(object):
         :param batch_size: Number of sampled transition tuples.
         :return: Tuple of transitions.
         """
-        idxes = [random.randint(0, len(self._buffer) - 1)
-                 for _ in range(batch_size)]
+        idxes = self._sample_idxes(batch_size)
         return self._encode_sample(idxes)
 
     def dump(self, file_path=None):
@@ -86,6 +101,12 @@ class ReplayBuffer(object):
         pickle.dump(self._buffer, file, -1)
         file.close()
 
+    def can_load(self, file_path):
+        """
+        check if 'file_path' holds a dump of this kind of replay buffer
+        """
+        return os.path.isfile(file_path)
+
     def load(self, file_path=None):
         """
         Load the replay buffer from a file
@@ -93,3 +114,523 @@ class ReplayBuffer(object):
         file = open(file_path, 'rb')
         self._buffer = pickle.load(file)
         file.close()
+
+
+class ArrayReplayBuffer(ReplayBuffer):
+    def __init__(self, max_size, directory=None):
+        """
+        Replay buffer which stores the (s, a, r, s', done) transitions in preallocated numpy arrays.
+        The arrays are allocated with the shape and dtype of the first added transition and are
+        filled as a ring buffer. Sampling draws the same indices as 'ReplayBuffer' and gathers
+        the minibatch with a single fancy-index per array.
+        If a directory is given, the arrays are memory-mapped '.npy' files in this directory and
+        'dump' only has to flush them and write the small 'header.yml'.
+
+        :param max_size: Maximum size of the replay buffer.
+        :param directory: directory for the memory-mapped storage, None keeps the arrays in memory
+        """
+        super().__init__(max_size=max_size)
+        self._buffer = None
+        self._nb_slots = self._max_size
+        # number of stored transitions
+        self._size = 0
+        # name -> preallocated np.array of shape (max_size, ...)
+        self._storage = {}
+        self._directory = directory
+        if self._directory is not None:
+            os.makedirs(self._directory, exist_ok=True)
+
+    def __len__(self):
+        return self._size
+
+    def _allocate_array(self, name, shape, dtype):
+        """
+        Allocate an array in memory or as memory-mapped file if the buffer has a directory.
+        """
+        if self._directory is None:
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self._directory, name + '.npy'), mode='w+',
+                                         dtype=dtype, shape=tuple(shape))
+
+    def _allocate(self, name, shape, dtype):
+        """
+        Allocate the storage array 'name' for one element of the given shape and dtype per slot.
+        """
+        self._storage[name] = self._allocate_array(name, (self._nb_slots,) + tuple(shape), dtype)
+
+    def _init_storage(self, obs_t, act, rew, obs_tp1, done):
+        """
+        Allocate all storage arrays from the first transition.
+        """
+        obs_t = np.asarray(obs_t)
+        self._allocate('obs_t', obs_t.shape, obs_t.dtype)
+        self._allocate('act', np.shape(act), np.asarray(act).dtype)
+        self._allocate('rew', np.shape(rew), np.float32)
+        self._allocate('obs_tp1', obs_t.shape, obs_t.dtype)
+        self._allocate('done', (), np.bool_)
+
+    def add(self, obs_t, act, rew, obs_tp1, done):
+        """
+        Add a new sample to the replay buffer.
+        :param obs_t: observation at time t
+        :param act:  action
+        :param rew: reward
+        :param obs_tp1: observation at time t+1
+        :param done: termination signal (whether episode has finished or not)
+        """
+        if not self._storage:
+            self._init_storage(obs_t, act, rew, obs_tp1, done)
+        self._storage['obs_t'][self._idx] = obs_t
+        self._storage['act'][self._idx] = act
+        self._storage['rew'][self._idx] = rew
+        self._storage['obs_tp1'][self._idx] = obs_tp1
+        self._storage['done'][self._idx] = done
+        self._idx = (self._idx + 1) % self._max_size
+        self._size = min(self._size + 1, self._max_size)
+
+    def _encode_sample(self, idxes):
+        """
+        encode samples as numpy array of observations,
+        actions, rewards, next observations and terminal signals
+        """
+        idxes = np.asarray(idxes, dtype=np.int64)
+        return self._storage['obs_t'][idxes], self._storage['act'][idxes], self._storage['rew'][idxes], \
+            self._storage['obs_tp1'][idxes], self._storage['done'][idxes]
+
+    def _next_obs(self, idxes):
+        """
+        next observations of the transitions 'idxes'
+        """
+        return self._storage['obs_tp1'][idxes]
+
+    def _next_transition(self, idxes):
+        """
+        :return: slots of the following transitions and a mask whether they continue the episode
+        """
+        next_idxes = (idxes + 1) % self._nb_slots
+        # the write head has not been written yet or holds the oldest transition
+        follows = np.logical_not(self._storage['done'][idxes]) & (next_idxes != self._idx)
+        obs_tp1 = self._storage['obs_tp1'][idxes].reshape(len(idxes), -1)
+        obs_t = self._storage['obs_t'][next_idxes].reshape(len(idxes), -1)
+        return next_idxes, follows & np.all(obs_tp1 == obs_t, axis=1)
+
+    def encode_n_step(self, idxes, n_step, gamma):
+        """
+        encode samples with n-step returns
+        :param idxes: slots of the first transitions
+        :param n_step: maximum number of summed rewards, fewer at the end of an episode
+        :param gamma: discount factor
+        :return: observations, actions, discounted n-step returns, observations after the last step,
+            terminal signals of the last step and the discount gamma ** k of the bootstrapped value
+        """
+        idxes = np.array(idxes, dtype=np.int64)
+        obs_t, act, returns, _, done = self._encode_sample(idxes)
+        returns = returns.astype(np.float32)
+        discounts = np.full(len(idxes), gamma, dtype=np.float32)
+        active = np.logical_not(done)
+        for _ in range(1, n_step):
+            if not np.any(active):
+                break
+            sel = np.flatnonzero(active)
+            next_idxes, follows = self._next_transition(idxes[sel])
+            sel, next_idxes = sel[follows], next_idxes[follows]
+            active[:] = False
+            active[sel] = True
+            returns[sel] += discounts[sel] * self._storage['rew'][next_idxes]
+            discounts[sel] *= gamma
+            idxes[sel] = next_idxes
+            done[sel] = self._storage['done'][next_idxes]
+            active &= np.logical_not(done)
+        return obs_t, act, returns, self._next_obs(idxes), done, discounts
+
+    def sample_n_step(self, batch_size, n_step, gamma):
+        """
+        Sample a batch of transitions with n-step returns, see 'encode_n_step'.
+        """
+        return self.encode_n_step(self._sample_idxes(batch_size), n_step, gamma)
+
+    def _get_header(self):
+        """
+        scalar state of the buffer which is stored next to the arrays
+        """
+        return {'idx': int(self._idx), 'size': int(self._size)}
+
+    def _set_header(self, header):
+        self._idx = header['idx']
+        self._size = header['size']
+
+    def _attach(self, directory):
+        """
+        Move the storage into memory-mapped files in 'directory'.
+        The files are written under a temporary name and renamed afterwards, the current storage may
+        be a copy-on-write mapping of the files which are replaced.
+        """
+        self._directory = directory
+        os.makedirs(self._directory, exist_ok=True)
+        for name, array in self._storage.items():
+            path = os.path.join(self._directory, name + '.npy')
+            mapped = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=array.dtype, shape=array.shape)
+            mapped[...] = array
+            mapped.flush()
+            os.replace(path + '.tmp', path)
+            self._storage[name] = mapped
+
+    def dump(self, file_path=None):
+        """
+        Dump the replay buffer into a directory of '.npy' files and a 'header.yml'.
+        The first dump into a directory moves the storage into memory-mapped files there, all
+        following dumps only flush the changed pages to disk.
+        :param file_path: directory of the dump, None uses the directory of the buffer
+        """
+        if file_path is None:
+            file_path = self._directory
+        if file_path is None:
+            raise ValueError('Replay buffer has no directory, the dump needs a file_path.')
+        if self._directory is None or os.path.abspath(file_path) != os.path.abspath(self._directory):
+            self._attach(file_path)
+        for array in self._storage.values():
+            array.flush()
+        header = self._get_header()
+        header.update({'type': type(self).__name__, 'max_size': int(self._max_size),
+                       'arrays': sorted(self._storage.keys())})
+        # write the header last and atomically, it marks the dump as complete
+        header_path = os.path.join(self._directory, 'header.yml')
+        with open(header_path + '.tmp', 'w') as file:
+            yaml.safe_dump(header, file)
+        os.replace(header_path + '.tmp', header_path)
+
+    def can_load(self, file_path):
+        """
+        check if 'file_path' holds a dump of this kind of replay buffer
+        """
+        header_path = os.path.join(file_path, 'header.yml')
+        if not os.path.isfile(header_path):
+            return False
+        with open(header_path, 'r') as file:
+            header = yaml.safe_load(file)
+        return header.get('type') == type(self).__name__
+
+    def load(self, file_path=None):
+        """
+        Load the replay buffer from a directory by memory-mapping the '.npy' files copy-on-write.
+        New transitions stay in memory and do not change the dump, the next 'dump' moves the
+        storage into memory-mapped files of its own directory.
+        :param file_path: directory of the dump
+        """
+        with open(os.path.join(file_path, 'header.yml'), 'r') as file:
+            header = yaml.safe_load(file)
+        if header.get('type') != type(self).__name__:
+            raise ValueError('Replay buffer dump is a ' + str(header.get('type')) + ', not a ' + type(self).__name__)
+        # the buffer does not own the loaded files
+        self._directory = None
+        self._max_size = header['max_size']
+        self._storage = {}
+        for name in header['arrays']:
+            self._storage[name] = np.lib.format.open_memmap(os.path.join(file_path, name + '.npy'), mode='c')
+        if self._storage:
+            self._nb_slots = len(next(iter(self._storage.values())))
+        self._set_header(header)
+
+
+class FrameReplayBuffer(ArrayReplayBuffer):
+    def __init__(self, max_size, directory=None):
+        """
+        Replay buffer which stores every observation only once.
+        Observations are written as frames into a ring of 'max_size' + 1 slots. The transition in
+        slot j uses frame j as s and frame j + 1 as s'. If 'obs_t' of a new transition is the 'obs_tp1'
+        of the previous one, the frame is reused, otherwise (e.g. at the start of an episode) a new
+        frame is written and the slot in between does not hold a transition.
+
+        :param max_size: Maximum size of the replay buffer.
+        :param directory: directory for the memory-mapped storage, None keeps the arrays in memory
+        """
+        super().__init__(max_size=max_size, directory=directory)
+        self._nb_slots = self._max_size + 1
+        # number of slots which hold a frame
+        self._nb_filled = 0
+        # slot of the last 'obs_tp1' which may be reused as 'obs_t'
+        self._pending = None
+
+    def _init_storage(self, obs_t, act, rew, obs_tp1, done):
+        """
+        Allocate all storage arrays from the first transition.
+        """
+        obs_t = np.asarray(obs_t)
+        self._allocate('frame', obs_t.shape, obs_t.dtype)
+        self._allocate('act', np.shape(act), np.asarray(act).dtype)
+        self._allocate('rew', np.shape(rew), np.float32)
+        self._allocate('done', (), np.bool_)
+        # slot holds the start of a transition
+        self._allocate('valid', (), np.bool_)
+
+    def _write_frame(self, frame):
+        """
+        write the frame into the next slot and invalidate the old transition of this slot
+        :return: slot of the written frame
+        """
+        slot = self._idx
+        if self._storage['valid'][slot]:
+            self._storage['valid'][slot] = False
+            self._size -= 1
+        self._storage['frame'][slot] = frame
+        self._idx = (self._idx + 1) % self._nb_slots
+        self._nb_filled = min(self._nb_filled + 1, self._nb_slots)
+        return slot
+
+    def _is_pending(self, obs_t):
+        """
+        check if 'obs_t' is the last stored 'obs_tp1'
+        (the contents are compared, the caller may have changed the observation array in place)
+        """
+        if self._pending is None:
+            return False
+        return np.array_equal(obs_t, self._storage['frame'][self._pending])
+
+    def add(self, obs_t, act, rew, obs_tp1, done):
+        """
+        Add a new sample to the replay buffer.
+        :param obs_t: observation at time t
+        :param act:  action
+        :param rew: reward
+        :param obs_tp1: observation at time t+1
+        :param done: termination signal (whether episode has finished or not)
+        """
+        if not self._storage:
+            self._init_storage(obs_t, act, rew, obs_tp1, done)
+        if self._is_pending(obs_t):
+            slot = self._pending
+        else:
+            slot = self._write_frame(obs_t)
+        self._storage['act'][slot] = act
+        self._storage['rew'][slot] = rew
+        self._storage['done'][slot] = done
+        self._storage['valid'][slot] = True
+        self._size += 1
+        self._pending = self._write_frame(obs_tp1)
+
+    def _sample_idxes(self, batch_size):
+        """
+        Draw uniformly distributed slots which hold a transition.
+        """
+        if len(self) == 0:
+            raise ValueError('Replay buffer holds no transition.')
+        idxes = []
+        while len(idxes) < batch_size:
+            idx = random.randint(0, self._nb_filled - 1)
+            if self._storage['valid'][idx]:
+                idxes.append(idx)
+        return idxes
+
+    def _encode_sample(self, idxes):
+        """
+        encode samples as numpy array of observations,
+        actions, rewards, next observations and terminal signals
+        """
+        idxes = np.asarray(idxes, dtype=np.int64)
+        next_idxes = (idxes + 1) % self._nb_slots
+        return self._storage['frame'][idxes], self._storage['act'][idxes], self._storage['rew'][idxes], \
+            self._storage['frame'][next_idxes], self._storage['done'][idxes]
+
+    def _next_obs(self, idxes):
+        return self._storage['frame'][(idxes + 1) % self._nb_slots]
+
+    def _next_transition(self, idxes):
+        next_idxes = (idxes + 1) % self._nb_slots
+        # a valid next slot starts with the frame 'obs_tp1' of this transition
+        return next_idxes, np.logical_not(self._storage['done'][idxes]) & self._storage['valid'][next_idxes]
+
+    def _get_header(self):
+        header = super()._get_header()
+        header.update({'nb_filled': int(self._nb_filled),
+                       'pending': None if self._pending is None else int(self._pending)})
+        return header
+
+    def _set_header(self, header):
+        super()._set_header(header)
+        self._nb_filled = header['nb_filled']
+        self._pending = header['pending']
+
+
+class SumTree(object):
+    def __init__(self, capacity):
+        """
+        Array based binary sum-tree for proportional sampling.
+        The leaves hold the priorities, every inner node the sum of its two children. The root is at
+        index 1 and the children of node i are 2i and 2i + 1, so sampling and updating a batch of
+        leaves costs O(batch_size * log(capacity)) numpy operations on whole tree levels.
+
+        :param capacity: number of leaves
+        """
+        self.capacity = int(capacity)
+        self._nb_leaves = 1
+        while self._nb_leaves < self.capacity:
+            self._nb_leaves *= 2
+        self._depth = int(np.log2(self._nb_leaves))
+        self.tree = np.zeros(2 * self._nb_leaves, dtype=np.float64)
+
+    def total(self):
+        """
+        sum of all priorities
+        """
+        return self.tree[1]
+
+    def get(self, idxes):
+        """
+        priorities of the leaves 'idxes'
+        """
+        return self.tree[np.asarray(idxes, dtype=np.int64) + self._nb_leaves]
+
+    def update(self, idxes, priorities):
+        """
+        set the priorities of the leaves 'idxes' and update all sums up to the root
+        """
+        nodes = np.asarray(idxes, dtype=np.int64) + self._nb_leaves
+        if nodes.size == 1:
+            # single leaf (e.g. a new transition): plain python is faster than numpy on whole levels
+            self._update_leaf(int(nodes.flat[0]), float(np.asarray(priorities).flat[0]))
+            return
+        self.tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def _update_leaf(self, node, priority):
+        tree = self.tree
+        tree[node] = priority
+        node //= 2
+        while node >= 1:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def find(self, values):
+        """
+        find the leaves for the prefix sums 'values' with 0 <= value < total
+        :return: leaf indices
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(values.shape, dtype=np.int64)
+        for _ in range(self._depth):
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= left * go_right
+            nodes = 2 * nodes + go_right
+        return nodes - self._nb_leaves
+
+
+class PrioritizedReplayBuffer(FrameReplayBuffer):
+    def __init__(self, max_size, alpha=0.6, eps=1e-6, rng=None, directory=None):
+        """
+        Prioritized experience replay from 'Prioritized Experience Replay' by Schaul et al. 2015.
+        Transitions are stored like in 'FrameReplayBuffer' and are sampled proportional to
+        priority ** alpha with a 'SumTree' over the slots. Slots without a transition have
+        priority 0 and are never sampled. New transitions get the maximum priority seen so far.
+
+        :param max_size: Maximum size of the replay buffer.
+        :param alpha: how much prioritization is used (0: uniform sampling)
+        :param eps: small value added to the TD-errors so no transition has priority 0
+        :param rng: np.random.RandomState used for sampling
+        :param directory: directory for the memory-mapped storage, None keeps the arrays in memory
+        """
+        super().__init__(max_size=max_size, directory=directory)
+        self._alpha = alpha
+        self._eps = eps
+        self._rng = rng if rng is not None else np.random.RandomState()
+        self._tree = SumTree(self._nb_slots)
+        self._max_priority = 1.0
+
+    def _init_storage(self, obs_t, act, rew, obs_tp1, done):
+        super()._init_storage(obs_t, act, rew, obs_tp1, done)
+        # the tree is stored with the other arrays
+        tree = self._allocate_array('tree', self._tree.tree.shape, self._tree.tree.dtype)
+        tree[...] = self._tree.tree
+        self._storage['tree'] = self._tree.tree = tree
+
+    def _write_frame(self, frame):
+        slot = super()._write_frame(frame)
+        self._tree.update([slot], [0.0])
+        return slot
+
+    def add(self, obs_t, act, rew, obs_tp1, done):
+        """
+        Add a new sample with maximum priority to the replay buffer.
+        :param obs_t: observation at time t
+        :param act:  action
+        :param rew: reward
+        :param obs_tp1: observation at time t+1
+        :param done: termination signal (whether episode has finished or not)
+        """
+        super().add(obs_t, act, rew, obs_tp1, done)
+        # the transition is stored in the slot before the pending 'obs_tp1'
+        slot = (self._pending - 1) % self._nb_slots
+        self._tree.update([slot], [self._max_priority ** self._alpha])
+
+    def _sample_idxes(self, batch_size):
+        """
+        Draw slots proportional to their priority, one from each of 'batch_size' equal segments.
+        """
+        total = self._tree.total()
+        values = (np.arange(batch_size) + self._rng.rand(batch_size)) * total / batch_size
+        values = np.minimum(values, np.nextafter(total, 0))
+        idxes = self._tree.find(values)
+        # rounding errors may end in an empty slot, replaced by a uniformly drawn transition
+        empty = self._tree.get(idxes) <= 0
+        if np.any(empty):
+            valid = np.flatnonzero(self._storage['valid'][:self._nb_filled])
+            idxes[empty] = valid[self._rng.randint(0, len(valid), int(np.sum(empty)))]
+        return idxes
+
+    def _weights(self, idxes, beta):
+        """
+        importance sampling weights, normalized with the largest weight of the batch
+        """
+        probs = self._tree.get(idxes) / self._tree.total()
+        weights = (len(self) * probs) ** (-beta)
+        return (weights / np.max(weights)).astype(np.float32)
+
+    def sample(self, batch_size, beta=0.4):
+        """
+        Sample a batch of transition tuples with importance sampling weights.
+
+        :param batch_size: Number of sampled transition tuples.
+        :param beta: how much the importance sampling weights compensate the prioritization (1: fully)
+        :return: Tuple of transitions, importance sampling weights and the slots of the transitions
+            which are needed for 'update_priorities'.
+        """
+        idxes = self._sample_idxes(batch_size)
+        return self._encode_sample(idxes) + (self._weights(idxes, beta), idxes)
+
+    def sample_n_step(self, batch_size, n_step, gamma, beta=0.4):
+        """
+        Sample a batch of transitions with n-step returns, see 'encode_n_step' and 'sample'.
+        """
+        idxes = self._sample_idxes(batch_size)
+        return self.encode_n_step(idxes, n_step, gamma) + (self._weights(idxes, beta), idxes)
+
+    def update_priorities(self, idxes, td_errors):
+        """
+        Update the priorities of sampled transitions with their new TD-errors.
+        :param idxes: slots returned by 'sample'
+        :param td_errors: TD-errors of the transitions
+        """
+        priorities = np.abs(td_errors) + self._eps
+        # slots which have been overwritten since sampling keep their priority
+        valid = self._storage['valid'][idxes]
+        self._tree.update(np.asarray(idxes)[valid], priorities[valid] ** self._alpha)
+        self._max_priority = max(self._max_priority, float(np.max(priorities)))
+
+    def _get_header(self):
+        header = super()._get_header()
+        header.update({'max_priority': float(self._max_priority)})
+        return header
+
+    def _set_header(self, header):
+        super()._set_header(header)
+        self._max_priority = header['max_priority']
+        self._tree = SumTree(self._nb_slots)
+        if 'tree' in self._storage:
+            self._tree.tree = self._storage['tree']
+
+    def _attach(self, directory):
+        super()._attach(directory)
+        if 'tree' in self._storage:
+            self._tree.tree = self._storage['tree']
@@ -0,0 +1,111 @@
+"""
+Created on October 5, 2018
+
+@author: mae-ma
+@attention: benchmark for the target computation of the DQN architecture
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the latency of the host side of one 'DeepQNetwork._replay' update: sampling the
+minibatch and building the regression targets. The Q-values of the networks are random
+arrays, so the forward passes and the gradient step are not part of the measurement.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from architectures.replay_buffer import ReplayBuffer, FrameReplayBuffer
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMMA = 0.85
+NB_ACTIONS = 4
+
+
+def fill(buffer, size):
+    rng = np.random.RandomState(0)
+    obs = rng.rand(100).astype(np.float32)
+    for step in range(size):
+        obs_tp1 = rng.rand(100).astype(np.float32)
+        buffer.add(obs_t=obs, act=rng.randint(0, NB_ACTIONS), rew=100. * (rng.rand() < 0.05), obs_tp1=obs_tp1,
+                   done=step % 300 == 299)
+        obs = obs_tp1
+
+
+def legacy_update(buffer, batch_size, q_vals, q_next):
+    """
+    sampling and target loop of '_replay' before the batched targets
+    """
+    state_a, action_a, reward_a, next_state_a, done_a = buffer.sample(batch_size=batch_size)
+    state_input = np.zeros((batch_size, 100))
+    next_state_input = np.zeros((batch_size, 100))
+    action, reward, done = [], [], []
+    state_input = state_a
+    next_state_input = next_state_a
+    for i in range(batch_size):
+        action.append(action_a[i])
+        reward.append(reward_a[i])
+        done.append(done_a[i])
+    y = q_vals.copy()
+    y_target = q_next
+    for i in range(batch_size):
+        if done[i]:
+            y[i][action[i]] = reward[i]
+        else:
+            y[i][action[i]] = reward[i] + GAMMA * np.amax(y_target[i])
+    return y
+
+
+def batched_update(buffer, batch_size, q_vals, q_next, n_step, double):
+    state_a, action_a, reward_a, next_state_a, done_a, discount_a = buffer.sample_n_step(
+        batch_size=batch_size, n_step=n_step, gamma=GAMMA)
+    return mc.bellman_targets(q_vals=q_vals, q_next_target=q_next, actions=action_a, rewards=reward_a,
+                              dones=done_a, discounts=discount_a, q_next_online=q_next if double else None)
+
+
+def latency(fct, repetitions):
+    """
+    :return: mean latency in micro seconds
+    """
+    start = time.time()
+    for _ in range(repetitions):
+        fct()
+    return (time.time() - start) / repetitions * 1e6
+
+
+@click.command()
+@click.option('--size', '-s', default=10000, help='number of stored transitions')
+@click.option('--repetitions', '-n', default=500, help='number of timed updates')
+def run(size, repetitions):
+    list_buffer = ReplayBuffer(size)
+    frame_buffer = FrameReplayBuffer(size)
+    fill(list_buffer, size)
+    fill(frame_buffer, size)
+    rng = np.random.RandomState(1)
+    print('latency per update in µs')
+    print('–' * 90)
+    for batch_size in [32, 256, 1024]:
+        q_vals = rng.randn(batch_size, NB_ACTIONS).astype(np.float32)
+        q_next = rng.randn(batch_size, NB_ACTIONS).astype(np.float32)
+        results = [
+            latency(lambda: legacy_update(list_buffer, batch_size, q_vals, q_next), repetitions),
+            latency(lambda: batched_update(frame_buffer, batch_size, q_vals, q_next, 1, False), repetitions),
+            latency(lambda: batched_update(frame_buffer, batch_size, q_vals, q_next, 3, False), repetitions),
+            latency(lambda: batched_update(frame_buffer, batch_size, q_vals, q_next, 1, True), repetitions)]
+        print('batch size: {:5d} | legacy: {:8.1f} | batched: {:8.1f} | 3-step: {:8.1f} | double: {:8.1f}'.format(
+            batch_size, *results))
+
+
+if __name__ == '__main__':
+    run()
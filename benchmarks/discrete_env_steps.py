@@ -0,0 +1,74 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the stepping speed of 'ci.discrete_env.DiscreteEnv'
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the steps per second of FrozenLakeEnv with random actions for the legacy sampling from P,
+the compiled single step and the batched step of M copies.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from ci.frozen_lake import FrozenLakeEnv
+from ci.discrete_env import categorical_sample
+###############################
+
+import time
+import click
+import numpy as np
+
+
+def legacy_step(env, a):
+    transitions = env.P[env.s][a]
+    i = categorical_sample([t[0] for t in transitions], env.np_random)
+    p, s, r, d = transitions[i]
+    env.s = s
+    return s, r, d, {'prob': p}
+
+
+def single(env, step, actions):
+    start = time.time()
+    for a in actions:
+        if step(env, a)[2]:
+            env._reset()
+    return len(actions) / (time.time() - start)
+
+
+def batched(env, actions):
+    env.reset_batch(actions.shape[1])
+    start = time.time()
+    for a in actions:
+        env.step_batch(a)
+    return actions.size / (time.time() - start)
+
+
+@click.command()
+@click.option('--steps', '-s', default=100000, help='number of timed single steps')
+@click.option('--nb-envs', '-n', default=4096, help='number of copies of the batched step')
+def run(steps, nb_envs):
+    rng = np.random.RandomState(0)
+    print('steps per second')
+    print('–' * 80)
+    for map_name in ['4x4', '8x8']:
+        env = FrozenLakeEnv(map_name=map_name)
+        actions = rng.randint(0, env.nA, steps).tolist()
+        legacy = single(env, legacy_step, actions)
+        compiled = single(env, lambda e, a: e._step(a), actions)
+        batch = batched(env, rng.randint(0, env.nA, (max(steps // nb_envs, 10), nb_envs)))
+        print('{:4s} | legacy: {:9.0f} | compiled: {:9.0f} | batched: {:11.0f}'.format(map_name, legacy, compiled,
+                                                                                     batch))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,91 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the frame construction of the DQN input
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the latency of 'misc.make_frame' for the Mini (10 x 10) and Large (21 x 14) grids
+and different overblow factors, compared to the loop based implementation it replaced.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from environment.fruit_collection import FruitCollectionMini, FruitCollectionLarge
+###############################
+
+import time
+import click
+import numpy as np
+
+
+def legacy_overblow(input_array, factor):
+    output_r = input_array.shape[0] * factor
+    output_c = input_array.shape[1] * factor
+    filter = np.ones((factor, factor))
+    out = np.array([_ for _ in range(output_r * output_c)]).reshape(output_r, output_c)
+    row_i = 0
+    for rows in range(input_array.shape[0]):
+        row_j = 0
+        for columns in range(input_array.shape[1]):
+            out[row_i: row_i + factor, row_j: row_j + factor] = np.multiply(input_array[rows, columns], filter)
+            row_j += factor
+        row_i += factor
+    return out
+
+
+def legacy_make_frame(observation, overblow_factor):
+    frame = np.zeros(shape=observation[0, ...].shape, dtype=np.float32)
+    frame[observation[0, ...] != 0] = mc.rgb2grayscale((80, 80, 80))
+    frame[observation[1, ...] != 0] = mc.rgb2grayscale((0, 100, 255))
+    frame[observation[2, ...] != 0] = mc.rgb2grayscale((255, 255, 255))
+    frame[observation[3, ...] != 0] = mc.rgb2grayscale((255, 0, 0))
+    if overblow_factor > 1:
+        frame = legacy_overblow(frame, overblow_factor)
+    return frame
+
+
+def latency(fct, repetitions):
+    """
+    :return: mean latency in micro seconds
+    """
+    start = time.time()
+    for _ in range(repetitions):
+        fct()
+    return (time.time() - start) / repetitions * 1e6
+
+
+@click.command()
+@click.option('--repetitions', '-n', default=200, help='number of timed frames')
+def run(repetitions):
+    print('latency per frame in µs')
+    print('–' * 90)
+    for name, env_class in [('mini', FruitCollectionMini), ('large', FruitCollectionLarge)]:
+        obs = env_class().get_state_pixel()
+        for factor in [1, 4, 8]:
+            shape = (obs.shape[1] * factor, obs.shape[2] * factor)
+            out_float = np.empty(shape, dtype=np.float32)
+            out_uint8 = np.empty(shape, dtype=np.uint8)
+            results = [
+                latency(lambda: legacy_make_frame(obs, factor), repetitions),
+                latency(lambda: mc.make_frame(obs, do_overblow=factor > 1, overblow_factor=factor), repetitions),
+                latency(lambda: mc.make_frame(obs, do_overblow=factor > 1, overblow_factor=factor, out=out_float),
+                        repetitions),
+                latency(lambda: mc.make_frame(obs, do_overblow=factor > 1, overblow_factor=factor, out=out_uint8,
+                                              dtype=np.uint8), repetitions)]
+            print('{:5s} x{} | legacy: {:8.1f} | vectorized: {:8.1f} | buffer: {:8.1f} | uint8: {:8.1f}'.format(
+                name, factor, *results))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,80 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for saving the rendered frames of the fruit collection games
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the time per rendered step (step + render) of FruitCollectionLarge with image_saving:
+the legacy synchronous pygame.image.save of the window, the synchronous FrameWriter and the
+background FrameWriter for every format and drop policy. The time of the background writers
+without the final flush is the overhead seen by the environment loop.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+from environment.fruit_collection import FruitCollectionLarge
+from environment.frame_writer import FrameWriter
+###############################
+
+import time
+import shutil
+import tempfile
+import click
+import pygame
+import numpy as np
+
+
+def time_per_step(env, steps, save=None):
+    actions = np.random.RandomState(0).randint(0, 4, steps).tolist()
+    start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+        env.render()
+        if save is not None:
+            save()
+    loop = time.perf_counter() - start
+    if env.frame_writer is not None:
+        env.frame_writer.flush()
+    return loop / steps * 1e6, (time.perf_counter() - start) / steps * 1e6
+
+
+@click.command()
+@click.option('--steps', '-s', default=500, help='number of rendered steps')
+@click.option('--max-queue', '-q', default=64, help='queue size of the frame writer')
+def run(steps, max_queue):
+    render_dir = tempfile.mkdtemp()
+    print('time per rendered step in us (FruitCollectionLarge, queue size {})'.format(max_queue))
+    print('–' * 80)
+    env = FruitCollectionLarge(rng=np.random.RandomState(0), render_dir=render_dir)
+    print('{:24s} | loop: {:8.0f}'.format('no saving', time_per_step(env, steps)[0]))
+    env = FruitCollectionLarge(rng=np.random.RandomState(0), rendering=True, render_dir=render_dir)
+    path = os.path.join(render_dir, 'screen.jpg')
+    legacy = time_per_step(env, steps, lambda: pygame.image.save(env.screen, path))[0]
+    env.close()
+    print('{:24s} | loop: {:8.0f}'.format('legacy pygame jpg', legacy))
+    writers = [('sync jpg', FrameWriter('jpg', scale=30, asynchronous=False))]
+    writers += [('async {} {}'.format(fmt, policy), FrameWriter(fmt, max_queue, policy, scale=30))
+                for fmt in ['jpg', 'npz', 'gif'] for policy in ['block', 'newest']]
+    for name, writer in writers:
+        env = FruitCollectionLarge(rng=np.random.RandomState(0), image_saving=True, render_dir=render_dir,
+                                   frame_writer=writer)
+        loop, total = time_per_step(env, steps)
+        env.close()
+        print('{:24s} | loop: {:8.0f} | with flush: {:8.0f} | dropped: {:5d}'.format(
+            name, loop, total, writer.nb_dropped))
+    shutil.rmtree(render_dir)
+
+
+if __name__ == '__main__':
+    run()
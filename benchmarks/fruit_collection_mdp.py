@@ -0,0 +1,68 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the tabular MDP of the fruit collection games
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Enumerates the reachable state space of fruit collection games as 'FruitCollectionMDP' and solves
+it exactly with value iteration. Reports state counts, memory use and timings.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from architectures.mdp import FruitCollectionMDP
+from environment.fruit_collection import FruitCollectionMini, FruitCollectionTiny
+###############################
+
+import time
+import itertools
+import click
+import numpy as np
+
+
+def all_starts(env):
+    """
+    every start of the game: nb_fruits of the possible fruits and any free cell for the player
+    """
+    # possible fruits are stored as [y, x]
+    fruit_cells = [(x, y) for y, x in env.possible_fruits]
+    masks = [sum(1 << bit for bit in bits) for bits in itertools.combinations(range(len(fruit_cells)), env.nb_fruits)]
+    cells = [(x, y) for x in range(env.scr_w) for y in range(env.scr_h)
+             if not env.wall_grid[x, y] and (x, y) not in fruit_cells]
+    return cells, masks
+
+
+@click.command()
+@click.option('--gamma', '-g', default=0.9, help='discount factor')
+@click.option('--tol', '-t', default=1e-8, help='convergence tolerance of the value iteration')
+def run(gamma, tol):
+    print('{:22s} | {:>8s} | {:>9s} | {:>8s} | {:>11s} | {:>6s} | {:>8s}'.format(
+        'game', 'states', 'entries', 'MB', 'enumerate s', 'sweeps', 'solve s'))
+    print('–' * 90)
+    games = [('mini', FruitCollectionMini(), False), ('tiny (5x5)', FruitCollectionTiny(is_ghost=False), False),
+             ('tiny (5x5) + ghost', FruitCollectionTiny(lives=1), True)]
+    for name, env, with_ghosts in games:
+        cells, masks = all_starts(env)
+        start = time.time()
+        mdp = FruitCollectionMDP(env, start_cells=cells, start_masks=masks, with_ghosts=with_ghosts)
+        enumeration = time.time() - start
+        start = time.time()
+        Vs, _ = mc.value_iteration(mdp, gamma, 100000, tol=tol)
+        solve = time.time() - start
+        print('{:22s} | {:8d} | {:9d} | {:8.2f} | {:11.3f} | {:6d} | {:8.3f}'.format(
+            name, mdp.nS, len(mdp.compiled.prob), mdp.nbytes / 1e6, enumeration, len(Vs) - 1, solve))
+
+
+if __name__ == '__main__':
+    run()
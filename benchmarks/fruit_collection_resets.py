@@ -0,0 +1,76 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the resets of the fruit collection environments
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the resets per second of FruitCollectionMini, -Small and -Large and, for Small and Large,
+the random fruit layouts per second of the former per-cell loop and of the vectorized mask draw.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from environment.fruit_collection import FruitCollectionMini, FruitCollectionSmall, FruitCollectionLarge
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMES = [('mini', FruitCollectionMini), ('small', FruitCollectionSmall), ('large', FruitCollectionLarge)]
+
+
+def legacy_layout(env):
+    """
+    random fruit layout as drawn before: list scan of the occupied cells and one binomial per cell
+    """
+    occupied = env.walls + [[env.player_pos_x, env.player_pos_y]]
+    fruits = []
+    for x in range(env.scr_w):
+        for y in range(env.scr_h):
+            if [x, y] not in occupied:
+                fruits.append({'location': [x, y], 'active': bool(env.rng.binomial(1, 0.5))})
+    return fruits
+
+
+def vectorized_layout(env):
+    return env.rng.binomial(1, 0.5, size=len(env._fruit_loc)).astype(bool)
+
+
+def per_second(fct, repetitions):
+    start = time.time()
+    for _ in range(repetitions):
+        fct()
+    return repetitions / (time.time() - start)
+
+
+@click.command()
+@click.option('--resets', '-r', default=5000, help='number of timed resets')
+def run(resets):
+    print('resets per second')
+    print('–' * 90)
+    for name, env_class in GAMES:
+        env = env_class(rng=np.random.RandomState(0))
+        env.reset()
+        reset = per_second(env.reset, resets)
+        if name == 'mini':
+            print('{:6s} | reset: {:8.0f}'.format(name, reset))
+            continue
+        legacy = per_second(lambda: legacy_layout(env), resets)
+        vectorized = per_second(lambda: vectorized_layout(env), resets)
+        print('{:6s} | reset: {:8.0f} | layout per cell: {:8.0f} | layout vectorized: {:9.0f}'.format(
+            name, reset, legacy, vectorized))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,70 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the stepping speed of the fruit collection environments
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.2.0
+
+#############################################################################################
+
+Measures the environment steps per second of FruitCollectionMini, -Small and -Large with
+random actions (including the automatic resets) for the scalar and the vectorized environment.
+
+History:
+- v1.2.0: option for the legacy ghost random stream
+- v1.1.0: sparse 1hot state
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from environment.fruit_collection import FruitCollectionMini, FruitCollectionSmall, FruitCollectionLarge
+from environment.fruit_collection_vec import FruitCollectionVec
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMES = [('mini', FruitCollectionMini), ('small', FruitCollectionSmall), ('large', FruitCollectionLarge)]
+
+
+def steps_per_second(env, steps, nb_envs=None):
+    rng = np.random.RandomState(0)
+    if nb_envs is None:
+        actions = rng.randint(0, 4, steps)
+    else:
+        actions = rng.randint(0, 4, (steps, nb_envs))
+    start = time.time()
+    for action in actions:
+        env.step(action)
+    return len(actions) * (1 if nb_envs is None else nb_envs) / (time.time() - start)
+
+
+@click.command()
+@click.option('--steps', '-s', default=5000, help='number of timed steps')
+@click.option('--state-mode', '-m', default='pixel', help="'pixel', '1hot', '1hot-sparse', 'multi-head' or 'mini'")
+@click.option('--nb-envs', '-n', default=64, help='number of games of the vectorized environment')
+@click.option('--legacy-ghost-rng/--no-legacy-ghost-rng', default=False, help='ghosts with rejection sampling')
+def run(steps, state_mode, nb_envs, legacy_ghost_rng):
+    print('environment steps per second ({})'.format(state_mode))
+    print('–' * 60)
+    for name, env_class in GAMES:
+        # the 'mini' state only exists for the mini game, which has no '1hot' state
+        if (state_mode == 'mini' and name != 'mini') or (state_mode.startswith('1hot') and name == 'mini'):
+            continue
+        scalar = steps_per_second(env_class(state_mode=state_mode, legacy_ghost_rng=legacy_ghost_rng), steps)
+        if state_mode.startswith('1hot'):
+            print('{:6s} | scalar: {:10.0f}'.format(name, scalar))
+            continue
+        vec_env = FruitCollectionVec(env_class, nb_envs, state_mode=state_mode)
+        vectorized = steps_per_second(vec_env, max(steps // nb_envs, 10), nb_envs)
+        print('{:6s} | scalar: {:10.0f} | vectorized: {:10.0f}'.format(name, scalar, vectorized))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,71 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the frame history of the DQN experiment
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the latency of one history update (add the newest frame and read the stacked history)
+of 'DQNExperiment' with the copying update it replaced and with the circular 'HistoryBuffer'.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from dqn.history import HistoryBuffer
+###############################
+
+import time
+import click
+import numpy as np
+
+
+def legacy_update_state(last_state, new_obs, history_len):
+    temp_buffer = np.empty(last_state.shape, dtype=np.uint8)
+    temp_buffer[:-1] = last_state[-history_len + 1:]
+    temp_buffer[-1] = new_obs
+    return temp_buffer
+
+
+def latency(fct, repetitions):
+    """
+    :return: mean latency in micro seconds
+    """
+    start = time.time()
+    for _ in range(repetitions):
+        fct()
+    return (time.time() - start) / repetitions * 1e6
+
+
+@click.command()
+@click.option('--repetitions', '-n', default=5000, help='number of timed updates')
+def run(repetitions):
+    print('latency per history update in µs')
+    print('–' * 70)
+    for name, frame_shape in [('mini state', [110]), ('80x80 frame', [80, 80])]:
+        frame = np.ones(frame_shape, dtype=np.uint8)
+        for history_len in [1, 4, 16]:
+            history = HistoryBuffer(history_len, frame_shape)
+            state = {'last_state': np.zeros([history_len] + frame_shape, dtype=np.uint8)}
+
+            def legacy():
+                state['last_state'] = legacy_update_state(state['last_state'], frame, history_len)
+
+            def circular():
+                history.add(frame)
+                history.get()
+
+            print('{:11s} | history: {:2d} | legacy: {:7.2f} | circular: {:7.2f}'.format(
+                name, history_len, latency(legacy, repetitions), latency(circular, repetitions)))
+
+
+if __name__ == '__main__':
+    run()
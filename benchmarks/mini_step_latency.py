@@ -0,0 +1,54 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the step latency of FruitCollectionMini in the 'mini' state mode
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the latency of single environment steps (including the automatic resets) of the HRA input
+encoding 'mini' with owned state copies and with the persistent read-only buffers (copy_state=False).
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from environment.fruit_collection import FruitCollectionMini
+###############################
+
+import time
+import click
+import numpy as np
+
+
+def latencies(env, steps):
+    actions = np.random.RandomState(0).randint(0, 4, steps).tolist()
+    times = np.zeros(steps)
+    for i, action in enumerate(actions):
+        start = time.perf_counter()
+        env.step(action)
+        times[i] = time.perf_counter() - start
+    return times * 1e6
+
+
+@click.command()
+@click.option('--steps', '-s', default=100000, help='number of timed steps')
+def run(steps):
+    print('step latency in us (mini state mode)')
+    print('–' * 70)
+    for copy_state in [True, False]:
+        env = FruitCollectionMini(rng=np.random.RandomState(0), state_mode='mini', copy_state=copy_state)
+        times = latencies(env, steps)
+        print('copy_state={:5s} | mean: {:6.2f} | p50: {:6.2f} | p99: {:6.2f}'.format(
+            str(copy_state), times.mean(), np.percentile(times, 50), np.percentile(times, 99)))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,110 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the policy evaluation of 'architectures.misc'
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the time of one policy evaluation (dense legacy solver, sparse direct solver, warm-started
+sparse iterative solver) and of policy iteration on slippery grid worlds with up to 10^5 states.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from architectures.mdp import MDP
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMMA = 0.95
+
+
+def grid_mdp(side, slip=0.2):
+    """
+    slippery grid world: the chosen move succeeds with 1 - slip, otherwise a perpendicular move happens;
+    reward 1 for entering the goal cell in the lower right corner, which is absorbing
+    """
+    moves = [(-1, 0), (0, 1), (1, 0), (0, -1)]  # west, south, east, north
+    nS = side * side
+    goal = nS - 1
+
+    def target(s, move):
+        row, col = divmod(s, side)
+        row = min(max(row + move[1], 0), side - 1)
+        col = min(max(col + move[0], 0), side - 1)
+        return row * side + col
+
+    P = {}
+    for s in range(nS):
+        P[s] = {}
+        for a in range(4):
+            if s == goal:
+                P[s][a] = [(1.0, s, 0.0)]
+                continue
+            transitions = []
+            for b, prob in [(a, 1. - slip), ((a - 1) % 4, slip / 2), ((a + 1) % 4, slip / 2)]:
+                s1 = target(s, moves[b])
+                transitions.append((prob, s1, float(s1 == goal)))
+            P[s][a] = transitions
+    return MDP(P=P, nS=nS, nA=4)
+
+
+def legacy_compute_vpi(pi, mdp, gamma):
+    Ps = np.zeros((mdp.nS, mdp.nS))
+    Rs = np.zeros((mdp.nS, mdp.nS))
+    for state in range(mdp.nS):
+        for prob, s1, reward in mdp.P[state][pi[state]]:
+            Ps[state, s1] = prob
+            Rs[state, s1] = reward
+    alpha = np.eye(Ps.shape[0]) - Ps * gamma
+    beta = Ps * Rs
+    np.linalg.solve(alpha, beta)
+    return np.linalg.solve(alpha, beta)[:, -1]
+
+
+def timed(fct):
+    start = time.time()
+    result = fct()
+    return (time.time() - start) * 1e3, result
+
+
+@click.command()
+@click.option('--max-states', '-s', default=100000, help='largest number of states')
+@click.option('--legacy-states', '-l', default=2500, help='largest number of states for the dense solver')
+def run(max_states, legacy_states):
+    # imports scipy before the first measurement
+    mc.compute_vpi(np.zeros(4, dtype=int), grid_mdp(2), GAMMA)
+    print('time in ms (policy iteration: 10 iterations)')
+    print('–' * 110)
+    for side in [10, 50, 100, 316]:
+        mdp = grid_mdp(side)
+        if mdp.nS > max_states:
+            break
+        pi = np.random.RandomState(0).randint(0, 4, mdp.nS)
+        legacy = timed(lambda: legacy_compute_vpi(pi, mdp, GAMMA))[0] if mdp.nS <= legacy_states else np.nan
+        direct, V = timed(lambda: mc.compute_vpi(pi, mdp, GAMMA))
+        # warm start from the values of a slightly changed policy, as in policy iteration
+        pi_next = pi.copy()
+        pi_next[::10] = (pi_next[::10] + 1) % 4
+        iterative = timed(lambda: mc.compute_vpi(pi_next, mdp, GAMMA, V0=V, method='iterative'))[0]
+        pi_direct = timed(lambda: mc.policy_iteration(mdp, GAMMA, 10))[0]
+        pi_modified = timed(lambda: mc.policy_iteration(mdp, GAMMA, 10, k=20))[0]
+        print('states: {:6d} | dense: {:9.1f} | sparse direct: {:7.1f} | iterative (warm): {:7.1f} | '
+              'PI: {:8.1f} | modified PI (k=20): {:7.1f}'.format(mdp.nS, legacy, direct, iterative, pi_direct,
+                                                                 pi_modified))
+
+
+if __name__ == '__main__':
+    run()
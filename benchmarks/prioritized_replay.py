@@ -0,0 +1,80 @@
+"""
+Created on October 5, 2018
+
+@author: mae-ma
+@attention: benchmark for the prioritized replay buffer of the DQN architecture
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the sample and priority update throughput of the sum-tree and of the
+prioritized replay buffer for different capacities.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures.replay_buffer import PrioritizedReplayBuffer, SumTree
+###############################
+
+import time
+import click
+import numpy as np
+
+
+def timeit(fct, repetitions):
+    """
+    :return: calls per second
+    """
+    start = time.time()
+    for _ in range(repetitions):
+        fct()
+    return repetitions / (time.time() - start)
+
+
+@click.command()
+@click.option('--batch-size', '-b', default=32, help='minibatch size')
+@click.option('--repetitions', '-n', default=2000, help='number of timed calls')
+def run(batch_size, repetitions):
+    rng = np.random.RandomState(0)
+    print('batch size:', batch_size)
+    print('–' * 90)
+    for capacity in [int(1e4), int(1e5), int(1e6)]:
+        tree = SumTree(capacity)
+        tree.update(np.arange(capacity), rng.rand(capacity))
+
+        def tree_sample():
+            tree.find(rng.rand(batch_size) * tree.total())
+
+        def tree_update():
+            tree.update(rng.randint(0, capacity, batch_size), rng.rand(batch_size))
+
+        # small observations, the storage itself is not part of the benchmark
+        buffer = PrioritizedReplayBuffer(capacity, rng=rng)
+        obs = np.zeros(4, dtype=np.float32)
+        for i in range(capacity):
+            obs_tp1 = np.full(4, i, dtype=np.float32)
+            buffer.add(obs_t=obs, act=0, rew=0.0, obs_tp1=obs_tp1, done=False)
+            obs = obs_tp1
+        batch = buffer.sample(batch_size)
+
+        def buffer_sample():
+            buffer.sample(batch_size, beta=0.4)
+
+        def buffer_update():
+            buffer.update_priorities(batch[-1], rng.rand(batch_size))
+
+        print('capacity: {:8d} | tree sample: {:8.0f}/s | tree update: {:8.0f}/s | '
+              'buffer sample: {:8.0f}/s | buffer update: {:8.0f}/s'.format(
+                  capacity, timeit(tree_sample, repetitions), timeit(tree_update, repetitions),
+                  timeit(buffer_sample, repetitions), timeit(buffer_update, repetitions)))
+
+
+if __name__ == '__main__':
+    run()
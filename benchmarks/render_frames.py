@@ -0,0 +1,63 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the rendering of the fruit collection games
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the rendered frames per second of the pygame window (mode 'human'), of the off-screen
+rendering (mode 'rgb_array') and of the batched rendering of the vectorized games.
+Without a display the pygame window is drawn with the dummy video driver.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+from environment.fruit_collection import FruitCollectionSmall, FruitCollectionLarge, FruitCollectionMini
+from environment.fruit_collection_vec import FruitCollectionVec
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMES = {'small': FruitCollectionSmall, 'large': FruitCollectionLarge, 'mini': FruitCollectionMini}
+
+
+def frames_per_second(env, render, steps, nb_frames=1):
+    actions = np.random.RandomState(0).randint(0, 4, (steps, nb_frames))
+    start = time.time()
+    for action in actions:
+        env.step(action if nb_frames > 1 else action[0])
+        render()
+    return steps * nb_frames / (time.time() - start)
+
+
+@click.command()
+@click.option('--steps', '-s', default=2000, help='number of rendered steps')
+@click.option('--nb-envs', '-n', default=32, help='number of vectorized games')
+def run(steps, nb_envs):
+    print('rendered frames per second (N = {} vectorized games)'.format(nb_envs))
+    print('–' * 75)
+    for name, game in GAMES.items():
+        env = game(rng=np.random.RandomState(0), rendering=True, lives=100)
+        human = frames_per_second(env, env.render, steps)
+        env.close()
+        env = game(rng=np.random.RandomState(0), lives=100)
+        rgb = frames_per_second(env, lambda: env.render(mode='rgb_array'), steps)
+        vec_env = FruitCollectionVec(game, nb_envs, seeds=list(range(nb_envs)))
+        batch = frames_per_second(vec_env, vec_env.render, steps // 10, nb_envs)
+        print('{:5s} | human: {:8.0f} | rgb_array: {:8.0f} | batch: {:8.0f}'.format(name, human, rgb, batch))
+
+
+if __name__ == '__main__':
+    run()
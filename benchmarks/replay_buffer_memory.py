@@ -0,0 +1,75 @@
+"""
+Created on October 5, 2018
+
+@author: mae-ma
+@attention: benchmark for the replay buffers of the DQN architecture
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Compares the allocated memory of the replay buffers when they are filled the same way as
+'FruitCollectionTrain.main' does: consecutive transitions share the frame object (s' of one
+transition is s of the next one).
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures.replay_buffer import ReplayBuffer, ArrayReplayBuffer, FrameReplayBuffer
+###############################
+
+import gc
+import time
+import tracemalloc
+import click
+import numpy as np
+
+
+def fill(buffer, nb_transitions, frame_shape, episode_len):
+    """
+    fill the buffer like 'FruitCollectionTrain.main' and return the time in seconds
+    """
+    rng = np.random.RandomState(0)
+    start = time.time()
+    states = []
+    for step in range(nb_transitions + nb_transitions // episode_len + 1):
+        if step % episode_len == 0:
+            states = []
+        states.append(rng.randint(0, 255, size=frame_shape).astype(np.float32))
+        if len(states) >= 2:
+            done = len(states) == episode_len
+            buffer.add(obs_t=states[-2], act=rng.randint(0, 4), rew=0.0, obs_tp1=states[-1], done=done)
+    # do not keep the last episode alive outside of the buffer
+    del states
+    return time.time() - start
+
+
+@click.command()
+@click.option('--size', '-s', default=10000, help='number of stored transitions')
+@click.option('--episode-len', '-e', default=300, help='number of steps in one episode')
+@click.option('--simple/--no-simple', default=False, help='10x10 frames instead of overblown 80x80 frames')
+def run(size, episode_len, simple):
+    frame_shape = (100,) if simple else (1, 80, 80, 1)
+    print('frame shape:', frame_shape, '| transitions:', size, '| episode length:', episode_len)
+    print('–' * 70)
+    for name, buffer_cls in [('list', ReplayBuffer), ('array', ArrayReplayBuffer), ('frame', FrameReplayBuffer)]:
+        gc.collect()
+        tracemalloc.start()
+        buffer = buffer_cls(size)
+        duration = fill(buffer, size, frame_shape, episode_len)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{:6s} | len: {:7d} | memory: {:9.1f} MB | peak: {:9.1f} MB | fill: {:6.2f} s'.format(
+            name, len(buffer), current / 2 ** 20, peak / 2 ** 20, duration))
+        del buffer
+
+
+if __name__ == '__main__':
+    run()
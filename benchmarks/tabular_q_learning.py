@@ -0,0 +1,106 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the tabular Q-learning updates of 'architectures.misc'
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the Q-learning updates per second of the sequential defaultdict update and of the batched
+update on a dense q table (single agent and K agents in lockstep) for transitions recorded with
+random actions in CrawlingRobotEnv and FrozenLakeEnv.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from ci.crawler_env import CrawlingRobotEnv
+from ci.frozen_lake import FrozenLakeEnv
+###############################
+
+import time
+import click
+import numpy as np
+from collections import defaultdict
+
+GAMMA = 0.9
+ALPHA = 0.1
+
+
+def record_crawler(steps):
+    env = CrawlingRobotEnv()
+    dims = (env.nArmStates, env.nHandStates)
+    rng = np.random.RandomState(0)
+    transitions = []
+    env.reset()
+    state = env.state
+    for action in rng.randint(0, env.action_space.n, steps):
+        next_state, reward, _, _ = env.step(action)
+        transitions.append((np.ravel_multi_index(state, dims), action, np.ravel_multi_index(next_state, dims),
+                            reward, False))
+        state = next_state
+    return int(np.prod(dims)), env.action_space.n, transitions
+
+
+def record_frozen_lake(steps):
+    env = FrozenLakeEnv(map_name='8x8')
+    env.seed(0)
+    rng = np.random.RandomState(0)
+    transitions = []
+    state = env.reset()
+    for action in rng.randint(0, env.nA, steps):
+        next_state, reward, done, _ = env.step(action)
+        transitions.append((state, action, next_state, reward, done))
+        state = env.reset() if done else next_state
+    return env.nS, env.nA, transitions
+
+
+def updates_per_second(fct, nb_updates):
+    start = time.time()
+    fct()
+    return nb_updates / (time.time() - start)
+
+
+def sequential(nA, transitions):
+    q_vals = defaultdict(lambda: np.zeros(nA))
+    for state, action, next_state, reward, done in transitions:
+        mc.tabular_q_learning_update(GAMMA * (not done), ALPHA, q_vals, state, action, next_state, reward)
+
+
+def batched(q_table, alpha, arrays, batch_size):
+    for start in range(0, arrays[0].shape[-1], batch_size):
+        mc.batch_q_learning_update(GAMMA, alpha, q_table, *[a[..., start:start + batch_size] for a in arrays])
+
+
+@click.command()
+@click.option('--steps', '-s', default=100000, help='number of recorded transitions')
+@click.option('--nb-agents', '-k', default=16, help='number of agents updated in lockstep')
+def run(steps, nb_agents):
+    print('Q-learning updates per second (K = {} agents)'.format(nb_agents))
+    print('–' * 105)
+    for name, record in [('crawler', record_crawler), ('frozen lake', record_frozen_lake)]:
+        nS, nA, transitions = record(steps)
+        arrays = [np.array(column) for column in zip(*transitions)]
+        # every agent learns from its own copy of the stream with its own learning rate
+        alphas = np.linspace(0.05, 0.5, nb_agents)
+        stacked = [np.tile(a, (nb_agents, 1)) for a in arrays]
+        legacy = updates_per_second(lambda: sequential(nA, transitions), steps)
+        results = []
+        for batch_size in [1, 32, 1024]:
+            results.append(updates_per_second(lambda: batched(np.zeros((nS, nA)), ALPHA, arrays, batch_size), steps))
+        lockstep = updates_per_second(lambda: batched(np.zeros((nb_agents, nS, nA)), alphas, stacked, 1024),
+                                      steps * nb_agents)
+        print('{:11s} | dict: {:9.0f} | batch 1: {:9.0f} | batch 32: {:10.0f} | batch 1024: {:10.0f} | '
+              'K agents: {:10.0f}'.format(name, legacy, *results, lockstep))
+
+
+if __name__ == '__main__':
+    run()
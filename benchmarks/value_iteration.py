@@ -0,0 +1,100 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: benchmark for the value iteration of 'architectures.misc'
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+Measures the time per Bellman sweep of 'misc.value_iteration' on FrozenLake 4x4 / 8x8 and on a
+synthetic random MDP, compared to the nested loop implementation it replaced.
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from architectures.mdp import MDP
+from ci.frozen_lake import FrozenLakeEnv
+###############################
+
+import time
+import click
+import numpy as np
+
+GAMMA = 0.95
+
+
+def frozen_lake_mdp(map_name):
+    env = FrozenLakeEnv(map_name=map_name)
+    return MDP(P={s: {a: [tup[:3] for tup in tups] for (a, tups) in a2d.items()} for (s, a2d) in env.P.items()},
+               nS=env.nS, nA=env.nA, desc=env.desc)
+
+
+def random_mdp(nS, nA=4, nb_next=3, seed=0):
+    """
+    MDP with 'nb_next' random successors per (s, a) and random rewards
+    """
+    rng = np.random.RandomState(seed)
+    next_states = rng.randint(0, nS, (nS, nA, nb_next)).tolist()
+    probs = rng.dirichlet(np.ones(nb_next), (nS, nA)).tolist()
+    rewards = rng.rand(nS, nA, nb_next).tolist()
+    P = {s: {a: list(zip(probs[s][a], next_states[s][a], rewards[s][a])) for a in range(nA)} for s in range(nS)}
+    return MDP(P=P, nS=nS, nA=nA)
+
+
+def legacy_value_iteration(mdp, gamma, nIt):
+    Vs = [np.zeros(mdp.nS)]
+    pis = []
+    for it in range(nIt):
+        Vprev = Vs[-1]
+        V = np.zeros(mdp.nS)
+        pi = np.zeros(mdp.nS)
+        for state in range(mdp.nS):
+            V_action = np.zeros(mdp.nA)
+            for action in mdp.P[state]:
+                for prob, next_state, reward in mdp.P[state][action]:
+                    V_action[action] += prob * (reward + gamma * Vprev[next_state])
+            V[state] = np.max(V_action)
+        for state in range(mdp.nS):
+            V_action = np.zeros(mdp.nA)
+            for action in mdp.P[state]:
+                for prob, next_state, reward in mdp.P[state][action]:
+                    V_action[action] += prob * (reward + gamma * Vprev[next_state])
+            pi[state] = np.argmax(V_action)
+        Vs.append(V)
+        pis.append(pi)
+    return Vs, pis
+
+
+def timed(fct):
+    start = time.time()
+    result = fct()
+    return time.time() - start, result
+
+
+@click.command()
+@click.option('--states', '-s', default=100000, help='number of states of the synthetic MDP')
+@click.option('--tol', '-t', default=1e-6, help='convergence tolerance (sup-norm)')
+def run(states, tol):
+    print('value iteration: ms per sweep (legacy: at most 3 sweeps on the synthetic MDP)')
+    print('–' * 90)
+    for name, mdp in [('frozen lake 4x4', frozen_lake_mdp('4x4')), ('frozen lake 8x8', frozen_lake_mdp('8x8')),
+                      ('random {}'.format(states), random_mdp(states))]:
+        legacy_its = 3 if mdp.nS > 1000 else 100
+        legacy, (Vs_legacy, _) = timed(lambda: legacy_value_iteration(mdp, GAMMA, legacy_its))
+        vectorized, (Vs, pis) = timed(lambda: mc.value_iteration(mdp, GAMMA, 10000, tol=tol))
+        assert np.allclose(Vs[min(legacy_its, len(Vs) - 1)], Vs_legacy[min(legacy_its, len(Vs) - 1)])
+        print('{:16s} | legacy: {:9.3f} | vectorized: {:7.3f} (incl. compile) | sweeps to tol: {:5d}'.format(
+            name, legacy / legacy_its * 1e3, vectorized / (len(Vs) - 1) * 1e3, len(Vs) - 1))
+
+
+if __name__ == '__main__':
+    run()
@@ -443,3 +443,86 @@ class CrawlingRobot:
         self.lastStep = stepCount
         root.update()
     #        self.lastVel = velocity
+
+
+class HeadlessCrawlingRobotEnv(Env):
+    """
+      Geometry-only version of CrawlingRobotEnv without any GUI.
+
+      The displacement of every (arm bucket, hand bucket, action) transition
+      is computed once at construction with CrawlingRobot.displacement, so a
+      step is a table lookup. The x position of the robot is accumulated in
+      the same way as by CrawlingRobot, so the rewards are bit-identical to
+      CrawlingRobotEnv.
+    """
+
+    def __init__(self, horizon=np.inf):
+        robot = CrawlingRobot(None)
+        self.horizon = horizon
+        self.nArmStates = 9
+        self.nHandStates = 13
+
+        minArmAngle, maxArmAngle = robot.getMinAndMaxArmAngles()
+        minHandAngle, maxHandAngle = robot.getMinAndMaxHandAngles()
+        armIncrement = (maxArmAngle - minArmAngle) / (self.nArmStates-1)
+        handIncrement = (maxHandAngle - minHandAngle) / (self.nHandStates-1)
+        self.armBuckets = [minArmAngle+(armIncrement*i) \
+                           for i in range(self.nArmStates)]
+        self.handBuckets = [minHandAngle+(handIncrement*i) \
+                            for i in range(self.nHandStates)]
+
+        self.action_space = spaces.Discrete(4)
+        self.observation_space = spaces.Tuple(
+            [spaces.Discrete(self.nArmStates), spaces.Discrete(self.nHandStates)]
+        )
+
+        # next state and displacement for every state and action,
+        # illegal actions keep the state and do not move the robot
+        moves = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        self.nextStates = np.zeros((self.nArmStates, self.nHandStates, 4, 2), dtype=np.int64)
+        self.displacements = np.zeros((self.nArmStates, self.nHandStates, 4))
+        for arm in range(self.nArmStates):
+            for hand in range(self.nHandStates):
+                for a, (dArm, dHand) in enumerate(moves):
+                    newArm, newHand = arm + dArm, hand + dHand
+                    if not (0 <= newArm < self.nArmStates and 0 <= newHand < self.nHandStates):
+                        newArm, newHand = arm, hand
+                    self.nextStates[arm, hand, a] = newArm, newHand
+                    if (newArm, newHand) != (arm, hand):
+                        self.displacements[arm, hand, a] = robot.displacement(
+                            self.armBuckets[arm], self.handBuckets[hand],
+                            self.armBuckets[newArm], self.handBuckets[newHand])
+        self._nextStates = self.nextStates.tolist()
+        self._displacements = self.displacements.tolist()
+
+        self.xPos = robot.getRobotPosition()[0]
+        self.state = None
+        self.stepCount = 0
+        self._reset()
+
+    def _step(self, a):
+        """
+          Returns:
+            s, r, d, info
+        """
+        if self.stepCount >= self.horizon:
+            raise Exception("Horizon reached")
+        if a not in (0, 1, 2, 3):
+            raise Exception("action out of range")
+        armBucket, handBucket = self.state
+        oldX = self.xPos
+        self.xPos = oldX + self._displacements[armBucket][handBucket][a]
+        reward = self.xPos - oldX
+
+        self.state = tuple(self._nextStates[armBucket][handBucket][a])
+        self.stepCount += 1
+
+        return self.state, reward, self.stepCount >= self.horizon, {}
+
+    def _reset(self):
+        """
+         Resets the Environment to the initial state,
+         the position of the robot is kept as in CrawlingRobotEnv
+        """
+        self.state = self.nArmStates // 2, self.nHandStates // 2
+        self.stepCount = 0
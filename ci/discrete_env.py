@@ -40,7 +40,9 @@ class DiscreteEnv(Env):
       P[s][a] == [(probability, nextstate, reward, done), ...]
     (**) list or array of length nS
 
-
+    The transitions are compiled once into flat arrays, a step samples the
+    next state with a single searchsorted on the cumulative probabilities.
+    step_batch steps M copies of the environment at once.
     """
     def __init__(self, nS, nA, P, isd):
         self.P = P
@@ -48,6 +50,9 @@ class DiscreteEnv(Env):
         self.lastaction=None # for rendering
         self.nS = nS
         self.nA = nA
+        self.batch_s = None
+        self.batch_done = None
+        self._compile()
 
         self.action_space = spaces.Discrete(self.nA)
         self.observation_space = spaces.Discrete(self.nS)
@@ -55,6 +60,35 @@ class DiscreteEnv(Env):
         self._seed()
         self._reset()
 
+    def _compile(self):
+        """
+        flat arrays of all transitions, the transitions of (s, a) are
+        [self._start[s, a], self._end[s, a])
+        """
+        counts = np.array([[len(self.P[s][a]) for a in range(self.nA)] for s in range(self.nS)], dtype=np.int64)
+        self._end = np.cumsum(counts).reshape(self.nS, self.nA)
+        self._start = self._end - counts
+        transitions = [t for s in range(self.nS) for a in range(self.nA) for t in self.P[s][a]]
+        self._prob = np.array([t[0] for t in transitions], dtype=np.float64)
+        self._next_state = np.array([t[1] for t in transitions], dtype=np.int64)
+        self._reward = np.array([t[2] for t in transitions], dtype=np.float64)
+        self._done = np.array([t[3] for t in transitions], dtype=bool)
+        # cumulative probabilities per (s, a) as computed by categorical_sample
+        self._cumprob = np.concatenate([np.cumsum(self._prob[start:end]) for start, end in
+                                        zip(self._start.ravel(), self._end.ravel())])
+        # padded (nS * nA, max transitions) version for the batched step, padding never exceeds a sample
+        self._cumprob_padded = np.full((self.nS * self.nA, counts.max()), -np.inf)
+        cols = np.arange(len(transitions)) - np.repeat(self._start.ravel(), counts.ravel())
+        self._cumprob_padded[np.repeat(np.arange(self.nS * self.nA), counts.ravel()), cols] = self._cumprob
+        self._isd_cumprob = np.cumsum(np.asarray(self.isd))
+        # per (s, a) views and python scalars for the single step
+        self._sa_cumprob = [[self._cumprob[start:end] for start, end in zip(*row)]
+                            for row in zip(self._start, self._end)]
+        self._sa_transitions = [[[(int(s1), float(r), bool(d), float(p)) for p, s1, r, d in
+                                  zip(self._prob[start:end], self._next_state[start:end],
+                                      self._reward[start:end], self._done[start:end])]
+                                 for start, end in zip(*row)] for row in zip(self._start, self._end)]
+
     def _seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
@@ -65,9 +99,37 @@ class DiscreteEnv(Env):
         return self.s
 
     def _step(self, a):
-        transitions = self.P[self.s][a]
-        i = categorical_sample([t[0] for t in transitions], self.np_random)
-        p, s, r, d= transitions[i]
+        transitions = self._sa_transitions[self.s][a]
+        # first transition with cumulative probability > u, the first one if there is none
+        i = self._sa_cumprob[self.s][a].searchsorted(self.np_random.rand(), side='right')
+        s, r, d, p = transitions[i if i < len(transitions) else 0]
         self.s = s
         self.lastaction=a
         return (s, r, d, {"prob" : p})
+
+    def reset_batch(self, nb_envs):
+        """
+        resets M = nb_envs copies of the environment, returns their states
+        """
+        u = self.np_random.rand(nb_envs)
+        self.batch_s = (self._isd_cumprob[None, :] > u[:, None]).argmax(axis=1)
+        self.batch_done = np.zeros(nb_envs, dtype=bool)
+        return self.batch_s.copy()
+
+    def step_batch(self, actions):
+        """
+        steps all copies of reset_batch with one action each,
+        returns arrays of the next states, rewards, done flags and probabilities
+        copies which were done after the previous call are reset first (the action starts from the reset state)
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        finished = np.flatnonzero(self.batch_done)
+        if finished.size > 0:
+            u = self.np_random.rand(finished.size)
+            self.batch_s[finished] = (self._isd_cumprob[None, :] > u[:, None]).argmax(axis=1)
+        sa = self.batch_s * self.nA + actions
+        u = self.np_random.rand(len(sa))
+        i = self._start.ravel()[sa] + (self._cumprob_padded[sa] > u[:, None]).argmax(axis=1)
+        self.batch_s = self._next_state[i]
+        self.batch_done = self._done[i]
+        return (self.batch_s.copy(), self._reward[i], self.batch_done.copy(), {"prob" : self._prob[i]})
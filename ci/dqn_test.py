@@ -0,0 +1,74 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: tests for continuous integration
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.0.0
+
+#############################################################################################
+
+This class tests the training step of the DQN architecture (needs tensorflow)
+
+History:
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+###############################
+
+import pytest
+import numpy as np
+
+tf = pytest.importorskip('tensorflow')
+from architectures.dqn import DeepQNetwork
+
+
+class TestDQN:
+    def test_fused_training_step(self, tmpdir, monkeypatch):
+        """
+        one fused update changes the weights like one 'fit' update on the same batch
+        """
+        monkeypatch.chdir(str(tmpdir))
+        fit_dqn = DeepQNetwork(env=None, name='fit')
+        fused_dqn = DeepQNetwork(env=None, name='fused')
+        for dqn in [fit_dqn, fused_dqn]:
+            dqn.model.set_weights(fit_dqn.model.get_weights())
+            dqn.target_model.set_weights(fit_dqn.target_model.get_weights())
+        fused_dqn._compile_training()
+
+        rng = np.random.RandomState(0)
+        batch_size = 32
+        states = rng.rand(batch_size, 100).astype(np.float32)
+        next_states = rng.rand(batch_size, 100).astype(np.float32)
+        actions = rng.randint(0, fit_dqn.output_dim, batch_size)
+        rewards = rng.randint(-1, 2, batch_size).astype(np.float32)
+        dones = rng.rand(batch_size) < 0.2
+        discounts = np.full(batch_size, fit_dqn.gamma, dtype=np.float32)
+
+        y, _ = mc.bellman_targets(q_vals=fit_dqn.model.predict_on_batch(states),
+                                  q_next_target=fit_dqn.target_model.predict_on_batch(next_states),
+                                  actions=actions, rewards=rewards, dones=dones, discounts=discounts)
+        history = fit_dqn.model.fit(states, y, batch_size=batch_size, epochs=1, verbose=0)
+        loss, td_errors = fused_dqn._train_step([states, actions.astype(np.int32), rewards, next_states,
+                                                 dones.astype(np.float32), discounts,
+                                                 np.ones(batch_size, dtype=np.float32)])
+        assert np.isclose(loss, history.history['loss'][0], rtol=1e-4)
+        for fit_weights, fused_weights in zip(fit_dqn.model.get_weights(), fused_dqn.model.get_weights()):
+            assert np.allclose(fit_weights, fused_weights, rtol=1e-4, atol=1e-6)
+
+
+if __name__ == '__main__':
+    tdqn = TestDQN()
+    s = 'This package contains all the automated CI tests using "pytest".\nIncluding the following:'
+    functions = [a for a in dir(tdqn) if not a.startswith('__')]
+    print('–' * len(s.split('\n')[0]))
+    print(s)
+    for func in functions:
+        print('-', func)
+    print('–' * len(s.split('\n')[0]))
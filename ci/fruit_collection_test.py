@@ -0,0 +1,446 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: tests for continuous integration
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.13.0
+
+#############################################################################################
+
+This class tests the fruit collection environments
+
+History:
+- v1.13.0: vectorized games with ghosts follow the scalar games over several episodes
+- v1.12.1: frames are saved after the window is closed
+- v1.12.0: frame writer test
+- v1.11.0: rgb_array rendering test
+- v1.10.0: incremental mini state test
+- v1.9.0: reset layout random stream test
+- v1.8.0: target array test
+- v1.7.0: ghost random walk test
+- v1.6.0: tabular fruit collection MDP test
+- v1.5.0: layout MDP test
+- v1.4.0: frame construction test
+- v1.3.0: incremental pixel state test
+- v1.2.0: 1hot index map and sparse 1hot test
+- v1.1.0: lookup table test
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from environment.fruit_collection import FruitCollectionSmall, FruitCollectionLarge, FruitCollectionMini, \
+    FruitCollectionTiny, FRUIT, GHOST, render_rgb
+from environment.fruit_collection_vec import FruitCollectionVec
+from environment.frame_writer import FrameWriter
+from architectures import misc as mc
+from architectures.mdp import MDP, FruitCollectionMDP
+###############################
+
+import threading
+import numpy as np
+from copy import deepcopy
+
+
+def full_state_pixel(env):
+    """
+    reference: pixel state rebuilt from scratch as done before the incremental updates
+    """
+    state = np.zeros((env.state_shape[1], env.state_shape[2], env.state_shape[0]), dtype=np.int8)
+    player_pos = [env.player_pos_x, env.player_pos_y]
+    fruits = []
+    ghosts = []
+    for target in env.targets:
+        if target['active'] is True:
+            if target['reward'] > 0:
+                fruits.append(target['location'])
+            elif target['reward'] < 0:
+                ghosts.append(target['location'])
+    for loc in fruits:
+        if loc in ghosts and env.is_ghost:
+            state[tuple(loc)][1] = 1
+            state[tuple(loc)][3] = 1
+            ghosts.remove(loc)
+        else:
+            state[tuple(loc)][1] = 1
+    if player_pos in ghosts and env.is_ghost:
+        state[tuple(player_pos)][2] = 1
+        state[tuple(player_pos)][3] = 1
+        ghosts.remove(player_pos)
+    else:
+        state[tuple(player_pos)][2] = 1
+    if env.is_ghost:
+        for loc in ghosts:
+            state[tuple(loc)][3] = 1
+    for loc in env.walls:
+        state[tuple(loc)][0] = 1
+    return deepcopy(state.T)
+
+
+class TestFruitCollection:
+    def test_lookup_tables(self):
+        env = FruitCollectionLarge(is_ghost=False)
+        assert env.wall_grid.sum() == len(env.walls)
+        for x, y in env.walls:
+            assert env.wall_grid[x, y]
+        # passing corridors at the rows 4 and 8
+        for row in env.pass_wall_rows:
+            env.player_pos_x, env.player_pos_y = env.scr_w - 1, row
+            assert not env._move_player(3)
+            assert [env.player_pos_x, env.player_pos_y] == [0, row]
+            assert not env._move_player(2)
+            assert [env.player_pos_x, env.player_pos_y] == [env.scr_w - 1, row]
+        env.player_pos_x, env.player_pos_y = 1, 2
+        assert env._move_player(1)
+        assert [env.player_pos_x, env.player_pos_y] == [1, 2]
+        assert not env._move_player(3)
+        assert [env.player_pos_x, env.player_pos_y] == [2, 2]
+
+    def test_1hot_features(self):
+        dense_env = FruitCollectionLarge(rng=np.random.RandomState(3), state_mode='1hot')
+        sparse_env = FruitCollectionLarge(rng=np.random.RandomState(3), state_mode='1hot-sparse')
+        idx = 0
+        for x in range(dense_env.scr_w):
+            for y in range(dense_env.scr_h):
+                if [x, y] not in dense_env.walls:
+                    assert dense_env._get_idx(x, y) == idx
+                    idx += 1
+        assert idx == dense_env.nb_non_wall
+        rng = np.random.RandomState(0)
+        for _ in range(100):
+            action = rng.randint(0, 4)
+            dense, _, _, _ = dense_env.step(action)
+            sparse, _, _, _ = sparse_env.step(action)
+            assert dense.shape == tuple(dense_env.state_shape)
+            assert np.array_equal(np.flatnonzero(dense), sparse)
+
+    def test_target_arrays(self):
+        """
+        the position index and the list of dicts view agree with the target arrays
+        """
+        rng = np.random.RandomState(0)
+        for env in [FruitCollectionMini(rng=np.random.RandomState(1)), FruitCollectionLarge(rng=np.random.RandomState(1))]:
+            for _ in range(1000):
+                env.step(rng.randint(0, 4))
+                active = np.flatnonzero((env.target_kind == FRUIT) & env.target_active)
+                assert env._nb_active_fruits == len(active)
+                assert np.array_equal(np.sort(env._fruit_at[env._fruit_at >= 0]), active)
+                for k in active:
+                    assert env._fruit_at[tuple(env.target_loc[k])] == k
+                targets = env.targets
+                assert [t['active'] for t in targets] == env.target_active.tolist()
+                assert [t['location'] for t in targets if t['reward'] < 0] == \
+                    env.target_loc[env.target_kind == GHOST].tolist()
+            # loading the view back does not change the game
+            state = env.get_state()
+            env.targets = targets
+            assert np.array_equal(env.get_state(), state)
+
+    def test_reset_layout(self):
+        """
+        the vectorized fruit layout draws the same random stream as one binomial per free cell
+        """
+        for env_class in [FruitCollectionSmall, FruitCollectionLarge]:
+            env = env_class(rng=np.random.RandomState(7))
+            for _ in range(5):
+                rng = deepcopy(env.rng)
+                env.reset()
+                free = [[x, y] for x in range(env.scr_w) for y in range(env.scr_h)
+                        if [x, y] not in env.walls + [[env.player_pos_x, env.player_pos_y]]]
+                expected = [[x, y] for x, y in free if rng.binomial(1, 0.5)]
+                assert [t['location'] for t in env.targets if t['reward'] > 0 and t['active']] == expected
+                assert rng.rand() == deepcopy(env.rng).rand()
+
+    def test_incremental_pixel_state(self):
+        rng = np.random.RandomState(0)
+        for env_class in [FruitCollectionMini, FruitCollectionSmall, FruitCollectionLarge]:
+            env = env_class(rng=np.random.RandomState(1), lives=5, game_length=150)
+            for _ in range(3000):
+                obs, _, _, _ = env.step(rng.randint(0, 4))
+                assert np.array_equal(obs, full_state_pixel(env))
+            view = env.get_state_pixel(copy=False)
+            assert not view.flags.writeable
+            assert np.array_equal(view, obs)
+
+    def test_incremental_mini_state(self):
+        """
+        persistent mini state and head reward buffers agree with freshly built ones
+        """
+        rng = np.random.RandomState(0)
+        for env_class in [FruitCollectionMini, FruitCollectionTiny]:
+            env = env_class(rng=np.random.RandomState(1), state_mode='mini', game_length=50, copy_state=False)
+            reference = env_class(rng=np.random.RandomState(1), state_mode='mini', game_length=50)
+            for _ in range(2000):
+                action = rng.randint(0, 4)
+                obs, _, _, info = env.step(action)
+                ref_obs, _, _, ref_info = reference.step(action)
+                assert not obs.flags.writeable and not info['head_reward'].flags.writeable
+                assert obs.shape == tuple(env.state_shape)
+                assert np.array_equal(obs, ref_obs)
+                assert np.array_equal(info['head_reward'], ref_info['head_reward'])
+                state = np.zeros(env.state_shape, dtype=np.int8)
+                state[env.player_pos_y * env.scr_h + env.player_pos_x] = 1
+                for target in env.targets:
+                    if target['reward'] > 0 and target['active']:
+                        x, y = target['location']
+                        state[env.scr_w * env.scr_h + env.possible_fruits.index([y, x])] = 1
+                assert np.array_equal(obs, state)
+            owned = env.get_mini_state()
+            assert owned.flags.writeable and not np.shares_memory(owned, obs)
+
+    def test_render_rgb_array(self):
+        """
+        off-screen frames match the pygame window and the batched rendering of the vectorized games
+        """
+        import pygame
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        env = FruitCollectionLarge(rng=np.random.RandomState(0), rendering=True, lives=100)
+        rng = np.random.RandomState(1)
+        for _ in range(50):
+            env.step(rng.randint(0, 4))
+            env.render()
+            frame = env.render(mode='rgb_array')
+            assert frame.shape == (env.scr_h * env.rendering_scale, env.scr_w * env.rendering_scale, 3)
+            assert np.array_equal(frame, pygame.surfarray.array3d(env.screen).transpose(1, 0, 2))
+            assert np.array_equal(frame, render_rgb(env.get_state_pixel(), env.rendering_scale))
+        env.close()
+        seeds = [3, 7]
+        vec_env = FruitCollectionVec(FruitCollectionSmall, len(seeds), seeds=seeds, is_ghost=False)
+        envs = [FruitCollectionSmall(rng=np.random.RandomState(seed), is_ghost=False) for seed in seeds]
+        for _ in range(20):
+            actions = rng.randint(0, 4, len(seeds))
+            vec_env.step(actions)
+            frames = vec_env.render(scale=2)
+            for i, env in enumerate(envs):
+                env.step(actions[i])
+                assert np.array_equal(frames[i], env.render(mode='rgb_array', scale=2))
+
+    def test_frame_writer(self, tmpdir):
+        """
+        saved episodes hold the rendered frames; a full queue drops the oldest frames
+        """
+        from PIL import Image
+        for fmt in ['npz', 'gif', 'jpg']:
+            writer = FrameWriter(fmt, scale=2)
+            env = FruitCollectionSmall(rng=np.random.RandomState(0), image_saving=True, frame_writer=writer,
+                                       render_dir=str(tmpdir.join(fmt)))
+            frames = []
+            for action in np.random.RandomState(1).randint(0, 4, 20).tolist():
+                env.step(action)
+                env.render()
+                frames.append(env.render(mode='rgb_array', scale=1))
+            env.close()
+            assert writer.nb_written == len(frames) and writer.nb_dropped == 0
+            if fmt == 'npz':
+                archive = np.load(os.path.join(env.render_dir, 'frames.npz'))
+                assert np.array_equal(archive['frames'], frames)
+                assert np.array_equal(archive['step_ids'], np.arange(1, 21)) and archive['scale'] == 2
+            elif fmt == 'gif':
+                gif = Image.open(os.path.join(env.render_dir, 'episode.gif'))
+                for k, frame in enumerate(frames):
+                    gif.seek(k)
+                    assert np.array_equal(np.array(gif.convert('RGB'))[::2, ::2], frame)
+            else:
+                assert Image.open(os.path.join(env.render_dir, 'render20.jpg')).size == (2 * env.scr_w, 2 * env.scr_h)
+        # the writer is held on the first frame until four more frames are written into a queue of two
+        writer = FrameWriter('npz', max_queue=2, drop_policy='oldest')
+        gate = threading.Event()
+        handle = writer._handle
+        writer._handle = lambda item: (gate.wait(), handle(item))
+        writer.start_episode(str(tmpdir))
+        frames = np.arange(5 * 12, dtype=np.uint8).reshape(5, 2, 2, 3)
+        writer.write(frames[0], 0)
+        while writer.nb_queued > 0:
+            pass
+        dropped = [not writer.write(frames[k], k) for k in range(1, 5)]
+        assert dropped == [False, False, True, True] and writer.nb_dropped == 2
+        gate.set()
+        writer.close()
+        archive = np.load(str(tmpdir.join('frames.npz')))
+        assert np.array_equal(archive['step_ids'], [0, 3, 4])
+        assert np.array_equal(archive['frames'], frames[[0, 3, 4]])
+
+    def test_frame_writer_rendering_toggle(self, tmpdir):
+        """
+        closing the window does not stop saving, a closed writer is started again by the next episode
+        """
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        writer = FrameWriter('npz')
+        env = FruitCollectionSmall(rng=np.random.RandomState(0), rendering=True, image_saving=True,
+                                   frame_writer=writer, render_dir=str(tmpdir))
+        for action in [0, 1, 2, 3, 0]:
+            if env.step_id == 3:
+                env.rendering = False
+            env.step(action)
+            env.render()
+        env.reset()
+        env.step(1)
+        env.render()
+        writer.close()
+        first, second = [np.load(str(tmpdir.join('render' + str(i), 'frames.npz'))) for i in range(2)]
+        assert np.array_equal(first['step_ids'], np.arange(1, 6)) and np.array_equal(second['step_ids'], [1])
+        env.reset()
+        env.step(0)
+        env.render()
+        env.close()
+        assert np.array_equal(np.load(env.render_dir + '/frames.npz')['step_ids'], [1])
+
+    def test_make_frame(self):
+        env = FruitCollectionLarge(rng=np.random.RandomState(2))
+        for _ in range(20):
+            obs, _, _, _ = env.step(env.rng.randint(0, 4))
+        frame = mc.make_frame(obs, do_overblow=False)
+        assert frame.dtype == np.float32
+        for y in range(env.scr_h):
+            for x in range(env.scr_w):
+                value = 0.
+                for channel, color in enumerate([(80, 80, 80), (0, 100, 255), (255, 255, 255), (255, 0, 0)]):
+                    if obs[channel, y, x] != 0:
+                        value = mc.rgb2grayscale(color)
+                assert np.isclose(frame[y, x], value)
+        out = np.zeros((env.scr_h * 4, env.scr_w * 4), dtype=np.uint8)
+        big = mc.make_frame(obs, overblow_factor=4, out=out, dtype=np.uint8)
+        assert big is out
+        assert np.array_equal(big[::4, ::4], frame.astype(np.uint8))
+        assert np.array_equal(big, np.kron(frame.astype(np.uint8), np.ones((4, 4), dtype=np.uint8)))
+
+    def test_layout_mdp(self):
+        env = FruitCollectionSmall(rng=np.random.RandomState(0), is_ghost=False)
+        mdp = MDP.from_fruit_collection(env)
+        assert mdp.nS == env.nb_non_wall and mdp.nA == env.nb_actions
+        fruits = [tuple(t['location']) for t in env.targets if t['reward'] > 0 and t['active']]
+        for action in env.legal_actions:
+            env.player_pos_x, env.player_pos_y = 5, 5
+            hit_wall = env._move_player(action)
+            prob, next_state, reward = mdp.compiled.transitions(env._get_idx(5, 5), action)
+            assert list(prob) == [1.] and next_state[0] == env._get_idx(env.player_pos_x, env.player_pos_y)
+            assert reward[0] == env.reward_scheme['fruit'] * ((env.player_pos_x, env.player_pos_y) in fruits) + \
+                env.reward_scheme['wall'] * hit_wall
+        Vs, pis = mc.value_iteration(mdp, gamma=0.9, nIt=1000, tol=1e-8)
+        assert Vs[-1].max() > 0
+
+    def test_fruit_collection_mdp(self):
+        """
+        the transitions of the enumerated MDP agree with the environment
+        """
+        rng = np.random.RandomState(0)
+        for env in [FruitCollectionMini(rng=np.random.RandomState(1)),
+                    FruitCollectionTiny(rng=np.random.RandomState(1), lives=1)]:
+            mdp = FruitCollectionMDP(env, with_ghosts=env.is_ghost)
+            cells = np.argwhere(~env.wall_grid)
+            probs = np.bincount(mdp.compiled.sa, weights=mdp.compiled.prob)
+            assert np.allclose(probs, 1.)
+            for _ in range(500):
+                state = rng.randint(len(mdp.codes))
+                code = mdp.codes[state]
+                ghost_code, rest = code % mdp.nb_ghost_codes, code // mdp.nb_ghost_codes
+                env.reset()
+                env.player_pos_x, env.player_pos_y = [int(v) for v in cells[rest % mdp.nb_cells]]
+                targets = env.targets
+                for target in targets:
+                    if target['reward'] > 0:
+                        cell = tuple(target['location'])
+                        target['active'] = cell in mdp.fruit_cells and \
+                            bool((rest // mdp.nb_cells) >> mdp.fruit_cells.index(cell) & 1)
+                    else:
+                        target['location'] = [int(v) for v in cells[ghost_code]]
+                env.targets = targets
+                assert mdp.state_index(env) == state
+                action = rng.randint(0, 4)
+                _, reward, game_over, _ = env.step(action)
+                _, next_states, rewards = mdp.compiled.transitions(state, action)
+                next_state = mdp.terminal_state if game_over or env.lives <= 0 else mdp.state_index(env)
+                assert (next_state, reward) in zip(next_states, rewards)
+
+    def test_ghost_random_walk(self):
+        """
+        ghosts draw once among the legal neighbours, the legacy mode reproduces the rejection sampling
+        """
+        for legacy in [False, True]:
+            env = FruitCollectionLarge(rng=np.random.RandomState(4), is_fruit=False, legacy_ghost_rng=legacy)
+            rng = deepcopy(env.rng)
+            for _ in range(500):
+                ghosts = [list(t['location']) for t in env.targets if t['reward'] < 0]
+                env._move_ghosts()
+                for k, (x, y) in enumerate(ghosts):
+                    moves = env._ghost_moves[x][y]
+                    legal = [move for move in moves if move is not None]
+                    if legacy:
+                        move = None
+                        while move is None:
+                            move = moves[rng.randint(0, 4)]
+                    else:
+                        move = legal[int(rng.rand() * len(legal))]
+                    ghosts[k] = list(move)
+                assert ghosts == [t['location'] for t in env.targets if t['reward'] < 0]
+
+    def test_vec_env_matches_scalar_env(self):
+        """
+        the vectorized games follow the scalar games step by step, also with ghosts and after resets
+        """
+        configs = [(FruitCollectionMini, 'mini', {}), (FruitCollectionMini, 'pixel', {}),
+                   (FruitCollectionSmall, 'multi-head', {'is_ghost': False}),
+                   (FruitCollectionLarge, 'pixel', {'is_ghost': False}),
+                   (FruitCollectionSmall, 'pixel', {'lives': 2}),
+                   (FruitCollectionLarge, 'multi-head', {'lives': 3})]
+        rng = np.random.RandomState(0)
+        for env_class, state_mode, kwargs in configs:
+            seeds = [3, 7, 11]
+            vec_env = FruitCollectionVec(env_class, len(seeds), seeds=seeds, state_mode=state_mode,
+                                         game_length=40, **kwargs)
+            envs = [env_class(rng=np.random.RandomState(seed), state_mode=state_mode, game_length=40, **kwargs)
+                    for seed in seeds]
+            obs = vec_env.get_state()
+            for i, env in enumerate(envs):
+                assert np.array_equal(obs[i], env.get_state())
+            nb_episodes = 0
+            for _ in range(150):
+                actions = rng.randint(0, 4, len(seeds))
+                obs, rewards, dones, info = vec_env.step(actions)
+                nb_episodes += int(np.sum(dones))
+                for i, env in enumerate(envs):
+                    s, r, term, env_info = env.step(actions[i])
+                    assert np.array_equal(obs[i], s)
+                    assert rewards[i] == r
+                    assert dones[i] == term
+                    assert info['hit_wall'][i] == env_info['hit_wall']
+                    assert info['fruit'][i] == (-1 if env_info['fruit'] is None else env_info['fruit'])
+                    assert info['ghost'][i] == (-1 if env_info['ghost'] is None else env_info['ghost'])
+                    if state_mode == 'mini':
+                        assert np.array_equal(info['head_reward'][i], env_info['head_reward'])
+            # several episodes per game, so the resets after the first episode are compared as well
+            assert nb_episodes > 2 * len(seeds)
+
+    def test_vec_env_ghosts(self):
+        """
+        resets match the scalar games and ghosts only walk on legal cells
+        """
+        seeds = [1, 2]
+        vec_env = FruitCollectionVec(FruitCollectionLarge, len(seeds), seeds=seeds, lives=3)
+        for i, seed in enumerate(seeds):
+            env = FruitCollectionLarge(rng=np.random.RandomState(seed), lives=3)
+            assert np.array_equal(vec_env.get_state()[i], env.get_state())
+        rng = np.random.RandomState(0)
+        dones = np.zeros(len(seeds), dtype=bool)
+        for _ in range(200):
+            previous, reset = vec_env.ghosts.copy(), dones
+            obs, rewards, dones, info = vec_env.step(rng.randint(0, 4, len(seeds)))
+            assert not np.any(vec_env.wall_grid[vec_env.ghosts[..., 0], vec_env.ghosts[..., 1]])
+            moved = np.abs(vec_env.ghosts - previous).sum(axis=-1)
+            assert np.all(moved[~reset & ~dones] == 1)
+            assert np.all(rewards[info['ghost'] >= 0] <= vec_env.reward_scheme['ghost'] + 1)
+
+
+if __name__ == '__main__':
+    tfc = TestFruitCollection()
+    s = 'This package contains all the automated CI tests using "pytest".\nIncluding the following:'
+    functions = [a for a in dir(tfc) if not a.startswith('__')]
+    print('–' * len(s.split('\n')[0]))
+    print(s)
+    for func in functions:
+        print('-', func)
+    print('–' * len(s.split('\n')[0]))
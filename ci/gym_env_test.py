@@ -5,13 +5,20 @@ Created on October 4, 2018
 @author: mae-ma
 @attention: tests for continuous integration
 @contact: albus.marcel@gmail.com (Marcel Albus)
-@version: 1.3.3
+@version: 1.10.0
 
 #############################################################################################
 
 This class tests the different Q-learning functions with the help of the gym environment
 
 History:
+- v1.10.0: batched discrete env step resets finished copies
+- v1.9.0: compiled and batched discrete env step test
+- v1.8.0: headless crawler env for the tabular q learning tests
+- v1.7.0: batched tabular q learning update test
+- v1.6.0: compiled MDP test
+- v1.5.0: policy evaluation and policy iteration test
+- v1.4.0: value iteration convergence test
 - v1.3.3: update for 'eps_greedy' function test
 - v1.3.2: use random seed generator for testing
 - v1.3.1: print explanation if program is executed
@@ -33,12 +40,13 @@ from architectures.mdp import MDP
 
 import numpy as np
 import numpy.random as nr
-from ci.crawler_env import CrawlingRobotEnv
+from ci.crawler_env import CrawlingRobotEnv, HeadlessCrawlingRobotEnv
 from ci.frozen_lake import FrozenLakeEnv
+from ci.discrete_env import categorical_sample
 import gym
 from collections import defaultdict
 import random
-env = CrawlingRobotEnv()
+env = HeadlessCrawlingRobotEnv()
 GAMMA = 0.9
 ALPHA = 0.1
 EPS = 0.5
@@ -65,11 +73,101 @@ class TestGymEnv:
             print("Q(test_state, 0) is expected to be %.2f but got %.2f" % (tgt, q_vals[test_state][0]))
         assert np.isclose(dummy_q[test_state][0], tgt,) == True
 
+    def test_headless_crawler_env(self):
+        """
+        the headless crawler returns the same states and bit-identical rewards as the GUI version
+        """
+        gui_env = CrawlingRobotEnv()
+        headless_env = HeadlessCrawlingRobotEnv()
+        rng = nr.RandomState(0)
+        for itr in range(5000):
+            if itr % 1000 == 0:
+                gui_env.reset()
+                headless_env.reset()
+            action = rng.randint(0, env.action_space.n)
+            assert gui_env.step(action) == headless_env.step(action)
+
+    def test_discrete_env_step(self):
+        """
+        the compiled step samples the same transitions as sampling from P and the batched step follows the single step
+        """
+        env = FrozenLakeEnv(map_name='8x8')
+        reference = FrozenLakeEnv(map_name='8x8')
+        env.seed(3)
+        reference.seed(3)
+        env.reset()
+        reference.reset()
+        rng = nr.RandomState(0)
+        for _ in range(20000):
+            action = rng.randint(0, env.nA)
+            transitions = reference.P[reference.s][action]
+            p, s, r, d = transitions[categorical_sample([t[0] for t in transitions], reference.np_random)]
+            reference.s = s
+            assert env.step(action) == (s, r, d, {"prob": p})
+            if d:
+                assert env.reset() == reference.reset()
+        states = env.reset_batch(100)
+        actions = rng.randint(0, env.nA, 100)
+        env.seed(7)
+        next_states, rewards, dones, info = env.step_batch(actions)
+        env.seed(7)
+        for i in range(100):
+            env.s = states[i]
+            assert env.step(actions[i])[:3] == (next_states[i], rewards[i], dones[i])
+
+    def test_discrete_env_step_batch_reset(self):
+        """
+        copies which are done start the next batched step from a reset state instead of the terminal state
+        """
+        env = FrozenLakeEnv(map_name='4x4')
+        env.seed(0)
+        rng = nr.RandomState(0)
+        states = env.reset_batch(200)
+        nb_done = 0
+        for _ in range(50):
+            actions = rng.randint(0, env.nA, len(states))
+            previous_dones = env.batch_done.copy()
+            next_states, rewards, dones, info = env.step_batch(actions)
+            for i in np.flatnonzero(previous_dones):
+                # the only start state of frozen lake is 0
+                assert next_states[i] in [s for _, s, _, _ in env.P[0][actions[i]]]
+            nb_done += int(np.sum(dones))
+            states = next_states
+        assert nb_done > 100
+
+    def test_batch_q_learning_update(self):
+        """
+        batched update agrees with the sequential update, also for repeated (s, a) pairs and K agents
+        """
+        rng = nr.RandomState(0)
+        nS = env.nArmStates * env.nHandStates
+        q_table = rng.rand(nS, env.action_space.n)
+        q_vals = defaultdict(lambda: np.zeros(env.action_space.n))
+        for s in range(nS):
+            q_vals[s] = q_table[s].copy()
+        # updated states (< 10) are never next states of the batch (>= 10)
+        states, actions = rng.randint(0, 10, 200), rng.randint(0, env.action_space.n, 200)
+        next_states, rewards = rng.randint(10, nS, 200), rng.randn(200)
+        for i in range(200):
+            mc.tabular_q_learning_update(GAMMA, ALPHA, q_vals, states[i], actions[i], next_states[i], rewards[i])
+        mc.batch_q_learning_update(GAMMA, ALPHA, q_table, states, actions, next_states, rewards)
+        assert np.allclose(q_table, np.array([q_vals[s] for s in range(nS)]))
+        # K agents in lockstep with different learning rates
+        alphas = np.array([0.05, 0.1, 0.5])
+        q_tables = np.zeros((len(alphas), nS, env.action_space.n))
+        batch = [rng.randint(0, nS, (len(alphas), 50)), rng.randint(0, env.action_space.n, (len(alphas), 50)),
+                 rng.randint(0, nS, (len(alphas), 50)), rng.randn(len(alphas), 50)]
+        mc.batch_q_learning_update(GAMMA, alphas, q_tables, *batch)
+        for k, alpha in enumerate(alphas):
+            single = np.zeros((nS, env.action_space.n))
+            mc.batch_q_learning_update(GAMMA, alpha, single, *[b[k] for b in batch])
+            assert np.allclose(q_tables[k], single)
+
     def greedy_eval(self, q_vals):
         """
         evaluate greedy policy w.r.t current q_vals
         """
-        test_env = CrawlingRobotEnv(horizon=np.inf)
+        test_env = HeadlessCrawlingRobotEnv(horizon=np.inf)
         prev_state = test_env.reset()
         ret = 0.
         done = False
@@ -149,6 +247,63 @@ class TestGymEnv:
             assert True == np.isclose(Vs_VI[i][0], V_TARGET[i], rtol=1.e-3)
             print('–' * 50)
 
+    def test_value_iteration_convergence(self):
+        """
+        value iteration stops at the tolerance and returns the greedy policy of the fixed point
+        """
+        env = FrozenLakeEnv(map_name='8x8')
+        mdp = MDP(P={s: {a: [tup[:3] for tup in tups] for (a, tups) in a2d.items()} for (s, a2d) in env.P.items()}, nS=env.nS, nA=env.nA, desc=env.desc)
+        Vs_VI, pis_VI = mc.value_iteration(mdp, gamma=0.95, nIt=1000, tol=1e-8)
+        assert len(Vs_VI) < 1000 and len(Vs_VI) == len(pis_VI) + 1
+        assert np.max(np.abs(Vs_VI[-1] - Vs_VI[-2])) < 1e-8
+        Q = np.zeros((mdp.nS, mdp.nA))
+        for s in range(mdp.nS):
+            for a in range(mdp.nA):
+                for p, s1, r in mdp.P[s][a]:
+                    Q[s, a] += p * (r + 0.95 * Vs_VI[-1][s1])
+        assert np.allclose(Q.max(axis=1), Vs_VI[-1], atol=1e-7)
+        assert pis_VI[-1].dtype.kind == 'i'
+        assert np.all(Q[np.arange(mdp.nS), pis_VI[-1]] >= Q.max(axis=1) - 1e-7)
+
+    def test_policy_iteration(self):
+        """
+        sparse policy evaluation solves the Bellman equation and policy iteration finds the optimal values
+        """
+        env = FrozenLakeEnv(map_name='8x8')
+        mdp = MDP(P={s: {a: [tup[:3] for tup in tups] for (a, tups) in a2d.items()} for (s, a2d) in env.P.items()}, nS=env.nS, nA=env.nA, desc=env.desc)
+        pi = np.random.RandomState(0).randint(0, mdp.nA, mdp.nS)
+        P_pi, r_pi = np.zeros((mdp.nS, mdp.nS)), np.zeros(mdp.nS)
+        for s in range(mdp.nS):
+            for p, s1, r in mdp.P[s][pi[s]]:
+                P_pi[s, s1] += p
+                r_pi[s] += p * r
+        V_TARGET = np.linalg.solve(np.eye(mdp.nS) - 0.95 * P_pi, r_pi)
+        assert np.allclose(mc.compute_vpi(pi, mdp, 0.95), V_TARGET)
+        assert np.allclose(mc.compute_vpi(pi, mdp, 0.95, method='iterative'), V_TARGET, atol=1e-8)
+        Vs_VI, _ = mc.value_iteration(mdp, gamma=0.95, nIt=1000, tol=1e-10)
+        Vs_PI, pis_PI = mc.policy_iteration(mdp, gamma=0.95, nIt=20)
+        assert np.allclose(Vs_PI[-1], Vs_VI[-1], atol=1e-8)
+        Vs_MPI, pis_MPI = mc.policy_iteration(mdp, gamma=0.95, nIt=200, k=10)
+        assert np.allclose(Vs_MPI[-1], Vs_VI[-1], atol=1e-6)
+
+    def test_compiled_mdp(self):
+        """
+        CSR form of the frozen lake MDP
+        """
+        env = FrozenLakeEnv()
+        mdp = MDP.from_discrete_env(env)
+        compiled = mdp.compiled
+        assert compiled is mdp.compiled
+        for s in range(mdp.nS):
+            for a in range(mdp.nA):
+                prob, next_state, reward = compiled.transitions(s, a)
+                assert list(zip(prob, next_state, reward)) == [tup[:3] for tup in env.P[s][a]]
+                assert np.isclose(compiled.R[s, a], sum(p * r for p, _, r, _ in env.P[s][a]))
+        assert MDP.from_compiled(compiled).P == mdp.P
+        Vs_dict, _ = mc.value_iteration(MDP(P=mdp.P, nS=mdp.nS, nA=mdp.nA), gamma=0.95, nIt=20)
+        Vs_compiled, _ = mc.value_iteration(MDP.from_compiled(compiled), gamma=0.95, nIt=20)
+        assert np.allclose(Vs_dict[-1], Vs_compiled[-1])
+
     def test_plot(self):
         """
         test matplotlib plot function for value function and corresponding policy
@@ -0,0 +1,380 @@
+"""
+Created on October 5, 2018
+
+@author: mae-ma
+@attention: tests for continuous integration
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.5.3
+
+#############################################################################################
+
+This class tests the replay buffers used by the DQN architecture
+
+History:
+- v1.5.3: frame history of DQNExperiment with a stub agent
+- v1.5.2: a loaded dump is not changed by new transitions
+- v1.5.1: frame buffer with observations changed in place and without transitions
+- v1.5.0: frame history buffer test
+- v1.4.0: n-step return and Bellman target tests
+- v1.3.0: memory-mapped dump and load tests
+- v1.2.0: sum-tree and prioritized replay buffer tests
+- v1.1.0: frame replay buffer test
+- v1.0.0: first init
+"""
+###############################
+# Necessary to import packages from different folders
+###############################
+import sys
+import os
+sys.path.extend([os.path.split(sys.path[0])[0]])
+from architectures import misc as mc
+from architectures.replay_buffer import ReplayBuffer, ArrayReplayBuffer, FrameReplayBuffer, \
+    PrioritizedReplayBuffer, SumTree
+from dqn.history import HistoryBuffer
+from dqn.experiment import DQNExperiment
+###############################
+
+import random
+import pytest
+import numpy as np
+
+
+def fill(buffer, n, obs_shape=(10, 10), seed=0):
+    """
+    add 'n' random transitions to the buffer
+    """
+    rng = np.random.RandomState(seed)
+    obs = rng.rand(*obs_shape).astype(np.float32)
+    for i in range(n):
+        obs_tp1 = rng.rand(*obs_shape).astype(np.float32)
+        buffer.add(obs_t=obs, act=rng.randint(0, 4), rew=float(rng.randint(0, 2)), obs_tp1=obs_tp1,
+                   done=bool(i % 7 == 6))
+        obs = obs_tp1
+
+
+class TestReplayBuffer:
+    # Important to start the class name with "Test"!
+    def test_array_buffer_matches_list_buffer(self):
+        """
+        the array buffer has to return the same minibatches as the tuple buffer for the same seed
+        """
+        list_buffer = ReplayBuffer(50)
+        array_buffer = ArrayReplayBuffer(50)
+        # overwrite the ring buffer at least once
+        fill(list_buffer, 120)
+        fill(array_buffer, 120)
+        assert len(list_buffer) == len(array_buffer) == 50
+        for _ in range(5):
+            random.seed(42)
+            batch_list = list_buffer.sample(32)
+            random.seed(42)
+            batch_array = array_buffer.sample(32)
+            for a, b in zip(batch_list, batch_array):
+                assert a.shape == b.shape
+                assert np.allclose(a, b)
+
+    def test_dump_load(self, tmpdir):
+        """
+        a loaded buffer has to return the same minibatches as the dumped one
+        """
+        for buffer_cls in [ArrayReplayBuffer, FrameReplayBuffer, PrioritizedReplayBuffer]:
+            path = str(tmpdir.join(buffer_cls.__name__))
+            buffer = buffer_cls(20)
+            fill(buffer, 15)
+            buffer.dump(file_path=path)
+            # the storage is memory-mapped now, the second dump only flushes it
+            fill(buffer, 10, seed=1)
+            buffer.dump(file_path=path)
+            loaded = buffer_cls(5)
+            loaded.load(file_path=path)
+            assert len(loaded) == len(buffer)
+            idxes = buffer._sample_idxes(8)
+            for a, b in zip(buffer._encode_sample(idxes), loaded._encode_sample(idxes)):
+                assert np.array_equal(a, b)
+            # dumping back into the loaded directory replaces the files
+            fill(loaded, 3, seed=2)
+            loaded.dump(file_path=path)
+            buffer.load(file_path=path)
+            idxes = loaded._sample_idxes(8)
+            for a, b in zip(buffer._encode_sample(idxes), loaded._encode_sample(idxes)):
+                assert np.array_equal(a, b)
+
+    def test_load_keeps_dump(self, tmpdir):
+        """
+        new transitions of a loaded buffer must not change the dump until it is dumped again
+        """
+        for buffer_cls in [ArrayReplayBuffer, FrameReplayBuffer, PrioritizedReplayBuffer]:
+            path = str(tmpdir.join(buffer_cls.__name__))
+            buffer = buffer_cls(20)
+            fill(buffer, 3)
+            buffer.dump(file_path=path)
+            loaded = buffer_cls(20)
+            loaded.load(file_path=path)
+            fill(loaded, 3, seed=1)
+            reloaded = buffer_cls(20)
+            reloaded.load(file_path=path)
+            assert len(reloaded) == len(buffer)
+            idxes = buffer._sample_idxes(8)
+            for a, b in zip(buffer._encode_sample(idxes), reloaded._encode_sample(idxes)):
+                assert np.array_equal(a, b)
+            # the next dump moves the storage of the loaded buffer into its own directory
+            new_path = str(tmpdir.join(buffer_cls.__name__ + '_new'))
+            loaded.dump(file_path=new_path)
+            fill(loaded, 2, seed=2)
+            reloaded.load(file_path=path)
+            for a, b in zip(buffer._encode_sample(idxes), reloaded._encode_sample(idxes)):
+                assert np.array_equal(a, b)
+
+    def test_dump_format(self, tmpdir):
+        """
+        a dump can only be loaded by the same kind of buffer, an in-memory buffer needs a dump path
+        """
+        with pytest.raises(ValueError):
+            ArrayReplayBuffer(5).dump()
+        path = str(tmpdir.join('replay_buffer'))
+        buffer = ArrayReplayBuffer(5)
+        fill(buffer, 3)
+        buffer.dump(file_path=path)
+        assert buffer.can_load(path)
+        assert not FrameReplayBuffer(5).can_load(path)
+        assert not ReplayBuffer(5).can_load(path)
+        with pytest.raises(ValueError):
+            FrameReplayBuffer(5).load(file_path=path)
+
+    def test_memory_mapped_buffer(self, tmpdir):
+        """
+        a buffer with a directory writes its transitions directly into the '.npy' files
+        """
+        path = str(tmpdir.join('replay_buffer'))
+        buffer = FrameReplayBuffer(10, directory=path)
+        fill(buffer, 4)
+        buffer.dump()
+        frames = np.load(os.path.join(path, 'frame.npy'))
+        assert frames.shape == (11, 10, 10)
+        assert np.array_equal(frames, buffer._storage['frame'])
+
+    def test_frame_buffer_pairs(self):
+        """
+        the frame buffer has to rebuild the correct (s, s') pairs across episode boundaries
+        """
+        buffer = FrameReplayBuffer(40)
+        transitions = {}
+        frame_id = 0
+        # episodes of different length so the ring buffer wraps at different positions
+        for episode_len in [5, 13, 1, 30, 8, 17, 2]:
+            obs = np.full((3, 3), frame_id, dtype=np.float32)
+            frame_id += 1
+            for step in range(episode_len):
+                obs_tp1 = np.full((3, 3), frame_id, dtype=np.float32)
+                frame_id += 1
+                done = step == episode_len - 1
+                buffer.add(obs_t=obs, act=step % 4, rew=float(frame_id), obs_tp1=obs_tp1, done=done)
+                transitions[int(obs[0, 0])] = (int(obs_tp1[0, 0]), step % 4, float(frame_id), done)
+                obs = obs_tp1
+        # ring of 41 frames, 40 transitions minus the slots used by episode starts
+        assert 0 < len(buffer) <= 40
+        random.seed(3)
+        obs_t, act, rew, obs_tp1, done = buffer.sample(256)
+        assert obs_t.shape == (256, 3, 3)
+        for i in range(256):
+            assert transitions[int(obs_t[i, 0, 0])] == (int(obs_tp1[i, 0, 0]), act[i], rew[i], done[i])
+        # only the most recent transitions survive
+        assert np.min(obs_t) >= frame_id - 41
+
+    def test_frame_buffer_in_place_obs(self):
+        """
+        an observation array which is changed in place is not linked to the stored frame
+        """
+        buffer = FrameReplayBuffer(10)
+        with pytest.raises(ValueError):
+            buffer.sample(4)
+        obs = np.zeros((3, 3), dtype=np.float32)
+        buffer.add(obs_t=obs.copy(), act=0, rew=0., obs_tp1=obs, done=False)
+        # the caller reuses the array of the last observation for an unrelated start state
+        obs[...] = 5.
+        buffer.add(obs_t=obs, act=1, rew=1., obs_tp1=np.full((3, 3), 6., dtype=np.float32), done=True)
+        assert len(buffer) == 2
+        obs_t, act, rew, obs_tp1, done = buffer._encode_sample(np.flatnonzero(buffer._storage['valid']))
+        assert np.array_equal(obs_t[:, 0, 0], [0., 5.]) and np.array_equal(obs_tp1[:, 0, 0], [0., 6.])
+
+    def test_frame_buffer_memory(self):
+        """
+        the frame buffer stores one frame per transition
+        """
+        array_buffer = ArrayReplayBuffer(100)
+        frame_buffer = FrameReplayBuffer(100)
+        fill(array_buffer, 10)
+        fill(frame_buffer, 10)
+        array_bytes = sum(a.nbytes for a in array_buffer._storage.values())
+        frame_bytes = sum(a.nbytes for a in frame_buffer._storage.values())
+        assert frame_bytes < 0.6 * array_bytes
+
+    def test_sum_tree(self):
+        """
+        the sum-tree has to sample leaves proportional to their priority
+        """
+        tree = SumTree(5)
+        tree.update([0, 1, 2, 3, 4], [1., 0., 3., 2., 4.])
+        tree.update([3], [0.])
+        assert np.isclose(tree.total(), 8.)
+        assert list(tree.find([0., 0.99, 1., 3.99, 4., 7.99])) == [0, 0, 2, 2, 4, 4]
+        rng = np.random.RandomState(0)
+        counts = np.bincount(tree.find(rng.rand(80000) * tree.total()), minlength=5)
+        assert np.allclose(counts / 80000, [1 / 8, 0., 3 / 8, 0., 4 / 8], atol=0.01)
+
+    def test_prioritized_buffer(self):
+        """
+        the prioritized buffer has to prefer transitions with a large TD-error
+        """
+        buffer = PrioritizedReplayBuffer(100, alpha=1.0, rng=np.random.RandomState(0))
+        fill(buffer, 100)
+        random.seed(0)
+        obs_t, act, rew, obs_tp1, done, weights, idxes = buffer.sample(32, beta=1.0)
+        # all priorities are equal in the beginning
+        assert np.allclose(weights, 1.)
+        # only one transition has a TD-error
+        td_errors = np.zeros(32)
+        td_errors[0] = 1000.
+        buffer.update_priorities(idxes, td_errors)
+        batch = buffer.sample(32, beta=1.0)
+        assert np.mean(batch[-1] == idxes[0]) > 0.8
+        assert np.all(batch[-2] <= 1.)
+        # slots without a transition are never sampled
+        assert np.all(buffer._storage['valid'][batch[-1]])
+
+    def test_n_step_returns(self):
+        """
+        n-step returns have to be cut at the end of an episode
+        """
+        gamma = 0.5
+        n_step = 3
+        for buffer_cls in [ArrayReplayBuffer, FrameReplayBuffer]:
+            buffer = buffer_cls(30)
+            episodes = []
+            frame_id = 0
+            # the last episode is not finished yet
+            for episode_len, finished in [(4, True), (7, True), (2, True), (6, False)]:
+                obs = np.full(2, frame_id, dtype=np.float32)
+                episode = []
+                for step in range(episode_len):
+                    frame_id += 1
+                    obs_tp1 = np.full(2, frame_id, dtype=np.float32)
+                    done = finished and step == episode_len - 1
+                    buffer.add(obs_t=obs, act=1, rew=float(frame_id), obs_tp1=obs_tp1, done=done)
+                    episode.append((int(obs[0]), float(frame_id), int(obs_tp1[0]), done))
+                    obs = obs_tp1
+                episodes.append(episode)
+            expected = {}
+            for episode in episodes:
+                for t, (obs_id, _, _, _) in enumerate(episode):
+                    steps = episode[t:t + n_step]
+                    ret = sum(gamma ** k * rew for k, (_, rew, _, _) in enumerate(steps))
+                    expected[obs_id] = (ret, steps[-1][2], steps[-1][3], gamma ** len(steps))
+            random.seed(0)
+            obs_t, act, ret, obs_tpn, done, discount = buffer.sample_n_step(64, n_step=n_step, gamma=gamma)
+            for i in range(64):
+                exp_ret, exp_obs, exp_done, exp_discount = expected[int(obs_t[i, 0])]
+                assert np.isclose(ret[i], exp_ret)
+                assert int(obs_tpn[i, 0]) == exp_obs
+                assert done[i] == exp_done
+                assert np.isclose(discount[i], exp_discount)
+
+    def test_history_buffer(self):
+        for history_len in [1, 4]:
+            history = HistoryBuffer(history_len, [3, 2])
+            frames = [np.full((3, 2), i, dtype=np.uint8) for i in range(10)]
+            for i, frame in enumerate(frames):
+                history.add(frame)
+                stack = history.get()
+                expected = ([np.zeros((3, 2))] * history_len + frames[:i + 1])[-history_len:]
+                assert np.array_equal(stack, np.array(expected))
+                assert stack.flags.c_contiguous and not stack.flags.writeable
+                assert np.array_equal(history.last, frame)
+            history.reset(frames[0])
+            assert np.array_equal(history.get(), np.array([frames[0]] * history_len))
+
+    def test_experiment_history(self):
+        """
+        DQNExperiment passes the read-only history to the agent and stores the newest frame
+        """
+        class Env:
+            state_shape = [3, 2]
+
+            def __init__(self):
+                self.t = 0
+
+            def get_state(self):
+                return np.full(6, self.t, dtype=np.uint8)
+
+            def step(self, action):
+                self.t += 1
+                return self.get_state(), 1, False, {'head_reward': [1, 0]}
+
+        class Transitions:
+            def __init__(self):
+                self.states = []
+
+            def add(self, s, a, r, t):
+                self.states.append(s)
+
+        class AI:
+            minibatch_size = 1
+
+            def __init__(self):
+                self.transitions = Transitions()
+                self.stacks = []
+
+            def get_action(self, state, evaluate):
+                assert not state.flags.writeable
+                self.stacks.append(state.copy())
+                return 0
+
+        for history_len in [1, 4]:
+            env, ai = Env(), AI()
+            experiment = DQNExperiment(env, ai, episode_max_len=10, history_len=history_len, max_start_nullops=0,
+                                       testing=True)
+            experiment._reset()
+            for _ in range(5):
+                experiment._step()
+            # the history after the reset holds the frames 0 .. history_len - 1
+            for i, stack in enumerate(ai.stacks):
+                expected = np.arange(i, i + history_len, dtype=np.uint8)
+                assert np.array_equal(stack, np.broadcast_to(expected[:, None, None], (history_len, 3, 2)))
+            for i, state in enumerate(ai.transitions.states):
+                assert state.dtype == np.float32
+                assert np.array_equal(state, np.full((3, 2), i + history_len - 1))
+
+    def test_bellman_targets(self):
+        """
+        the batched targets have to match the per-sample DQN update
+        """
+        rng = np.random.RandomState(0)
+        q_vals, q_next_target, q_next_online = rng.randn(3, 16, 4)
+        actions = rng.randint(0, 4, 16)
+        rewards = rng.randn(16)
+        dones = rng.rand(16) < 0.3
+        targets, td_errors = mc.bellman_targets(q_vals, q_next_target, actions, rewards, dones, 0.9)
+        double_targets, _ = mc.bellman_targets(q_vals, q_next_target, actions, rewards, dones, 0.9,
+                                               q_next_online=q_next_online)
+        for i in range(16):
+            y = q_vals[i].copy()
+            y_double = q_vals[i].copy()
+            if dones[i]:
+                y[actions[i]] = y_double[actions[i]] = rewards[i]
+            else:
+                y[actions[i]] = rewards[i] + 0.9 * np.amax(q_next_target[i])
+                y_double[actions[i]] = rewards[i] + 0.9 * q_next_target[i][np.argmax(q_next_online[i])]
+            assert np.allclose(targets[i], y)
+            assert np.allclose(double_targets[i], y_double)
+            assert np.isclose(td_errors[i], y[actions[i]] - q_vals[i][actions[i]])
+
+
+if __name__ == '__main__':
+    trb = TestReplayBuffer()
+    s = 'This package contains all the automated CI tests using "pytest".\nIncluding the following:'
+    functions = [a for a in dir(trb) if not a.startswith('__')]
+    print('–' * len(s.split('\n')[0]))
+    print(s)
+    for func in functions:
+        print('-', func)
+    print('–' * len(s.split('\n')[0]))
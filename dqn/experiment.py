@@ -1,6 +1,8 @@
 import time
 import numpy as np
-from utils import Font, plot_and_write, create_folder
+from architectures.misc import Font
+from utils import plot_and_write, create_folder
+from dqn.history import HistoryBuffer
 
 
 class DQNExperiment(object):
@@ -24,7 +26,11 @@ class DQNExperiment(object):
         self.score_agent_window = np.zeros(score_window_size)
         self.steps_agent_window = np.zeros(score_window_size)
         self.replay_min_size = max(self.ai.minibatch_size, replay_min_size)
-        self.last_state = np.empty(tuple([self.history_len] + self.env.state_shape), dtype=np.uint8)
+        self.history = HistoryBuffer(self.history_len, self.env.state_shape, dtype=np.uint8)
+
+    @property
+    def last_state(self):
+        return self.history.get()
 
     def do_training(self, total_eps=5000, eps_per_epoch=100, eps_per_test=100, is_learning=True, is_testing=True):
         while self.episode_num < total_eps:
@@ -85,7 +91,7 @@ class DQNExperiment(object):
         if new_obs.ndim == 1 and len(self.env.state_shape) == 2:
             new_obs = new_obs.reshape(self.env.state_shape)
         if not evaluate:
-            self.ai.transitions.add(s=self.last_state[-1].astype('float32'), a=action, r=reward_channels, t=game_over)
+            self.ai.transitions.add(s=self.history.last.astype('float32'), a=action, r=reward_channels, t=game_over)
             self.total_training_steps += 1
         if new_obs.ndim == 1 and len(self.env.state_shape) == 2:
             new_obs = new_obs.reshape(self.env.state_shape)
@@ -108,13 +114,10 @@ class DQNExperiment(object):
             obs = self.env.get_state()
             if obs.ndim == 1 and len(self.env.state_shape) == 2:
                 obs = obs.reshape(self.env.state_shape)
-            self.last_state[i] = obs
+            self.history.add(obs)
 
     def _update_state(self, new_obs):
-        temp_buffer = np.empty(self.last_state.shape, dtype=np.uint8)
-        temp_buffer[:-1] = self.last_state[-self.history_len + 1:]
-        temp_buffer[-1] = new_obs
-        self.last_state = temp_buffer
+        self.history.add(new_obs)
 
     @staticmethod
     def _update_window(window, new_value):
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+class HistoryBuffer(object):
+    """
+    Circular buffer of the last `history_len` frames.
+
+    Every frame is written twice (at i and i + history_len) into a buffer of 2 * history_len frames,
+    so the last `history_len` frames are always a contiguous slice and `get` never copies.
+    """
+    def __init__(self, history_len, frame_shape, dtype=np.uint8):
+        self.history_len = history_len
+        self.frames = np.zeros([2 * history_len] + list(frame_shape), dtype=dtype)
+        self.idx = 0  # start of the current stack
+
+    def reset(self, frame=None):
+        if frame is None:
+            self.frames[...] = 0
+        else:
+            self.frames[...] = frame
+        self.idx = 0
+
+    def add(self, frame):
+        self.frames[self.idx] = frame
+        self.frames[self.idx + self.history_len] = frame
+        self.idx = (self.idx + 1) % self.history_len
+
+    def get(self):
+        # read-only view, oldest frame first; it changes with the next `add`
+        stack = self.frames[self.idx:self.idx + self.history_len]
+        stack.flags.writeable = False
+        return stack
+
+    @property
+    def last(self):
+        return self.get()[-1]
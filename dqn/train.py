@@ -15,7 +15,8 @@ floatX = 'float32'
 def worker(params):
     np.random.seed(seed=params['random_seed'])
     random_state = np.random.RandomState(params['random_seed'])
-    env = FruitCollectionMini(rendering=False, game_length=300, state_mode='mini')
+    # the experiment copies the states and head rewards into its history and replay buffers
+    env = FruitCollectionMini(rendering=False, game_length=300, state_mode='mini', copy_state=False)
     params['reward_dim'] = len(env.possible_fruits)
     for ex in range(params['nb_experiments']):
         print('\n')
@@ -0,0 +1,232 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: background writer for the rendered frames of the fruit collection games
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.1.0
+
+#############################################################################################
+
+History:
+- v1.1.0: restart after close, write queued frames at exit
+- v1.0.0: first init
+"""
+
+import os
+import atexit
+import threading
+import weakref
+from collections import deque
+import numpy as np
+
+FORMATS = ['jpg', 'npz', 'gif']
+DROP_POLICIES = ['block', 'newest', 'oldest']
+
+# writers with a running thread, their queued frames and unfinished episodes are written at exit
+_RUNNING = weakref.WeakSet()
+
+
+@atexit.register
+def _close_running():
+    for writer in list(_RUNNING):
+        writer.close()
+
+
+class FrameWriter(object):
+    """
+    Encodes and writes RGB frames ([h, w, 3] uint8) of episodes in a background thread.
+
+    The frames are queued as they are given (e.g. one pixel per cell) and upscaled in the thread:
+    fmt 'jpg': one image per frame upscaled by scale, <directory>/render<step_id>.jpg
+    fmt 'npz': one compressed archive per episode, <directory>/frames.npz with the unscaled
+               'frames', their 'step_ids' and the 'scale'
+    fmt 'gif': one animated GIF per episode upscaled by scale, <directory>/episode.gif
+
+    At most max_queue frames wait for the writer. If the queue is full, drop_policy decides:
+    'block' waits until the writer has taken a frame (back-pressure, no frame is lost),
+    'newest' drops the new frame and 'oldest' drops the oldest waiting frame.
+    With asynchronous=False the frames are encoded directly in write (no thread, no queue).
+    The thread is started again by the next write after close. Writers that are not closed
+    are closed at exit of the interpreter.
+    Images are encoded with Pillow.
+    """
+
+    def __init__(self, fmt='jpg', max_queue=64, drop_policy='block', scale=1, fps=10, asynchronous=True):
+        if fmt not in FORMATS:
+            raise ValueError('Frame format is not known.')
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('Drop policy is not known.')
+        if max_queue < 1:
+            raise ValueError('Queue needs space for at least one frame.')
+        self.fmt = fmt
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.scale = scale
+        self.fps = fps
+        self.asynchronous = asynchronous
+        self.nb_written = 0
+        self.nb_dropped = 0
+        self.directory = None
+        # episode of the writer: frames and step ids of 'npz' / 'gif' until the episode is ended
+        self._episode_dir = None
+        self._frames = []
+        self._step_ids = []
+        # queue of ('frame', directory, step_id, frame), ('end', directory, None, None) and ('stop', ...)
+        self._queue = deque()
+        self._nb_queued_frames = 0
+        self._busy = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = None
+        if asynchronous:
+            self._start()
+
+    def start_episode(self, directory):
+        # ends the previous episode (its archive is written), the frames of the new episode go into directory
+        if self.directory is not None:
+            self.end_episode()
+        self.directory = directory
+
+    def end_episode(self):
+        if self.directory is None:
+            return
+        self._put(('end', self.directory, None, None))
+        self.directory = None
+
+    def write(self, frame, step_id):
+        """
+        queues a copy of frame; returns False if a frame has been dropped (the new or the oldest one)
+        """
+        if self.directory is None:
+            raise ValueError('No episode has been started.')
+        return self._put(('frame', self.directory, step_id, np.array(frame, dtype=np.uint8)))
+
+    def flush(self):
+        # waits until all queued frames and episodes are written
+        if self._thread is None:
+            return
+        with self._cond:
+            while (self._queue or self._busy) and self._thread.is_alive():
+                self._cond.wait()
+        self._raise_error()
+
+    def close(self):
+        # ends the episode, writes everything and stops the thread
+        self.end_episode()
+        if self._thread is not None:
+            self._put(('stop', None, None, None))
+            self._thread.join()
+            self._thread = None
+            _RUNNING.discard(self)
+            self._raise_error()
+
+    @property
+    def nb_queued(self):
+        return self._nb_queued_frames
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='FrameWriter', daemon=True)
+        self._thread.start()
+        _RUNNING.add(self)
+
+    def _put(self, item):
+        if not self.asynchronous:
+            self._handle(item)
+            return True
+        self._raise_error()
+        if self._thread is None:
+            self._start()
+        is_frame = item[0] == 'frame'
+        written = True
+        with self._cond:
+            if is_frame and self._nb_queued_frames >= self.max_queue:
+                if self.drop_policy == 'newest':
+                    self.nb_dropped += 1
+                    return False
+                elif self.drop_policy == 'oldest':
+                    # episode ends stay in the queue
+                    oldest = next(k for k, queued in enumerate(self._queue) if queued[0] == 'frame')
+                    del self._queue[oldest]
+                    self._nb_queued_frames -= 1
+                    self.nb_dropped += 1
+                    written = False
+                else:
+                    while self._nb_queued_frames >= self.max_queue and self._thread.is_alive():
+                        self._cond.wait()
+            self._queue.append(item)
+            self._nb_queued_frames += is_frame
+            self._cond.notify_all()
+        return written
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                item = self._queue.popleft()
+                self._nb_queued_frames -= item[0] == 'frame'
+                self._busy = True
+                self._cond.notify_all()
+            if item[0] == 'stop':
+                break
+            try:
+                self._handle(item)
+            except Exception as error:
+                # reported by the next call of the environment loop
+                self._error = error
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _handle(self, item):
+        kind, directory, step_id, frame = item
+        if kind == 'frame':
+            if self.fmt == 'jpg':
+                self._save_jpg(self._upscale(frame), os.path.join(directory, 'render' + str(step_id) + '.jpg'))
+            else:
+                if directory != self._episode_dir:
+                    self._save_episode()
+                    self._episode_dir = directory
+                self._frames.append(frame)
+                self._step_ids.append(step_id)
+            self.nb_written += 1
+        elif kind == 'end' and directory == self._episode_dir:
+            self._save_episode()
+
+    def _save_episode(self):
+        if self._frames:
+            if self.fmt == 'npz':
+                np.savez_compressed(os.path.join(self._episode_dir, 'frames.npz'), frames=np.stack(self._frames),
+                                    step_ids=np.array(self._step_ids), scale=self.scale)
+            else:
+                self._save_gif(self._frames, os.path.join(self._episode_dir, 'episode.gif'))
+        self._episode_dir = None
+        self._frames = []
+        self._step_ids = []
+
+    def _upscale(self, frame):
+        return np.repeat(np.repeat(frame, self.scale, axis=0), self.scale, axis=1)
+
+    @staticmethod
+    def _save_jpg(frame, path):
+        # Pillow (installed with matplotlib) releases the GIL while encoding
+        from PIL import Image
+        Image.fromarray(frame).save(path, quality=75)
+
+    def _save_gif(self, frames, path):
+        from PIL import Image
+        # the few colours are indexed before upscaling, the palette images are scaled without new colours
+        size = (frames[0].shape[1] * self.scale, frames[0].shape[0] * self.scale)
+        images = [Image.fromarray(frame).quantize().resize(size, Image.NEAREST) for frame in frames]
+        # optimize=False: the palette is not shrunk, which would remap every upscaled frame
+        images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / self.fps), loop=0,
+                       optimize=False)
@@ -12,14 +12,48 @@ RED = (255, 0, 0)
 BLUE = (0, 100, 255)
 WALL = (80, 80, 80)
 
+# kinds of the targets
+FRUIT = 0
+GHOST = 1
+
+
+def render_rgb(states, scale=1, out=None):
+    """
+    renders pixel states (walls, fruits, player, ghosts) to RGB images without pygame
+    states: shape [4, scr_h, scr_w] or a batch [N, 4, scr_h, scr_w]
+    returns uint8 images with shape [(N,) scr_h * scale, scr_w * scale, 3], written into out if given
+    """
+    states = np.asarray(states)
+    cells = np.zeros(states.shape[:-3] + states.shape[-2:] + (3,), dtype=np.uint8)
+    # same painting order as the pygame rendering: player, fruits, ghosts, walls
+    for channel, colour in [(2, WHITE), (1, BLUE), (3, RED), (0, WALL)]:
+        cells[states[..., channel, :, :] != 0] = colour
+    return _upscale(cells, scale, out)
+
+
+def _upscale(cells, scale, out=None):
+    # every cell becomes a scale x scale block; repeating the columns first keeps the row copies contiguous
+    h, w = cells.shape[-3:-1]
+    rows = np.repeat(cells, scale, axis=-2)
+    if out is None:
+        out = np.empty(cells.shape[:-3] + (h * scale, w * scale, 3), dtype=np.uint8)
+    out.reshape(cells.shape[:-3] + (h, scale, w * scale, 3))[...] = rows[..., :, None, :, :]
+    return out
+
 
 class FruitCollection(object):
     def __init__(self, game_length=300, lives=1e6, state_mode='pixel', is_fruit=True, is_ghost=True,
-                 rng=None, rendering=False, image_saving=False, render_dir=None):
+                 rng=None, rendering=False, image_saving=False, render_dir=None, legacy_ghost_rng=False,
+                 copy_state=True, frame_writer=None):
         self.game_length = game_length
         self.lives = lives
         self.is_fruit = is_fruit
         self.is_ghost = is_ghost
+        # True: ghosts draw directions until a legal one is found (random stream of old runs)
+        self.legacy_ghost_rng = legacy_ghost_rng
+        # False: step returns read-only views of the persistent 'pixel' / 'mini' state and head reward buffers,
+        # which are updated in place by the next step (owned copies: get_state_pixel() / get_mini_state())
+        self.copy_state = copy_state
         self.legal_actions = [0, 1, 2, 3]
         self.action_meanings = ['up', 'down', 'left', 'right']
         self.reward_scheme = {'ghost': -10.0, 'fruit': +1.0, 'step': 0.0, 'wall': 0.0}
@@ -35,26 +69,53 @@ class FruitCollection(object):
         self.init_lives = deepcopy(self.lives)
         self.step_reward = 0.0
         self.possible_fruits = []
-        self.state_mode = state_mode    # how the returned state look like ('pixel' or '1hot' or 'multi-head')
+        self.state_mode = state_mode    # returned state: 'pixel', '1hot', '1hot-sparse', 'multi-head' or 'mini'
         self.nb_fruits = None
         self.scr_w = None
         self.scr_h = None
         self.rendering_scale = None
         self.walls = None
-        self.fruits = None
         self.ghosts = None
         self.init_with_mode()
+        self.wall_grid = None
+        self._player_moves = None
+        self._ghost_moves = None
+        self._ghost_legal_moves = None
+        self._ghost_next = None
+        self._ghost_nb_moves = None
+        self._idx_map = None
+        self._init_lookup_tables()
+        # [x, y] of all fruit targets, the active ones are drawn at every reset
+        self._fruit_loc = np.array(self._fruit_layout(), dtype=np.int64).reshape(-1, 2)
+        # [x, y] -> index in possible_fruits (stored as [y, x]), -1 otherwise
+        self._mini_offset = np.full((self.scr_w, self.scr_h), -1, dtype=np.int64)
+        for k, (y, x) in enumerate(self.possible_fruits):
+            self._mini_offset[x, y] = k
         self.nb_non_wall = self.scr_w * self.scr_h - len(self.walls)
         self.init_ghosts = deepcopy(self.ghosts)
+        self._background = None  # pygame surface of the walls
+        self._background_rgb = None  # [scr_h, scr_w, 3] cell image of the walls
         self._rendering = rendering
         if rendering:
             self._init_pygame()
         self.image_saving = image_saving
         self.render_dir_main = render_dir
         self.render_dir = None
-        self.targets = None  # fruits + ghosts
-        self.active_targets = None  # boolean list
-        self.active_fruits = None
+        # saved frames (one pixel per cell) are upscaled and encoded in the background by the frame writer
+        # (default: one jpg per step in rendering scale, waiting for the writer if its queue is full)
+        if image_saving and frame_writer is None:
+            from environment.frame_writer import FrameWriter
+            frame_writer = FrameWriter(scale=self.rendering_scale)
+        self.frame_writer = frame_writer
+        # targets (fruits + ghosts) as arrays; 'targets' is a list of dicts view of them
+        self.target_loc = None  # [x, y]
+        self.target_kind = None  # FRUIT or GHOST
+        self.target_active = None
+        self.target_reward = None
+        self._fruit_at = np.full((self.scr_w, self.scr_h), -1, dtype=np.int64)  # [x, y] -> active fruit target
+        self._nb_active_fruits = 0
+        self.active_targets = None  # boolean array
+        self.active_fruits = None  # boolean array of the fruit layout
         self.nb_targets = None
         self.init_targets = None
         self.nb_ghosts = None
@@ -64,11 +125,70 @@ class FruitCollection(object):
         self.step_id = 0
         self.game_over = False
         self.mini_target = []  # only is used for mini
+        # incremental pixel state: cached tensor and the painted player, ghost and caught fruit cells
+        self._pixel = None
+        self._pixel_player = None
+        self._pixel_ghosts = None
+        self._pixel_caught = []
+        # incremental mini state: cached vector and the painted player index; reused head reward buffer
+        self._mini = None
+        self._mini_view = None
+        self._mini_player = None
+        self._head_reward = np.zeros(len(self.possible_fruits), dtype=np.float32)
+        self._head_reward_view = self._head_reward.view()
+        self._head_reward_view.flags.writeable = False
         self.reset()
 
     def init_with_mode(self):
         raise NotImplementedError
 
+    def _fruit_layout(self):
+        # [x, y] of all cells which can hold a fruit
+        raise NotImplementedError
+
+    def _init_lookup_tables(self):
+        # boolean occupancy grid [x, y] of the walls
+        self.wall_grid = np.zeros((self.scr_w, self.scr_h), dtype=bool)
+        for x, y in self.walls:
+            self.wall_grid[x, y] = True
+        self._wall_channel = self.wall_grid.T.astype(np.int8)
+        # [x, y] -> index of the non-wall cell (x-major order), -1 for walls
+        self._idx_map = np.where(self.wall_grid, -1, np.cumsum(~self.wall_grid).reshape(self.wall_grid.shape) - 1)
+        # player: [x][y][action] -> (x, y, hit_wall); ghosts: [x][y][direction] -> (x, y) or None
+        pass_wall_rows = self.pass_wall_rows if self.pass_wall_rows is not None else []
+        self._player_moves = []
+        self._ghost_moves = []
+        for x in range(self.scr_w):
+            player_column, ghost_column = [], []
+            for y in range(self.scr_h):
+                up = (x, y - 1) if y > 0 and not self.wall_grid[x, y - 1] else None
+                down = (x, y + 1) if y < self.scr_h - 1 and not self.wall_grid[x, y + 1] else None
+                left = (x - 1, y) if x > 0 and not self.wall_grid[x - 1, y] else None
+                right = (x + 1, y) if x < self.scr_w - 1 and not self.wall_grid[x + 1, y] else None
+                player_left, player_right = left, right
+                if y in pass_wall_rows:
+                    if x == 0:
+                        player_left = (self.scr_w - 1, y)
+                    if x == self.scr_w - 1:
+                        player_right = (0, y)
+                # actions: [0, 1, 2, 3] == [up, down, left, right]
+                player_column.append([(x, y, True) if move is None else move + (False,)
+                                      for move in [up, down, player_left, player_right]])
+                # ghost directions: [0, 1, 2, 3] == [right, left, down, up]
+                ghost_column.append([right, left, down, up])
+            self._player_moves.append(player_column)
+            self._ghost_moves.append(ghost_column)
+        # ghosts: [x][y] -> legal neighbours in direction order; array version [x, y, k] padded with the cell itself
+        self._ghost_legal_moves = [[[move for move in cell if move is not None] for cell in column]
+                                   for column in self._ghost_moves]
+        self._ghost_nb_moves = np.zeros((self.scr_w, self.scr_h), dtype=np.int64)
+        self._ghost_next = np.zeros((self.scr_w, self.scr_h, 4, 2), dtype=np.int64)
+        for x in range(self.scr_w):
+            for y in range(self.scr_h):
+                legal = self._ghost_legal_moves[x][y]
+                self._ghost_nb_moves[x, y] = len(legal)
+                self._ghost_next[x, y] = legal + [(x, y)] * (4 - len(legal))
+
     @property
     def rendering(self):
         return self._rendering
@@ -80,7 +200,8 @@ class FruitCollection(object):
                 self._init_pygame()
                 self._rendering = True
         else:
-            self.close()
+            # only the window is closed, saved frames are still written
+            self._close_pygame()
             self._rendering = False
 
     def _init_pygame(self):
@@ -88,6 +209,13 @@ class FruitCollection(object):
         size = [self.rendering_scale * self.scr_w, self.rendering_scale * self.scr_h]
         self.screen = pygame.display.set_mode(size)
         pygame.display.set_caption("Fruit Collection")
+        # static layer: the walls are drawn once
+        self._background = pygame.Surface(size)
+        self._background.fill(BLACK)
+        for wall_pos in self.walls:
+            wall = pygame.Rect(self.rendering_scale * wall_pos[0], self.rendering_scale * wall_pos[1],
+                               self.rendering_scale, self.rendering_scale)
+            pygame.draw.rect(self._background, WALL, wall)
 
     def _init_rendering_folder(self):
         if self.render_dir_main is None:
@@ -99,6 +227,7 @@ class FruitCollection(object):
             i += 1
         self.render_dir = os.path.join(os.getcwd(), self.render_dir_main, 'render' + str(i))
         os.mkdir(self.render_dir)
+        self.frame_writer.start_episode(self.render_dir)
 
     def reset(self):
         if self.image_saving:
@@ -106,67 +235,87 @@ class FruitCollection(object):
         self.game_over = False
         self.step_id = 0
         self._reset_targets()
-        self.nb_ghosts = len(self.ghosts)
-        self.targets = deepcopy(self.fruits) + deepcopy(self.ghosts)
-        self.nb_targets = len(self.targets)
-        self.active_targets = self.active_fruits + [True] * len(self.ghosts)
-        self.lives = deepcopy(self.init_lives)
+        self._load_targets()
+        self.lives = self.init_lives
+        self._pixel = None
+        self._mini = None
+        self._pixel_caught = []
         self.soc_state_shape = [self.scr_w, self.scr_h, self.scr_w + 1, self.scr_h + 1]
-        if self.state_mode == '1hot':
+        if self.state_mode in ['1hot', '1hot-sparse']:
             self.state_shape = [self.nb_non_wall * self.nb_fruits + self.nb_ghosts * (self.nb_non_wall ** 2)]
         elif self.state_mode == 'pixel':
             self.state_shape = [4, self.scr_w, self.scr_h]
         elif self.state_mode == 'multi-head':
             self.state_shape = [3 * self.scr_w * self.scr_h]
         elif self.state_mode == 'mini':
-            self.state_shape = [100 + len(self.possible_fruits)]
+            self.state_shape = [self.scr_w * self.scr_h + len(self.possible_fruits)]
 
     def _reset_targets(self):
+        # sets 'active_fruits' for the fruit layout, the player position and the ghosts
         raise NotImplementedError
 
+    def _load_targets(self):
+        nb_fruits = len(self._fruit_loc)
+        self.nb_ghosts = len(self.ghosts)
+        self.nb_targets = nb_fruits + self.nb_ghosts
+        if self.target_loc is None or len(self.target_loc) != self.nb_targets:
+            self.target_loc = np.zeros((self.nb_targets, 2), dtype=np.int64)
+            self.target_kind = np.array([FRUIT] * nb_fruits + [GHOST] * self.nb_ghosts, dtype=np.int8)
+            self.target_active = np.zeros(self.nb_targets, dtype=bool)
+            self.target_reward = np.zeros(self.nb_targets, dtype=np.float64)
+        self.target_loc[:nb_fruits] = self._fruit_loc
+        self.target_active[:nb_fruits] = self.active_fruits
+        self.target_reward[:nb_fruits] = self.reward_scheme['fruit']
+        for k, ghost in enumerate(self.ghosts):
+            self.target_loc[nb_fruits + k] = ghost['location']
+            self.target_reward[nb_fruits + k] = ghost['reward']
+        self.target_active[nb_fruits:] = True
+        self.active_targets = self.target_active.copy()
+        self._fruit_at.fill(-1)
+        active = np.flatnonzero(self.target_active[:nb_fruits])
+        self._fruit_at[self._fruit_loc[active, 0], self._fruit_loc[active, 1]] = active
+        self._nb_active_fruits = len(active)
+
+    @property
+    def targets(self):
+        # list of dicts view of the targets: {'colour', 'reward', 'location', 'active'}
+        colours = {FRUIT: BLUE, GHOST: RED}
+        return [{'colour': colours[kind], 'reward': reward, 'location': loc, 'active': active}
+                for kind, reward, loc, active in zip(self.target_kind.tolist(), self.target_reward.tolist(),
+                                                     self.target_loc.tolist(), self.target_active.tolist())]
+
+    @targets.setter
+    def targets(self, targets):
+        # loads the locations and active flags of a (modified) list of dicts view
+        for k, target in enumerate(targets):
+            self.target_loc[k] = target['location']
+            self.target_active[k] = target['active']
+        nb_fruits = len(self._fruit_loc)
+        self._fruit_at.fill(-1)
+        active = np.flatnonzero(self.target_active[:nb_fruits])
+        self._fruit_at[self.target_loc[active, 0], self.target_loc[active, 1]] = active
+        self._nb_active_fruits = len(active)
+        self._pixel = None
+        self._mini = None
+
+    @property
+    def fruits(self):
+        return [target for target in self.targets if target['reward'] > 0]
+
     def close(self):
+        # writes the queued frames and closes the window
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+        self._close_pygame()
+
+    def _close_pygame(self):
         if self.rendering:
             pygame.quit()
 
     def _move_player(self, action):
         assert action in self.legal_actions, 'Illegal action.'
-        hit_wall = False
-        if action == 3:  # right
-            passed_wall = False
-            if self.pass_wall_rows is not None:
-                for wall_row in self.pass_wall_rows:
-                    if [self.player_pos_x, self.player_pos_y] == [self.scr_w - 1, wall_row]:
-                        self.player_pos_x = 0
-                        passed_wall = True
-                        break
-            if not passed_wall:
-                if [self.player_pos_x + 1, self.player_pos_y] not in self.walls and self.player_pos_x < self.scr_w - 1:
-                    self.player_pos_x += 1
-                else:
-                    hit_wall = True
-        elif action == 2:  # left
-            passed_wall = False
-            if self.pass_wall_rows is not None:
-                for wall_row in self.pass_wall_rows:
-                    if [self.player_pos_x, self.player_pos_y] == [0, wall_row]:
-                        self.player_pos_x = self.scr_w - 1
-                        passed_wall = True
-                        break
-            if not passed_wall:
-                if [self.player_pos_x - 1, self.player_pos_y] not in self.walls and self.player_pos_x > 0:
-                    self.player_pos_x -= 1
-                else:
-                    hit_wall = True
-        elif action == 1:  # down
-            if [self.player_pos_x, self.player_pos_y + 1] not in self.walls and self.player_pos_y < self.scr_h - 1:
-                self.player_pos_y += 1
-            else:
-                hit_wall = True
-        elif action == 0:  # up
-            if [self.player_pos_x, self.player_pos_y - 1] not in self.walls and self.player_pos_y > 0:
-                self.player_pos_y -= 1
-            else:
-                hit_wall = True
+        moves = self._player_moves[self.player_pos_x][self.player_pos_y]
+        self.player_pos_x, self.player_pos_y, hit_wall = moves[action]
         return hit_wall
 
     def _check_fruit(self):
@@ -174,184 +323,191 @@ class FruitCollection(object):
             return None
         caught_target = None
         caught_target_idx = None
-        target_count = -1
-        for k, target in enumerate(self.targets):
-            target_count += 1
-            if target['reward'] < 0:  # not fruit
-                continue
-            if target['location'] == [self.player_pos_x, self.player_pos_y] and target['active'] is True:
-                caught_target = deepcopy([self.player_pos_y, self.player_pos_x])
-                caught_target_idx = k
-                target['active'] = False
-                target['location'] = [self.scr_w, self.scr_h]  # null value
-                break
-        check = []
-        for target in self.targets:
-            if target['reward'] > 0:
-                check.append(target['active'])
-        if True not in check:
+        k = self._fruit_at[self.player_pos_x, self.player_pos_y]
+        if k >= 0:
+            caught_target = [self.player_pos_y, self.player_pos_x]
+            caught_target_idx = int(k)
+            self._pixel_caught.append((self.player_pos_x, self.player_pos_y))
+            slot = self._mini_offset[self.player_pos_x, self.player_pos_y]
+            if self._mini is not None and slot >= 0:
+                self._mini[self.scr_w * self.scr_h + slot] = 0
+            self._fruit_at[self.player_pos_x, self.player_pos_y] = -1
+            self._nb_active_fruits -= 1
+            self.target_active[k] = False
+            self.target_loc[k] = [self.scr_w, self.scr_h]  # null value
+        if self._nb_active_fruits == 0:
             self.game_over = True
         return caught_target, caught_target_idx
 
     def _check_ghost(self):
         if not self.is_ghost:
             return None
-        caught_target = None
-        for k, target in enumerate(self.targets):
-            if target['reward'] > 0:  # not ghost
-                continue
-            if target['location'] == [self.player_pos_x, self.player_pos_y] and target['active'] is True:
-                caught_target = k
-                # target['active'] = False
-                target['locations'] = [self.scr_w, self.scr_h]  # null value
+        nb_fruits = len(self._fruit_loc)
+        player = [self.player_pos_x, self.player_pos_y]
+        for k, loc in enumerate(self.target_loc[nb_fruits:].tolist()):
+            if loc == player and self.target_active[nb_fruits + k]:
                 self.lives -= 1
-                break
-        return caught_target
+                return nb_fruits + k
+        return None
 
     def _move_ghosts(self):
-        if not self.is_ghost:
+        if not self.is_ghost or self.nb_ghosts == 0:
             return
-        for target in self.targets:
-            if target['reward'] < 0:
-                loc = target['location']
-                not_moved = True
-                while not_moved:
-                    direction = self.rng.randint(0, 4)
-                    if direction == 0 and loc[0] < self.scr_w - 1 and [loc[0] + 1, loc[1]] not in self.walls:
-                        loc[0] += 1
-                        not_moved = False
-                    elif direction == 1 and loc[0] > 0 and [loc[0] - 1, loc[1]] not in self.walls:
-                        loc[0] -= 1
-                        not_moved = False
-                    elif direction == 2 and loc[1] < self.scr_h - 1 and [loc[0], loc[1] + 1] not in self.walls:
-                        loc[1] += 1
-                        not_moved = False
-                    elif direction == 3 and loc[1] > 0 and [loc[0], loc[1] - 1] not in self.walls:
-                        loc[1] -= 1
-                        not_moved = False
+        nb_fruits = len(self._fruit_loc)
+        locs = self.target_loc[nb_fruits:].tolist()
+        if self.legacy_ghost_rng:
+            for loc in locs:
+                moves = self._ghost_moves[loc[0]][loc[1]]
+                while True:
+                    move = moves[self.rng.randint(0, 4)]
+                    if move is not None:
+                        loc[0], loc[1] = move
+                        break
+        else:
+            # one uniform draw per ghost (a single call for all ghosts) among the legal neighbours of its cell
+            for loc, u in zip(locs, self.rng.rand(len(locs)).tolist()):
+                moves = self._ghost_legal_moves[loc[0]][loc[1]]
+                if moves:
+                    loc[0], loc[1] = moves[int(u * len(moves))]
+        self.target_loc[nb_fruits:] = locs
 
     def get_state(self):
         if self.state_mode == 'pixel':
-            return self.get_state_pixel()
+            return self.get_state_pixel(copy=self.copy_state)
         elif self.state_mode == '1hot':
             return self.get_1hot_features()
+        elif self.state_mode == '1hot-sparse':
+            return self.get_1hot_features(sparse=True)
         elif self.state_mode == 'multi-head':
             return self.get_state_multi_head()
         elif self.state_mode == 'mini':
-            return self.get_mini_state()
+            return self.get_mini_state(copy=self.copy_state)
         else:
             raise ValueError('State-mode is not known.')
 
-    def get_mini_state(self):
-        state = np.zeros((self.scr_w * self.scr_h + len(self.possible_fruits)), dtype=np.int8)
-        state[self.player_pos_y * self.scr_h + self.player_pos_x] = 1
-        for target in self.targets:
-            if target['active'] and target['reward'] > 0:
-                offset = self.possible_fruits.index([target['location'][1], target['location'][0]])
-                index = (self.scr_w * self.scr_h) + offset
-                state[index] = 1
-        return state
+    def get_mini_state(self, copy=True):
+        # player cell, then one slot per possible fruit; shape: [scr_w * scr_h + len(possible_fruits)]
+        # copy=False returns a read-only view which is updated in place by the next call
+        if self._mini is None:
+            self._mini = np.zeros((self.scr_w * self.scr_h + len(self.possible_fruits)), dtype=np.int8)
+            active = self._active_fruit_loc()
+            # possible fruits are stored as [y, x]
+            self._mini[self.scr_w * self.scr_h + self._mini_offset[active[:, 0], active[:, 1]]] = 1
+            self._mini_view = self._mini.view()
+            self._mini_view.flags.writeable = False
+        else:
+            # caught fruits are cleared in '_check_fruit'
+            self._mini[self._mini_player] = 0
+        self._mini_player = self.player_pos_y * self.scr_h + self.player_pos_x
+        self._mini[self._mini_player] = 1
+        if copy:
+            return self._mini.copy()
+        return self._mini_view
+
+    def _get_head_reward(self, slot=None):
+        # head reward of the 'mini' state mode: 1 for the slot of the caught fruit
+        self._head_reward.fill(0.)
+        if slot is not None and slot >= 0:
+            self._head_reward[slot] = 1.
+        if self.copy_state:
+            return self._head_reward.copy()
+        return self._head_reward_view
+
+    def _active_fruit_loc(self):
+        # [x, y] of the active fruits
+        nb_fruits = len(self._fruit_loc)
+        return self.target_loc[:nb_fruits][self.target_active[:nb_fruits]]
+
+    def _ghost_loc(self):
+        # [x, y] of the ghosts
+        return self.target_loc[len(self._fruit_loc):][self.target_active[len(self._fruit_loc):]]
 
     def get_state_multi_head(self):
         # three binary heads: player, fruits, ghosts
         state = np.zeros(3 * self.scr_w * self.scr_h, dtype=np.int8)
         state[self.player_pos_y * self.scr_h + self.player_pos_x] = 1
-        for target in self.targets:
-            if target['active']:
-                if target['reward'] > 0:
-                    index = (self.scr_w * self.scr_h) + (target['location'][1] * self.scr_h + target['location'][0])
-                else:
-                    index = 2 * (self.scr_w * self.scr_h) + \
-                            (target['location'][1] * self.scr_h + target['location'][0])
-                state[index] = 1
+        fruits, ghosts = self._active_fruit_loc(), self._ghost_loc()
+        state[(self.scr_w * self.scr_h) + fruits[:, 1] * self.scr_h + fruits[:, 0]] = 1
+        state[2 * (self.scr_w * self.scr_h) + ghosts[:, 1] * self.scr_h + ghosts[:, 0]] = 1
         return state
 
-    def get_state_pixel(self):
-        state = np.zeros((self.state_shape[1], self.state_shape[2], self.state_shape[0]), dtype=np.int8)
-        # walls, fruits, player, ghost
-        player_pos = [self.player_pos_x, self.player_pos_y]
-        fruits = []
-        ghosts = []
-        for target in self.targets:
-            if target['active'] is True:
-                if target['reward'] > 0:
-                    fruits.append(target['location'])
-                elif target['reward'] < 0:
-                    ghosts.append(target['location'])
-        for loc in fruits:
-            if loc in ghosts and self.is_ghost:
-                # state[tuple(loc)] = self.code['fruit+ghost']
-                state[tuple(loc)][1] = 1
-                state[tuple(loc)][3] = 1
-                ghosts.remove(loc)
-            else:
-                state[tuple(loc)][1] = 1
-                # state[tuple(loc)] = self.code['fruit']
-        if player_pos in ghosts and self.is_ghost:
-            state[tuple(player_pos)][2] = 1
-            state[tuple(player_pos)][3] = 1
-            ghosts.remove(player_pos)
+    def get_state_pixel(self, copy=True):
+        # walls, fruits, player, ghost; shape: [4, scr_h, scr_w]
+        # copy=False returns a read-only view which is updated in place by the next call
+        if self._pixel is None:
+            self._pixel = self._full_state_pixel()
         else:
-            state[tuple(player_pos)][2] = 1
-        if self.is_ghost:
-            for loc in ghosts:
-                state[tuple(loc)][3] = 1
-                # state[tuple(loc)] = self.code['ghost']
-        for loc in self.walls:
-            state[tuple(loc)][0] = 1
-            # state[tuple(loc)] = self.code['wall']
-        return deepcopy(state.T)
+            self._update_state_pixel()
+        if copy:
+            return self._pixel.copy()
+        view = self._pixel.view()
+        view.flags.writeable = False
+        return view
+
+    def _ghost_cells(self):
+        if not self.is_ghost:
+            return []
+        return [tuple(loc) for loc in self._ghost_loc().tolist()]
+
+    def _full_state_pixel(self):
+        state = np.zeros((4, self.scr_h, self.scr_w), dtype=np.int8)
+        state[0] = self._wall_channel
+        fruits = self._active_fruit_loc()
+        state[1, fruits[:, 1], fruits[:, 0]] = 1
+        self._pixel_ghosts = self._ghost_cells()
+        for x, y in self._pixel_ghosts:
+            state[3, y, x] = 1
+        self._pixel_player = (self.player_pos_x, self.player_pos_y)
+        state[2, self.player_pos_y, self.player_pos_x] = 1
+        self._pixel_caught = []
+        return state
+
+    def _update_state_pixel(self):
+        # only the cells of the player move, the caught fruits and the ghost moves change
+        state = self._pixel
+        for x, y in self._pixel_caught:
+            state[1, y, x] = 0
+        self._pixel_caught = []
+        for x, y in self._pixel_ghosts:
+            state[3, y, x] = 0
+        self._pixel_ghosts = self._ghost_cells()
+        for x, y in self._pixel_ghosts:
+            state[3, y, x] = 1
+        x, y = self._pixel_player
+        state[2, y, x] = 0
+        self._pixel_player = (self.player_pos_x, self.player_pos_y)
+        state[2, self.player_pos_y, self.player_pos_x] = 1
 
     def get_soc_state(self):
         # call this after each step to get SoC state list (len = self.nb_targets)
         # returns list of 4-tuples; one 4-tuple for each target.
-        state = []
-        for target in self.targets:
-            target_state = [self.player_pos_x, self.player_pos_y]
-            if target['active'] is True:
-                target_state.extend(target['location'])
-            else:
-                target_state.extend([self.scr_w, self.scr_h])
-            state.append(target_state)
-        return deepcopy(state)
+        state = np.empty((self.nb_targets, 4), dtype=np.int64)
+        state[:, 0], state[:, 1] = self.player_pos_x, self.player_pos_y
+        state[:, 2:] = np.where(self.target_active[:, None], self.target_loc, [self.scr_w, self.scr_h])
+        return state.tolist()
 
-    def get_1hot_features(self):
+    def get_1hot_features(self, sparse=False):
+        # sparse: only the (sorted) indices of the ones in the 1hot vector of length state_shape[0]
         agent_idx = self._get_idx(self.player_pos_x, self.player_pos_y)
-        agent_state = np.zeros(self.nb_non_wall, dtype=np.int8)
-        agent_state[agent_idx] = 1
-        state = np.zeros(self.state_shape, dtype=np.int8)
-        i = -1
-        for target in self.targets:
-            if target['reward'] > 0:
-                i += 1
-                if target['active'] is True:
-                    state[i * self.nb_non_wall: (i + 1) * self.nb_non_wall] = agent_state.copy()
-        ghost_indices = []
-        for target in self.targets:
-            if target['reward'] < 0:
-                ghost_indices.append(self._get_idx(target['location'][0], target['location'][1]))
+        nb_fruits = len(self._fruit_loc)
+        fruit_indices = np.flatnonzero(self.target_active[:nb_fruits]) * self.nb_non_wall + agent_idx
         last_fruit_pointer = self.nb_non_wall * self.nb_fruits
-        for i, ghost_idx in enumerate(ghost_indices):
-            ghost_agent_idx = agent_idx * self.nb_non_wall + ghost_idx
-            state[last_fruit_pointer + i * (self.nb_non_wall ** 2) + ghost_agent_idx] = 1
-        return state.copy()
+        ghosts = self.target_loc[nb_fruits:]
+        ghost_idx = self._idx_map[ghosts[:, 0], ghosts[:, 1]]
+        assert np.all(ghost_idx >= 0)
+        ghost_indices = last_fruit_pointer + np.arange(self.nb_ghosts) * (self.nb_non_wall ** 2) + \
+            agent_idx * self.nb_non_wall + ghost_idx
+        indices = np.concatenate([fruit_indices, ghost_indices])
+        if sparse:
+            return indices
+        state = np.zeros(self.state_shape, dtype=np.int8)
+        state[indices] = 1
+        return state
 
     def _get_idx(self, x, y):
-        assert [x, y] not in self.walls
-        idx = 0
-        flag = False
-        for i in range(self.scr_w):
-            for j in range(self.scr_h):
-                if [i, j] in self.walls:
-                    continue
-                if [i, j] == [x, y]:
-                    flag = True
-                    break
-                else:
-                    idx += 1
-            if flag:
-                break
-        return idx
+        idx = self._idx_map[x, y]
+        assert idx >= 0
+        return int(idx)
 
     def step(self, action):
         # actions: [0, 1, 2, 3] == [up, down, left, right]
@@ -361,7 +517,7 @@ class FruitCollection(object):
         if self.step_id >= self.game_length - 1:
             self.game_over = True
             if self.state_mode == 'mini':
-                head_reward = np.zeros(len(self.possible_fruits), dtype=np.float32)
+                head_reward = self._get_head_reward()
             else:
                 head_reward = []
             return self.get_state(), 0., self.game_over, \
@@ -374,11 +530,11 @@ class FruitCollection(object):
             wall_reward = 0.0
         possible_caught_ghost = self._check_ghost()
         if possible_caught_ghost is not None:
-            last_ghost_position = deepcopy(self.targets[possible_caught_ghost]['location'])
+            last_ghost_position = self.target_loc[possible_caught_ghost].tolist()
         self._move_ghosts()
         swap_flag = False  # in a T-situation it is possible that no hit happens
         if possible_caught_ghost is not None:
-            if last_player_position == self.targets[possible_caught_ghost]['location'] and \
+            if last_player_position == self.target_loc[possible_caught_ghost].tolist() and \
                             last_ghost_position == [self.player_pos_x, self.player_pos_y]:
                 swap_flag = True
         # check for ghost hit head-to-head after the moves
@@ -390,16 +546,15 @@ class FruitCollection(object):
         else:
             ghost_reward = 0.
         caught_fruit, caught_fruit_idx = self._check_fruit()
-        if self.state_mode == 'mini':
-            head_reward = np.zeros(len(self.possible_fruits), dtype=np.float32)
-        else:
-            head_reward = []
         if caught_fruit is not None:
             fruit_reward = self.reward_scheme['fruit']
-            if self.state_mode == 'mini':
-                head_reward[self.possible_fruits.index(caught_fruit)] = 1.
         else:
             fruit_reward = 0.
+        if self.state_mode == 'mini':
+            slot = None if caught_fruit is None else int(self._mini_offset[self.player_pos_x, self.player_pos_y])
+            head_reward = self._get_head_reward(slot)
+        else:
+            head_reward = []
         if self.lives == 0:
             self.game_over = True
         self.step_id += 1
@@ -407,35 +562,51 @@ class FruitCollection(object):
                self.game_over, {'fruit': caught_fruit_idx, 'ghost': caught_ghost, 'head_reward': head_reward,
                                 'hit_wall': hit_wall}
 
-    def render(self):
+    def render(self, mode='human', scale=None):
+        # mode 'human': pygame window (if rendering is on); 'rgb_array': returns the frame, no window is needed
+        if mode == 'rgb_array':
+            return self._render_rgb(self.rendering_scale if scale is None else scale)
+        elif mode != 'human':
+            raise ValueError('Render mode is not known.')
         if not self.rendering:
+            # saved frames do not need the window
+            if self.image_saving:
+                self.save_image()
             return
         pygame.event.pump()
-        self.screen.fill(BLACK)
+        self.screen.blit(self._background, (0, 0))
         size = [self.rendering_scale, self.rendering_scale]
         player = pygame.Rect(self.rendering_scale * self.player_pos_x, self.rendering_scale * self.player_pos_y,
                              size[0], size[1])
         pygame.draw.rect(self.screen, WHITE, player)
-        for target in self.targets:
-            if target['active'] is True:
-                pos = target['location']
-                p = [self.rendering_scale * pos[0], self.rendering_scale * pos[1]]
-                gl = pygame.Rect(p[0], p[1], size[0], size[1])
-                pygame.draw.rect(self.screen, target['colour'], gl)
-        for wall_pos in self.walls:
-            p = [self.rendering_scale * wall_pos[0], self.rendering_scale * wall_pos[1]]
-            wall = pygame.Rect(p[0], p[1], size[0], size[1])
-            pygame.draw.rect(self.screen, WALL, wall)
+        colours = {FRUIT: BLUE, GHOST: RED}
+        for k in np.flatnonzero(self.target_active).tolist():
+            pos = self.target_loc[k].tolist()
+            p = [self.rendering_scale * pos[0], self.rendering_scale * pos[1]]
+            gl = pygame.Rect(p[0], p[1], size[0], size[1])
+            pygame.draw.rect(self.screen, colours[int(self.target_kind[k])], gl)
         pygame.display.flip()
 
         if self.image_saving:
             self.save_image()
 
+    def _render_rgb(self, scale):
+        if self._background_rgb is None:
+            self._background_rgb = np.zeros((self.scr_h, self.scr_w, 3), dtype=np.uint8)
+            self._background_rgb[self.wall_grid.T] = WALL
+        cells = self._background_rgb.copy()
+        cells[self.player_pos_y, self.player_pos_x] = WHITE
+        fruits, ghosts = self._active_fruit_loc(), self._ghost_loc()
+        cells[fruits[:, 1], fruits[:, 0]] = BLUE
+        cells[ghosts[:, 1], ghosts[:, 0]] = RED
+        return _upscale(cells, scale)
+
     def save_image(self):
-        if self.rendering and self.render_dir is not None:
-            pygame.image.save(self.screen, self.render_dir + '/render' + str(self.step_id) + '.jpg')
+        # the frame is queued, encoding and writing happens in the thread of the frame writer
+        if self.frame_writer is not None and self.render_dir is not None:
+            self.frame_writer.write(self._render_rgb(1), self.step_id)
         else:
-            raise ValueError('env.rendering is False and/or environment has not been reset.')
+            raise ValueError('env.image_saving is False and/or environment has not been reset.')
 
 
 
@@ -469,24 +640,18 @@ class FruitCollectionSmall(FruitCollection):
             else:
                 self.ghosts = [{'colour': RED, 'reward': self.reward_scheme['ghost'], 'location': [4, 5],
                                 'active': True}]
-        [self.player_pos_x, self.player_pos_y] = deepcopy([self.scr_w - 1, self.scr_h - 1])
-        # Targets:  Format: [ {colour: c1, reward: r1, locations: list_l1, 'active': list_a1}, ... ]
-        occupied = self.walls + [[self.player_pos_x, self.player_pos_y]]
-        self.fruits = []
-        self.active_fruits = []
+        [self.player_pos_x, self.player_pos_y] = [self.scr_w - 1, self.scr_h - 1]
+        # every free cell holds a fruit with probability 0.5; one call draws the same stream as one call per cell
+        self.active_fruits = self.rng.binomial(1, 0.5, size=len(self._fruit_loc)).astype(bool)
         if self.is_fruit:
-            for x in range(self.scr_w):
-                for y in range(self.scr_h):
-                    if [x, y] not in occupied:
-                        if self.rng.binomial(1, 0.5):
-                            self.fruits.append({'colour': BLUE, 'reward': self.reward_scheme['fruit'],
-                                                'location': [x, y], 'active': True})
-                            self.active_fruits.append(True)
-                        else:
-                            self.fruits.append({'colour': BLUE, 'reward': self.reward_scheme['fruit'],
-                                                'location': [x, y], 'active': False})
-                            self.active_fruits.append(False)
-            self.nb_fruits = len(self.fruits)
+            self.nb_fruits = len(self._fruit_loc)
+
+    def _fruit_layout(self):
+        if not self.is_fruit:
+            return []
+        free = ~self.wall_grid
+        free[tuple([self.scr_w - 1, self.scr_h - 1])] = False  # start position of the player
+        return np.argwhere(free).tolist()
 
 
 class FruitCollectionMini(FruitCollection):
@@ -508,27 +673,42 @@ class FruitCollectionMini(FruitCollection):
     def _reset_targets(self):
         while True:
             self.player_pos_x, self.player_pos_y = self.rng.randint(0, self.scr_w), self.rng.randint(0, self.scr_h)
-            if [self.player_pos_x, self.player_pos_y] not in self.possible_fruits:
+            if [self.player_pos_x, self.player_pos_y] not in self.possible_fruits and \
+                    not self.wall_grid[self.player_pos_x, self.player_pos_y]:
                 break
-        # Targets:  Format: [ {colour: c1, reward: r1, locations: list_l1, 'active': list_a1}, ... ]
-        self.fruits = []
-        self.active_fruits = []
+        # a fruit target on every cell, nb_fruits of the possible fruits are active
+        self.active_fruits = np.zeros(len(self._fruit_loc), dtype=bool)
         if self.is_fruit:
-            for x in range(self.scr_w):
-                for y in range(self.scr_h):
-                    self.fruits.append({'colour': BLUE, 'reward': self.reward_scheme['fruit'],
-                                        'location': [x, y], 'active': False})
-                    self.active_fruits.append(False)
-            fruits_idx = deepcopy(self.possible_fruits)
+            fruits_idx = [list(f) for f in self.possible_fruits]
             self.rng.shuffle(fruits_idx)
             fruits_idx = fruits_idx[:self.nb_fruits]
             self.mini_target = [False] * len(self.possible_fruits)
             for f in fruits_idx:
-                idx = f[1] * self.scr_w + f[0]
-                self.fruits[idx]['active'] = True
-                self.active_fruits[idx] = True
+                self.active_fruits[f[1] * self.scr_w + f[0]] = True
                 self.mini_target[self.possible_fruits.index(f)] = True
 
+    def _fruit_layout(self):
+        if not self.is_fruit:
+            return []
+        return [[x, y] for x in range(self.scr_w) for y in range(self.scr_h)]
+
+
+class FruitCollectionTiny(FruitCollectionMini):
+    # 5 x 5 layout of 'FruitCollectionTrain' with all 4 possible fruits and an optional ghost
+    def init_with_mode(self):
+        self.is_fruit = True
+        self.nb_fruits = 4
+        self.possible_fruits = [[0, 0], [0, 4], [4, 0], [4, 4]]
+        self.scr_w = 5
+        self.scr_h = 5
+        self.rendering_scale = 50
+        self.walls = [[1, 0], [2, 0], [4, 1], [0, 2], [2, 2], [3, 3], [1, 4]]
+        if self.is_ghost:
+            self.ghosts = [{'colour': RED, 'reward': self.reward_scheme['ghost'], 'location': [0, 1],
+                            'active': True}]
+        else:
+            self.ghosts = []
+
 
 class FruitCollectionLarge(FruitCollection):
     def init_with_mode(self):
@@ -571,25 +751,20 @@ class FruitCollectionLarge(FruitCollection):
             self.ghosts = []
 
     def _reset_targets(self):
-        self.ghosts = deepcopy(self.init_ghosts)
+        # the ghost dicts only hold the start locations, the moves happen on the target arrays
+        self.ghosts = self.init_ghosts
         [self.player_pos_x, self.player_pos_y] = [10, 8]
-        # Targets:  Format: [ {colour: c1, reward: r1, locations: list_l1, 'active': list_a1}, ... ]
-        occupied = self.walls + [[self.player_pos_x, self.player_pos_y]]
-        self.fruits = []
-        self.active_fruits = []
+        # every free cell holds a fruit with probability 0.5; one call draws the same stream as one call per cell
+        self.active_fruits = self.rng.binomial(1, 0.5, size=len(self._fruit_loc)).astype(bool)
         if self.is_fruit:
-            for x in range(self.scr_w):
-                for y in range(self.scr_h):
-                    if [x, y] not in occupied:
-                        if self.rng.binomial(1, 0.5):
-                            self.fruits.append({'colour': BLUE, 'reward': self.reward_scheme['fruit'],
-                                                'location': [x, y], 'active': True})
-                            self.active_fruits.append(True)
-                        else:
-                            self.fruits.append({'colour': BLUE, 'reward': self.reward_scheme['fruit'],
-                                                'location': [x, y], 'active': False})
-                            self.active_fruits.append(False)
-            self.nb_fruits = len(self.fruits)
+            self.nb_fruits = len(self._fruit_loc)
+
+    def _fruit_layout(self):
+        if not self.is_fruit:
+            return []
+        free = ~self.wall_grid
+        free[tuple([10, 8])] = False  # start position of the player
+        return np.argwhere(free).tolist()
 
 
 @click.command()
@@ -625,6 +800,7 @@ def test(mode, fruit, ghost, save):
                     if event.key == pygame.K_RIGHT:
                         action = 3
                     if event.key == pygame.K_q:
+                        env.close()
                         return
             if action is None:
                 continue
@@ -643,6 +819,7 @@ def test(mode, fruit, ghost, save):
             print('─' * 30)
             # capture screen as image
             # pygame.image.save(env.screen, 'screen.jpg')
+    env.close()
 
 
 if __name__ == '__main__':
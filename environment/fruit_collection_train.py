@@ -184,7 +184,7 @@ class FruitCollectionTrain(FruitCollection):
                         rew += r
                     if terminated is True:
                         rew += r
-                        self.dqn.save_buffer(path='replay_buffer.pkl')
+                        self.dqn.save_buffer(path=self.dqn.replay_buffer_file)
                         self.dqn.save_weights(path='weights.h5')
                         print('\nepisode: {}/{} \nepoch: {}/{} \nscore: {} \neps: {:.3f} \nsum of steps: {}'.
                               format(episode, self.dqn.num_episodes, epoch,
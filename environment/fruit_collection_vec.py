@@ -0,0 +1,267 @@
+"""
+Created on October 18, 2026
+
+@author: mae-ma
+@attention: vectorized fruit collection environment (N games stepped at once)
+@contact: albus.marcel@gmail.com (Marcel Albus)
+@version: 1.5.0
+
+#############################################################################################
+
+History:
+- v1.5.0: ghosts walk with the random state of their game, fruit lookup grid
+- v1.4.0: rgb_array rendering of all games
+- v1.3.0: read the target arrays of the scalar environment
+- v1.2.0: ghosts use the legal move table of the scalar environment
+- v1.1.0: use the lookup tables of the scalar environment
+- v1.0.0: first init
+"""
+
+import numpy as np
+from environment.fruit_collection import FRUIT, GHOST, render_rgb
+
+
+class FruitCollectionVec(object):
+    """
+    N independent fruit collection games stored as numpy arrays and stepped at once.
+
+    Every game owns a scalar environment (FruitCollectionMini, -Small or -Large) with its own
+    RandomState. The scalar environment is only used to reset the game, so the initial player
+    position and fruit layout are identical to the scalar environment under the same seed.
+    Stepping is done on the arrays and mirrors FruitCollection.step (auto reset, game length,
+    passing corridors, head-to-head ghost hits, lives).
+
+    Ghosts walk with the RandomState of their game and draw exactly what the scalar environment
+    draws, so the complete trajectories (including all later resets) are identical to the scalar
+    environment under the same seed.
+    """
+
+    def __init__(self, env_class, nb_envs, seeds=None, state_mode='pixel', **kwargs):
+        if state_mode not in ['pixel', 'multi-head', 'mini']:
+            raise ValueError('State-mode is not supported by the vectorized environment.')
+        if seeds is None:
+            seeds = list(range(nb_envs))
+        if len(seeds) != nb_envs:
+            raise ValueError('One seed per environment is needed.')
+        if kwargs.get('legacy_ghost_rng', False):
+            raise ValueError('The legacy ghost random stream is not supported by the vectorized environment.')
+        self.nb_envs = nb_envs
+        self.state_mode = state_mode
+        self.envs = [env_class(rng=np.random.RandomState(seed), state_mode=state_mode, **kwargs)
+                     for seed in seeds]
+        env = self.envs[0]
+        self.scr_w = env.scr_w
+        self.scr_h = env.scr_h
+        self.rendering_scale = env.rendering_scale
+        self.game_length = env.game_length
+        self.is_fruit = env.is_fruit
+        self.is_ghost = env.is_ghost
+        self.reward_scheme = env.reward_scheme
+        self.nb_actions = env.nb_actions
+        self.legal_actions = env.legal_actions
+        self.possible_fruits = env.possible_fruits
+        self.state_shape = env.state_shape
+        self.nb_fruit_locations = int(np.sum(env.target_kind == FRUIT))
+        self.nb_ghosts = int(np.sum(env.target_kind == GHOST))
+        self._build_tables(env)
+        if self.possible_fruits:
+            # possible fruits are stored as [y, x]
+            self._mini_idx = np.full((self.scr_w, self.scr_h), -1, dtype=np.int64)
+            for k, (y, x) in enumerate(self.possible_fruits):
+                self._mini_idx[x, y] = k
+        # game states
+        self.player = np.zeros((nb_envs, 2), dtype=np.int64)
+        self.fruit_loc = env.target_loc[env.target_kind == FRUIT].copy()
+        self.fruit_active = np.zeros((nb_envs, self.nb_fruit_locations), dtype=bool)
+        # [game, x, y] -> index of the active fruit (-1 otherwise), as '_fruit_at' of the scalar environment
+        self.fruit_at = np.full((nb_envs, self.scr_w, self.scr_h), -1, dtype=np.int64)
+        self.nb_active_fruits = np.zeros(nb_envs, dtype=np.int64)
+        self.ghosts = np.zeros((nb_envs, self.nb_ghosts, 2), dtype=np.int64)
+        self.lives = np.zeros(nb_envs, dtype=np.float64)
+        self.step_id = np.zeros(nb_envs, dtype=np.int64)
+        self.game_over = np.zeros(nb_envs, dtype=bool)
+        for i in range(nb_envs):
+            self._load_game(i)
+
+    def _build_tables(self, env):
+        """
+        array versions of the lookup tables of the scalar environment
+        """
+        self.wall_grid = env.wall_grid
+        # player: [x, y, action] -> new position and hit wall flag
+        moves = np.array(env._player_moves, dtype=np.int64)
+        self._player_next = moves[..., :2]
+        self._player_hit_wall = moves[..., 2].astype(bool)
+        # ghosts: [x, y, k] -> k-th legal neighbour and [x, y] -> number of legal neighbours
+        self._ghost_next = env._ghost_next
+        self._ghost_nb_moves = env._ghost_nb_moves
+
+    def _load_game(self, i):
+        """
+        copy the state of the scalar environment i into the arrays
+        """
+        env = self.envs[i]
+        self.player[i] = [env.player_pos_x, env.player_pos_y]
+        self.fruit_active[i] = env.target_active[env.target_kind == FRUIT]
+        active = np.flatnonzero(self.fruit_active[i])
+        self.fruit_at[i] = -1
+        self.fruit_at[i, self.fruit_loc[active, 0], self.fruit_loc[active, 1]] = active
+        self.nb_active_fruits[i] = len(active)
+        self.ghosts[i] = env.target_loc[env.target_kind == GHOST]
+        self.lives[i] = env.lives
+        self.step_id[i] = 0
+        self.game_over[i] = False
+
+    def reset(self, idxes=None):
+        """
+        reset the games in idxes (default: all) with their own scalar environments
+        returns the stacked observations of all games
+        """
+        if idxes is None:
+            idxes = range(self.nb_envs)
+        for i in idxes:
+            self.envs[i].reset()
+            self._load_game(i)
+        return self.get_state()
+
+    def _move_ghosts(self, movers):
+        """
+        random walk of the ghosts of the games in movers, uniform over the legal directions
+        every game draws one number per ghost from its own RandomState, like FruitCollection._move_ghosts
+        """
+        movers = np.flatnonzero(movers)
+        if movers.size == 0:
+            return
+        loc = self.ghosts[movers]
+        counts = self._ghost_nb_moves[loc[..., 0], loc[..., 1]]
+        draws = np.array([self.envs[i].rng.rand(self.nb_ghosts) for i in movers.tolist()])
+        choice = (draws * counts).astype(np.int64)
+        self.ghosts[movers] = self._ghost_next[loc[..., 0], loc[..., 1], choice]
+
+    def _ghost_hit(self):
+        """
+        index of the first ghost on the player position per game (-1 if none)
+        """
+        if self.nb_ghosts == 0:
+            return np.full(self.nb_envs, -1, dtype=np.int64)
+        hit = np.all(self.ghosts == self.player[:, None, :], axis=-1)
+        return np.where(hit.any(axis=1), np.argmax(hit, axis=1), -1)
+
+    def step(self, actions):
+        """
+        actions: [0, 1, 2, 3] == [up, down, left, right] for every game
+        returns stacked observations, rewards, terminal flags and an info dict of arrays
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        assert actions.shape == (self.nb_envs,), 'One action per game is needed.'
+        assert np.all((actions >= 0) & (actions < self.nb_actions)), 'Illegal action.'
+        finished = np.flatnonzero(self.game_over)
+        if finished.size > 0:
+            self.reset(finished)
+        rewards = np.zeros(self.nb_envs, dtype=np.float64)
+        timeout = self.step_id >= self.game_length - 1
+        alive = ~timeout
+        self.game_over[timeout] = True
+        # player
+        last_player = self.player.copy()
+        x, y = self.player[:, 0], self.player[:, 1]
+        hit_wall = self._player_hit_wall[x, y, actions] & alive
+        self.player[alive] = self._player_next[x, y, actions][alive]
+        rewards[hit_wall] += self.reward_scheme['wall']
+        # ghosts
+        caught_ghost = np.full(self.nb_envs, -1, dtype=np.int64)
+        if self.is_ghost and self.nb_ghosts > 0:
+            rows = np.arange(self.nb_envs)
+            possible_caught = np.where(alive, self._ghost_hit(), -1)
+            first = possible_caught >= 0
+            self.lives[first] -= 1
+            last_ghost = self.ghosts[rows, np.maximum(possible_caught, 0)].copy()
+            self._move_ghosts(alive)
+            # in a T-situation it is possible that no hit happens
+            swap = first & np.all(self.ghosts[rows, np.maximum(possible_caught, 0)] == last_player, axis=1) & \
+                np.all(last_ghost == self.player, axis=1)
+            caught_ghost = np.where(alive, self._ghost_hit(), -1)
+            self.lives[caught_ghost >= 0] -= 1
+            caught_ghost = np.where((caught_ghost < 0) & swap, possible_caught, caught_ghost)
+            rewards[caught_ghost >= 0] += self.reward_scheme['ghost']
+            caught_ghost = np.where(caught_ghost >= 0, caught_ghost + self.nb_fruit_locations, -1)
+        # fruits
+        caught_fruit = np.full(self.nb_envs, -1, dtype=np.int64)
+        if self.is_fruit:
+            x, y = self.player[:, 0], self.player[:, 1]
+            on_fruit = self.fruit_at[np.arange(self.nb_envs), x, y]
+            caught = (on_fruit >= 0) & alive
+            games = np.flatnonzero(caught)
+            caught_fruit[games] = on_fruit[games]
+            self.fruit_active[games, on_fruit[games]] = False
+            self.fruit_at[games, x[games], y[games]] = -1
+            self.nb_active_fruits[games] -= 1
+            rewards[caught] += self.reward_scheme['fruit']
+            self.game_over |= alive & (self.nb_active_fruits == 0)
+        self.game_over |= alive & (self.lives == 0)
+        self.step_id[alive] += 1
+        info = {'fruit': caught_fruit, 'ghost': caught_ghost, 'hit_wall': hit_wall}
+        if self.state_mode == 'mini':
+            head_reward = np.zeros((self.nb_envs, len(self.possible_fruits)), dtype=np.float32)
+            caught = np.flatnonzero(caught_fruit >= 0)
+            loc = self.fruit_loc[caught_fruit[caught]]
+            head_reward[caught, self._mini_idx[loc[:, 0], loc[:, 1]]] = 1.
+            info['head_reward'] = head_reward
+        return self.get_state(), rewards, self.game_over.copy(), info
+
+    def get_state(self):
+        if self.state_mode == 'pixel':
+            return self.get_state_pixel()
+        elif self.state_mode == 'multi-head':
+            return self.get_state_multi_head()
+        elif self.state_mode == 'mini':
+            return self.get_mini_state()
+        else:
+            raise ValueError('State-mode is not known.')
+
+    def render(self, mode='rgb_array', scale=None, out=None):
+        """
+        RGB frames of all games with shape (N, scr_h * scale, scr_w * scale, 3), rendered without pygame
+        """
+        if mode != 'rgb_array':
+            raise ValueError('Render mode is not supported by the vectorized environment.')
+        return render_rgb(self.get_state_pixel(), self.rendering_scale if scale is None else scale, out=out)
+
+    def get_state_pixel(self):
+        """
+        stacked pixel states with shape (N, 4, scr_h, scr_w): walls, fruits, player, ghosts
+        """
+        rows = np.arange(self.nb_envs)
+        state = np.zeros((self.nb_envs, 4, self.scr_h, self.scr_w), dtype=np.int8)
+        state[:, 0] = self.wall_grid.T
+        game, fruit = np.nonzero(self.fruit_active)
+        state[game, 1, self.fruit_loc[fruit, 1], self.fruit_loc[fruit, 0]] = 1
+        state[rows, 2, self.player[:, 1], self.player[:, 0]] = 1
+        if self.is_ghost and self.nb_ghosts > 0:
+            game = np.repeat(rows, self.nb_ghosts)
+            state[game, 3, self.ghosts[..., 1].ravel(), self.ghosts[..., 0].ravel()] = 1
+        return state
+
+    def get_state_multi_head(self):
+        """
+        three binary heads per game: player, fruits, ghosts
+        """
+        rows = np.arange(self.nb_envs)
+        size = self.scr_w * self.scr_h
+        state = np.zeros((self.nb_envs, 3 * size), dtype=np.int8)
+        state[rows, self.player[:, 1] * self.scr_h + self.player[:, 0]] = 1
+        game, fruit = np.nonzero(self.fruit_active)
+        state[game, size + self.fruit_loc[fruit, 1] * self.scr_h + self.fruit_loc[fruit, 0]] = 1
+        if self.nb_ghosts > 0:
+            game = np.repeat(rows, self.nb_ghosts)
+            state[game, 2 * size + self.ghosts[..., 1].ravel() * self.scr_h + self.ghosts[..., 0].ravel()] = 1
+        return state
+
+    def get_mini_state(self):
+        rows = np.arange(self.nb_envs)
+        size = self.scr_w * self.scr_h
+        state = np.zeros((self.nb_envs, size + len(self.possible_fruits)), dtype=np.int8)
+        state[rows, self.player[:, 1] * self.scr_h + self.player[:, 0]] = 1
+        game, fruit = np.nonzero(self.fruit_active)
+        state[game, size + self._mini_idx[self.fruit_loc[fruit, 0], self.fruit_loc[fruit, 1]]] = 1
+        return state